@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.__init__.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of moldynplot, run using airspeed velocity (asv).
+
+Input files are generated by :mod:`benchmarks.generate` at several
+scales before each benchmark, outside of the timed region. From the
+root of the repository::
+
+    asv run                          # Benchmark current commit
+    asv run master~10..master        # Benchmark a range of commits
+    asv continuous master HEAD       # Compare HEAD to master
+    asv compare <commit_1> <commit_2>
+    asv publish && asv preview       # Browse stored results
+
+Results are stored in .asv/results, one file per commit and machine,
+such that regressions may be identified by comparing commits. During
+development, a single benchmark may be run against the working tree
+using ``asv run --python=same --quick --bench <regex>``.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+
+
+################################### CLASSES ###################################
+class Benchmark(object):
+    """
+    Base class for benchmarks that generate input files.
+
+    Each benchmark is given a temporary directory, `directory`, in which
+    to generate input and write output; it is removed afterwards.
+    """
+
+    #: Maximum time in seconds for each benchmark
+    timeout = 300
+
+    def setup(self, *args):
+        from tempfile import mkdtemp
+
+        self.directory = mkdtemp(prefix="moldynplot_benchmark_")
+
+    def teardown(self, *args):
+        from shutil import rmtree
+
+        rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        """
+        Arguments:
+          name (str): File name
+
+        Returns:
+          str: Path to *name* within temporary directory
+        """
+        from os.path import join
+
+        return join(self.directory, name)
+
+
+def require(module):
+    """
+    Imports an optional dependency, skipping the benchmark if it is not
+    installed.
+
+    Arguments:
+      module (str): Name of module
+
+    Raises:
+      NotImplementedError: *module* is not installed; asv skips
+      benchmarks whose setup raises NotImplementedError
+    """
+    from importlib import import_module
+
+    try:
+        import_module(module)
+    except ImportError:
+        raise NotImplementedError("{0} is not installed".format(module))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_figure.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of drawing figures, from reading data to saving images.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+from . import Benchmark
+from .generate import write_cpptraj_timeseries, write_sequence
+
+
+################################### CLASSES ###################################
+class FigureBenchmark(Benchmark):
+    """
+    Base class for benchmarks that draw a report from a YAML
+    specification.
+    """
+
+    def write_spec(self, spec):
+        """
+        Writes YAML specification to temporary directory.
+
+        Arguments:
+          spec (dict): Specification of report
+
+        Returns:
+          str: Path to YAML specification
+        """
+        import yaml
+
+        yaml_spec = self.path("spec.yml")
+        with open(yaml_spec, "w") as out:
+            yaml.dump(spec, out, default_flow_style=False)
+
+        return yaml_spec
+
+    def setup(self, *args):
+        import matplotlib
+
+        matplotlib.use("Agg")
+        Benchmark.setup(self, *args)
+
+
+class TimeSeriesFigure(FigureBenchmark):
+    """
+    Draws RMSD timeseries and probability distribution.
+    """
+    params = [10000, 100000]
+    param_names = ["n_frames"]
+
+    def setup(self, n_frames):
+        FigureBenchmark.setup(self, n_frames)
+        infile = self.path("rmsd.dat")
+        write_cpptraj_timeseries(infile, n_frames)
+        self.yaml_spec = self.write_spec(
+          {"preset": ["rmsd", "manuscript", "pdist"], "verbose": 0,
+            "figures": {0: {"outfile": self.path("rmsd.png"),
+              "subplots": {0: {"datasets": {0: {
+                "dataset_kw": {"infile": infile}}}}}}}})
+
+    def time_draw_report(self, n_frames):
+        from moldynplot.TimeSeriesFigureManager import \
+            TimeSeriesFigureManager
+
+        TimeSeriesFigureManager().draw_report(yaml_spec=self.yaml_spec)
+
+
+class SequenceFigure(FigureBenchmark):
+    """
+    Draws relaxation rates and order parameters as a function of
+    residue.
+    """
+    params = [100, 1000]
+    param_names = ["n_residues"]
+
+    def setup(self, n_residues):
+        FigureBenchmark.setup(self, n_residues)
+        infile = self.path("relax.dat")
+        write_sequence(infile, n_residues)
+        self.yaml_spec = self.write_spec(
+          {"preset": ["relax_4_s2", "manuscript"], "verbose": 0,
+            "figures": {0: {"outfile": self.path("relax.png"),
+              "subplots": {"all": {"xbound": [0.5, n_residues + 0.5],
+                "datasets": {0: {"dataset_kw": {"infile": infile}}}}}}}})
+
+    def time_draw_report(self, n_residues):
+        from moldynplot.SequenceFigureManager import SequenceFigureManager
+
+        SequenceFigureManager().draw_report(yaml_spec=self.yaml_spec)
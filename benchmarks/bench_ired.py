@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_ired.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of reading iRED relaxation and order parameters.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+from . import Benchmark
+from .generate import write_ired
+
+
+################################### CLASSES ###################################
+class IREDRead(Benchmark):
+    """
+    Reads and averages iRED outputs of several replicas.
+    """
+    params = ([100, 1000, 10000], [1, 10, 100])
+    param_names = ["n_residues", "n_replicas"]
+
+    def setup(self, n_residues, n_replicas):
+        Benchmark.setup(self)
+        self.infiles = []
+        self.indexfile = self.path("index.dat")
+        for i in range(n_replicas):
+            relax_infile = self.path("relax_{0:03d}.dat".format(i))
+            order_infile = self.path("order_{0:03d}.dat".format(i))
+            write_ired(relax_infile, order_infile, self.indexfile, n_residues,
+              seed=i)
+            self.infiles += [relax_infile, order_infile]
+
+    def time_read(self, n_residues, n_replicas):
+        from moldynplot.dataset.IREDDataset import IREDDataset
+
+        IREDDataset(infiles=self.infiles, indexfile=self.indexfile,
+          verbose=0)
+
+    def time_read_threaded(self, n_residues, n_replicas):
+        from moldynplot.dataset.IREDDataset import IREDDataset
+
+        IREDDataset(infiles=self.infiles, indexfile=self.indexfile,
+          n_threads=4, verbose=0)
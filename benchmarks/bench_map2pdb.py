@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_map2pdb.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of storing per-residue data in pdb files.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+from . import Benchmark
+from .generate import timeseries_df, write_pdb, write_sequence, write_text
+
+
+################################### CLASSES ###################################
+class MapToPDB(Benchmark):
+    """
+    Stores sequence data in a single-model pdb file.
+    """
+    params = [100, 1000, 10000]
+    param_names = ["n_residues"]
+
+    def setup(self, n_residues):
+        Benchmark.setup(self)
+        self.input_pdb = self.path("input.pdb")
+        self.input_data = self.path("relax.dat")
+        write_pdb(self.input_pdb, n_residues)
+        write_sequence(self.input_data, n_residues)
+
+    def time_run(self, n_residues):
+        from moldynplot.map2pdb import run
+
+        run(self.input_pdb, self.input_data, self.path("output.pdb"), "beta",
+          column="r1", verbose=0)
+
+
+class MapToPDBModels(Benchmark):
+    """
+    Stores per-residue timeseries in each model of a multi-model pdb
+    file.
+    """
+    params = ([100, 1000], [10, 100, 1000])
+    param_names = ["n_residues", "n_models"]
+
+    def setup(self, n_residues, n_models):
+        Benchmark.setup(self)
+        self.input_pdb = self.path("input.pdb")
+        self.input_data = self.path("timeseries.dat")
+        write_pdb(self.input_pdb, n_residues, n_models)
+        write_text(self.input_data, timeseries_df(n_models, n_residues))
+
+    def time_run(self, n_residues, n_models):
+        from moldynplot.map2pdb import run
+
+        run(self.input_pdb, self.input_data, self.path("output.pdb"), "beta",
+          models=True, verbose=0)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_relaxation.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of reading NMR spectra and fitting relaxation rates.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+from . import Benchmark, require
+from .generate import write_nmrpipe_series
+
+
+################################### CLASSES ###################################
+class HSQCRead(Benchmark):
+    """
+    Reads HSQC spectra in NMRPipe format.
+    """
+    params = [(128, 256), (512, 1024), (2048, 4096)]
+    param_names = ["shape"]
+
+    def setup(self, shape):
+        require("nmrglue")
+        Benchmark.setup(self)
+        self.infile = self.path("hsqc.ft")
+        write_nmrpipe_series([self.infile], self.path("peaklist.txt"), 50,
+          [0], shape=shape)
+
+    def time_read(self, shape):
+        from moldynplot.dataset.HSQCDataset import HSQCDataset
+
+        HSQCDataset(infile=self.infile, verbose=0)
+
+
+class RelaxationFit(Benchmark):
+    """
+    Fits relaxation rates and their standard errors to peak intensities
+    of a series of spectra.
+    """
+    params = [10, 50]
+    param_names = ["n_residues"]
+    delays = [10, 30, 50, 70, 90, 110, 150, 200]
+
+    def setup(self, n_residues):
+        require("nmrglue")
+        Benchmark.setup(self)
+        self.infiles = [self.path("{0:03d}ms.ft".format(d)) for d in
+            self.delays]
+        self.peaklist = self.path("peaklist.txt")
+        write_nmrpipe_series(self.infiles, self.peaklist, n_residues,
+          self.delays)
+
+    def time_process_relax(self, n_residues):
+        from moldynplot.relaxation import process_relax
+
+        process_relax("r1", self.peaklist, self.infiles, self.delays,
+          "rmse", 100, self.path("r1.dat"), verbose=0)
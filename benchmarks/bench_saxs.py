@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_saxs.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of reading and processing SAXS timeseries.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+from . import Benchmark
+from .generate import write_saxs_experiment, write_saxs_timeseries
+
+
+################################### CLASSES ###################################
+class SAXSTimeSeries(Benchmark):
+    """
+    Reads SAXS profiles of a trajectory, and calculates their mean and
+    agreement with experiment.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ["n_frames"]
+
+    def setup(self, n_frames):
+        Benchmark.setup(self)
+        self.infile = self.path("saxs.h5")
+        self.target = self.path("experiment.dat")
+        write_saxs_timeseries(self.infile, n_frames)
+        write_saxs_experiment(self.target)
+
+    def time_read(self, n_frames):
+        from moldynplot.dataset.SAXSTimeSeriesDataset import \
+            SAXSTimeSeriesDataset
+
+        SAXSTimeSeriesDataset(infile=self.infile, verbose=0)
+
+    def peakmem_read(self, n_frames):
+        from moldynplot.dataset.SAXSTimeSeriesDataset import \
+            SAXSTimeSeriesDataset
+
+        SAXSTimeSeriesDataset(infile=self.infile, verbose=0)
+
+    def time_calc_mean(self, n_frames):
+        from moldynplot.dataset.SAXSTimeSeriesDataset import \
+            SAXSTimeSeriesDataset
+
+        SAXSTimeSeriesDataset(infile=self.infile, lazy=True, calc_mean=True,
+          verbose=0)
+
+    def peakmem_calc_mean(self, n_frames):
+        from moldynplot.dataset.SAXSTimeSeriesDataset import \
+            SAXSTimeSeriesDataset
+
+        SAXSTimeSeriesDataset(infile=self.infile, lazy=True, calc_mean=True,
+          verbose=0)
+
+    def time_compare_frames(self, n_frames):
+        from moldynplot.dataset.SAXSTimeSeriesDataset import \
+            SAXSTimeSeriesDataset
+
+        SAXSTimeSeriesDataset(infile=self.infile, lazy=True,
+          calc_frame_x2=self.target, verbose=0)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.bench_timeseries.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Benchmarks of reading and processing timeseries.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+import numpy as np
+from . import Benchmark, require
+from .generate import timeseries_df, write_cpptraj_timeseries
+
+
+################################### CLASSES ###################################
+class TimeSeriesRead(Benchmark):
+    """
+    Reads cpptraj timeseries from text and hdf5.
+    """
+    params = ([10000, 100000, 1000000], [1, 10])
+    param_names = ["n_frames", "n_columns"]
+
+    def setup(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        Benchmark.setup(self)
+        self.text_infile = self.path("timeseries.dat")
+        self.hdf5_infile = self.path("timeseries.h5")
+        write_cpptraj_timeseries(self.text_infile, n_frames, n_columns)
+        dataset = TimeSeriesDataset(infile=self.text_infile, verbose=0)
+        dataset.write(df=dataset.timeseries_df, outfile=self.hdf5_infile,
+          verbose=0)
+
+    def time_read_text(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset(infile=self.text_infile, verbose=0)
+
+    def peakmem_read_text(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset(infile=self.text_infile, verbose=0)
+
+    def time_read_hdf5(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset(infile=self.hdf5_infile, verbose=0)
+
+    def time_downsample(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset(infile=self.hdf5_infile, downsample=100, verbose=0)
+
+
+class TimeSeriesPDist(object):
+    """
+    Calculates probability distributions of timeseries.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ["n_frames"]
+
+    def setup(self, n_frames):
+        require("sklearn")
+        self.df = timeseries_df(n_frames)
+        self.grid = np.linspace(0, 4, 1000)
+
+    def time_calc_pdist(self, n_frames):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset.calc_pdist(self.df, bandwidth=0.1, grid=self.grid,
+          verbose=0)
+
+
+class TimeSeriesPDist2D(object):
+    """
+    Calculates joint probability distributions and free energy surfaces
+    of two columns of timeseries.
+    """
+    params = ([100000, 1000000, 10000000], ["hist", "kde"])
+    param_names = ["n_frames", "mode"]
+
+    def setup(self, n_frames, mode):
+        self.df = timeseries_df(n_frames, 2)
+
+    def time_calc_pdist2d(self, n_frames, mode):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        pdist = TimeSeriesDataset.calc_pdist2d(df=self.df, mode=mode,
+          bins=200, verbose=0)
+        TimeSeriesDataset.calc_free_energy(pdist)
+
+
+class TimeSeriesBlockAverage(object):
+    """
+    Calculates mean and standard error of timeseries using block
+    averaging.
+    """
+    params = ([10000, 100000, 1000000], [1, 10])
+    param_names = ["n_frames", "n_columns"]
+
+    def setup(self, n_frames, n_columns):
+        self.df = timeseries_df(n_frames, n_columns)
+
+    def time_calc_mean(self, n_frames, n_columns):
+        from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
+
+        TimeSeriesDataset.calc_mean(self.df, verbose=0)
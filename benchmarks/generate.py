@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+#   benchmarks.generate.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Generates synthetic input files for benchmarks.
+
+Each generator writes a file in the format read by moldynplot at an
+arbitrary scale; values are random but reproducible for a given *seed*.
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+import numpy as np
+import pandas as pd
+
+################################## VARIABLES ##################################
+residue_names = ["ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY",
+    "HIS", "ILE", "LEU", "LYS", "MET", "PHE", "PRO", "SER", "THR", "TRP",
+    "TYR", "VAL"]
+
+
+################################## FUNCTIONS ##################################
+def residues(n_residues):
+    """
+    Generates residue names.
+
+    Arguments:
+      n_residues (int): Number of residues
+
+    Returns:
+      list: Residue names in the form ``XAA:#``, numbered from 1
+    """
+    return ["{0}:{1}".format(residue_names[i % len(residue_names)], i + 1)
+        for i in range(n_residues)]
+
+
+def write_text(outfile, df, width=12, precision=4):
+    """
+    Writes DataFrame in the fixed-width text format written by
+    moldynplot's datasets.
+
+    Arguments:
+      outfile (str): Path to output text file
+      df (DataFrame): DataFrame
+      width (int): Width of each column
+      precision (int): Number of decimal places of values
+    """
+    with open(outfile, "w") as out:
+        out.write(" " * width + "".join("{0:>{1}s}".format(c, width) for c
+          in df.columns.values) + "\n")
+        out.write("{0}\n".format(df.index.name))
+        for index, row in zip(df.index.values, df.values):
+            out.write("{0:>{1}s}".format(str(index), width) + "".join(
+              "{0:{1}.{2}f}".format(v, width, precision) for v in row) +
+              "\n")
+
+
+def autocorrelated(n_frames, n_columns=1, tau=100, seed=0):
+    """
+    Generates autocorrelated timeseries.
+
+    Arguments:
+      n_frames (int): Number of frames
+      n_columns (int): Number of columns
+      tau (float): Autocorrelation time, in frames
+      seed (int): Random seed
+
+    Returns:
+      ndarray: First-order autoregressive timeseries with unit variance
+      (frame, column)
+    """
+    from scipy.signal import lfilter
+
+    phi = np.exp(-1 / tau)
+    noise = np.random.RandomState(seed).normal(size=(n_frames, n_columns))
+    values = lfilter([np.sqrt(1 - phi ** 2)], [1, -phi], noise, axis=0)
+
+    return values
+
+
+def timeseries_df(n_frames, n_columns=1, tau=100, seed=0):
+    """
+    Generates timeseries DataFrame, as processed by TimeSeriesDataset.
+
+    Arguments:
+      n_frames (int): Number of frames
+      n_columns (int): Number of columns; if 1, single column is named
+        'rmsd'; otherwise columns are named as residues
+      tau (float): Autocorrelation time, in frames
+      seed (int): Random seed
+
+    Returns:
+      DataFrame: Timeseries, indexed by time in ns
+    """
+    values = 2.0 + 0.5 * autocorrelated(n_frames, n_columns, tau, seed)
+    columns = ["rmsd"] if n_columns == 1 else residues(n_columns)
+    index = pd.Index(np.arange(n_frames) * 0.1, name="time")
+
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+def write_cpptraj_timeseries(outfile, n_frames, n_columns=1, tau=100,
+  seed=0):
+    """
+    Writes timeseries in the text format of cpptraj.
+
+    Arguments:
+      outfile (str): Path to output text file
+      n_frames (int): Number of frames
+      n_columns (int): Number of columns; if 1, single column is named
+        'rmsd', as for cpptraj's rmsd command; otherwise columns are
+        named as residues, as for per-residue rmsd
+      tau (float): Autocorrelation time, in frames
+      seed (int): Random seed
+    """
+    df = timeseries_df(n_frames, n_columns, tau, seed)
+    header = "{0:<8s}".format("#Frame") + "".join(
+      "{0:>13s}".format(c) for c in df.columns.values)
+    np.savetxt(outfile,
+      np.column_stack((np.arange(1, n_frames + 1), df.values)),
+      fmt=["%8d"] + ["%12.4f"] * n_columns, header=header, comments="")
+
+
+def write_sequence(outfile, n_residues, seed=0):
+    """
+    Writes relaxation and order parameters in the text format of
+    SequenceDataset.
+
+    Arguments:
+      outfile (str): Path to output text file
+      n_residues (int): Number of residues
+      seed (int): Random seed
+    """
+    random = np.random.RandomState(seed)
+    df = pd.DataFrame(index=pd.Index(residues(n_residues), name="residue"))
+    for column, mean, sd in [("r1", 2.3, 0.2), ("r2", 5.0, 0.5),
+                             ("noe", 0.7, 0.1), ("s2", 0.8, 0.1)]:
+        df[column] = random.normal(mean, sd, n_residues)
+        df[column + " se"] = np.abs(random.normal(0, sd / 10, n_residues))
+
+    write_text(outfile, df, precision=2)
+
+
+def write_ired(relax_outfile, order_outfile, indexfile, n_residues, seed=0):
+    """
+    Writes relaxation and order parameters in the text formats of
+    cpptraj's iRED analysis.
+
+    Arguments:
+      relax_outfile (str): Path to output relaxation text file
+      order_outfile (str): Path to output order parameter text file
+      indexfile (str): Path to output residue index file
+      n_residues (int): Number of residues
+      seed (int): Random seed
+    """
+    random = np.random.RandomState(seed)
+    vectors = np.arange(n_residues)
+    t1 = 1 / random.normal(2.3, 0.2, n_residues)
+    t2 = 1 / random.normal(5.0, 0.5, n_residues)
+    noe = random.normal(0.7, 0.1, n_residues)
+    s2 = random.normal(0.8, 0.1, n_residues)
+
+    np.savetxt(relax_outfile, np.column_stack((vectors, t1, t2, noe)),
+      fmt=["%-10d", "%12.6f", "%12.6f", "%12.6f"],
+      header="#Vec       ired[T1]     ired[T2]    ired[NOE]", comments="")
+    np.savetxt(order_outfile, np.column_stack((vectors, s2)),
+      fmt=["%-10d", "%12.6f"], header="#Vec       ired[S2]", comments="")
+    with open(indexfile, "w") as out:
+        out.write("\n".join(residues(n_residues)) + "\n")
+
+
+def write_saxs_timeseries(outfile, n_frames, n_q=500, chunk_size=4096,
+  seed=0):
+    """
+    Writes SAXS profiles of a trajectory in the hdf5 format of
+    SAXSTimeSeriesDataset.
+
+    Profiles follow the Guinier approximation, with radius of gyration
+    fluctuating over the trajectory.
+
+    Arguments:
+      outfile (str): Path to output hdf5 file
+      n_frames (int): Number of frames
+      n_q (int): Number of scattering vectors
+      chunk_size (int): Number of frames to write at once
+      seed (int): Random seed
+    """
+    import h5py
+
+    q = np.linspace(0.0, 0.5, n_q)
+    rg = 12.0 + autocorrelated(n_frames, seed=seed)[:, 0]
+    with h5py.File(outfile, "w") as h5_file:
+        h5_file["saxs/q"] = q
+        intensity = h5_file.create_dataset("saxs/intensity",
+          (n_frames, n_q), np.float32, chunks=(min(chunk_size, n_frames),
+          n_q))
+        for start in range(0, n_frames, chunk_size):
+            rg_i = rg[start:start + chunk_size, np.newaxis]
+            intensity[start:start + chunk_size] = np.exp(
+              -(q[np.newaxis, :] * rg_i) ** 2 / 3)
+
+
+def write_saxs_experiment(outfile, n_q=500, seed=0):
+    """
+    Writes experimental SAXS profile in text format.
+
+    Arguments:
+      outfile (str): Path to output text file
+      n_q (int): Number of scattering vectors
+      seed (int): Random seed
+    """
+    random = np.random.RandomState(seed)
+    q = np.linspace(0.0, 0.5, n_q)
+    intensity = np.exp(-(q * 12.0) ** 2 / 3)
+    intensity_se = 0.01 * intensity + 1e-4
+    intensity += random.normal(0, intensity_se)
+
+    df = pd.DataFrame(np.column_stack((intensity, intensity_se)),
+      index=pd.Index(q, name="q"), columns=["intensity", "intensity se"])
+
+    write_text(outfile, df, width=14, precision=6)
+
+
+def write_nmrpipe_series(outfiles, peaklist, n_residues, delays,
+  shape=(256, 512), seed=0):
+    """
+    Writes a series of 1H-15N HSQC spectra in NMRPipe format, with peak
+    intensities decaying over *delays*, and a peak list in the format
+    read by :func:`process_relax<moldynplot.relaxation.process_relax>`.
+
+    Arguments:
+      outfiles (list): Paths to output NMRPipe files, one per delay
+      peaklist (str): Path to output peak list
+      n_residues (int): Number of peaks
+      delays (list): Relaxation delays, in ms
+      shape (tuple): Number of points in 15N and 1H dimensions
+      seed (int): Random seed
+    """
+    import nmrglue
+
+    random = np.random.RandomState(seed)
+    udic = nmrglue.fileio.fileiobase.create_blank_udic(2)
+    for dim, (label, obs, car, sw) in enumerate(
+            [("15N", 60.8, 118.0, 35.0), ("1H", 600.0, 8.0, 6.0)]):
+        udic[dim].update(dict(label=label, size=shape[dim], obs=obs,
+          car=car * obs, sw=sw * obs, complex=False, time=False, freq=True,
+          encoding="states" if dim == 0 else "direct"))
+    dic = nmrglue.pipe.create_dic(udic)
+    nitrogen = nmrglue.pipe.make_uc(dic, np.zeros(shape), dim=0).ppm_scale()
+    hydrogen = nmrglue.pipe.make_uc(dic, np.zeros(shape), dim=1).ppm_scale()
+
+    # Place peaks
+    peak_n = random.uniform(105.0, 131.0, n_residues)
+    peak_h = random.uniform(6.5, 9.5, n_residues)
+    intensity = random.uniform(1e5, 1e6, n_residues)
+    rate = random.normal(10.0, 1.0, n_residues)
+    profile_n = np.exp(-((nitrogen[:, np.newaxis] - peak_n) / 0.3) ** 2)
+    profile_h = np.exp(-((hydrogen[:, np.newaxis] - peak_h) / 0.03) ** 2)
+    for outfile, delay in zip(outfiles, delays):
+        scale = intensity * np.exp(-rate * delay / 1000)
+        data = np.dot(profile_n * scale, profile_h.T).astype(np.float32)
+        nmrglue.pipe.write(outfile, dic, data, overwrite=True)
+
+    with open(peaklist, "w") as out:
+        out.write("Index\tAssignment\t1H\t15N\tName\n")
+        for i, name in enumerate(residues(n_residues)):
+            residue, number = name.split(":")
+            out.write("{0}\t?\t{1:.4f}\t{2:.4f}\tA:{3}{4}N\n".format(i,
+              peak_h[i], peak_n[i], number, residue.title()))
+
+
+def write_pdb(outfile, n_residues, n_models=1, seed=0):
+    """
+    Writes backbone atoms of a peptide in pdb format.
+
+    Arguments:
+      outfile (str): Path to output pdb file
+      n_residues (int): Number of residues
+      n_models (int): Number of models
+      seed (int): Random seed
+    """
+    random = np.random.RandomState(seed)
+    atom_names = ["N", "CA", "C", "O"]
+    xyz = np.cumsum(random.normal(0, 1.5, (n_residues * 4, 3)), axis=0)
+    names = [name.split(":") for name in residues(n_residues)]
+
+    lines = []
+    for model in range(n_models):
+        if n_models > 1:
+            lines.append("MODEL     {0:4d}".format(model + 1))
+        xyz_i = xyz + random.normal(0, 0.5, xyz.shape)
+        for i, (x, y, z) in enumerate(xyz_i):
+            residue, number = names[i // 4]
+            name = atom_names[i % 4]
+            lines.append("ATOM  {0:5d}  {1:<3s} {2:3s} A{3:4d}    "
+                         "{4:8.3f}{5:8.3f}{6:8.3f}{7:6.2f}{8:6.2f}"
+                         "           {9:1s}".format((i + 1) % 100000, name,
+              residue, int(number) % 10000, x, y, z, 1.0, 0.0, name[0]))
+        if n_models > 1:
+            lines.append("ENDMDL")
+    lines.append("END")
+
+    with open(outfile, "w") as out:
+        out.write("\n".join(lines) + "\n")
@@ -17,13 +17,14 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 
 
 ################################### CLASSES ###################################
-class CorrFigureManager(FigureManager):
+class CorrFigureManager(ParallelReportMixin, FigureManager):
     """
     Manages the generation of correlation figures.
     """
@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+#   moldynplot.DatasetPlanner.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Plans the loading of the datasets of a report
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+if __name__ == "__main__":
+    __package__ = str("moldynplot")
+    import moldynplot
+from copy import deepcopy
+import numpy as np
+import six
+from . import load_yaml_spec, merge_dicts
+from .myplotspec import wiprint
+
+
+################################## FUNCTIONS ##################################
+def freeze(value):
+    """
+    Converts a value into a hashable equivalent for comparison.
+
+    Arguments:
+      value: Value; may be a dict, list, tuple, or ndarray, possibly
+        nested
+
+    Returns:
+      Hashable equivalent of *value*
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    elif isinstance(value, np.ndarray):
+        return ("ndarray", value.dtype.str, value.shape, value.tobytes())
+    return value
+
+
+def import_class(cls):
+    """
+    Imports a class from its full name.
+
+    Arguments:
+      cls (str, type): Full name of class, e.g.
+        'moldynplot.dataset.TimeSeriesDataset.TimeSeriesDataset'; if
+        already a class, returned unchanged
+
+    Returns:
+      type: Class
+    """
+    from importlib import import_module
+
+    if not isinstance(cls, six.string_types):
+        return cls
+    module, name = cls.rsplit(".", 1)
+    return getattr(import_module(module), name)
+
+
+################################### CLASSES ###################################
+class DatasetPlanner(object):
+    """
+    Plans the loading of the datasets of a report.
+
+    Figures frequently load the same file in several subplots under
+    slightly different *dataset_kw*, for example with and without
+    'calc_pdist'. Each such request is cached separately, and the file
+    is read and processed once per request. The planner collects the
+    *dataset_kw* of every dataset of a report before drawing, groups the
+    requests that read the same input, and reads each input once.
+    Requests that differ only in the derived products they calculate are
+    merged into a single dataset calculating the union of those
+    products; requests that also differ in how data is processed once
+    read (e.g. 'downsample') are constructed from the same data without
+    reading it again. The resulting datasets are stored in the dataset
+    cache of the figure manager under the key of each original request,
+    such that drawing finds them already loaded.
+
+    Only dataset classes that define the class attributes `product_kw`
+    and `view_kw` and the class method `load_variants` themselves are
+    planned; datasets of other classes, including subclasses that do
+    not redefine them, are loaded while drawing as usual.
+    """
+
+    #: Keyword arguments that affect neither reading nor processing
+    ignored_kw = ("verbose", "debug", "interactive", "dataset_cache")
+
+    def __init__(self, figure_manager, **kwargs):
+        """
+        Arguments:
+          figure_manager (FigureManager): Figure manager whose defaults
+            and presets are used to collect dataset requests, and into
+            whose dataset cache datasets are loaded
+          kwargs (dict): Additional keyword arguments
+        """
+        import yaml
+
+        self.figure_manager = figure_manager
+        self.defaults = yaml.load(getattr(figure_manager, "defaults", ""),
+          Loader=yaml.Loader) or {}
+        self.available_presets = yaml.load(
+          getattr(figure_manager, "available_presets", ""),
+          Loader=yaml.Loader) or {}
+
+    def get_preset_kw(self, presets, seen=None):
+        """
+        Gets the draw_dataset section of one or more presets, including
+        those of the presets they extend or inherit.
+
+        Arguments:
+          presets (str, list): Name(s) of preset(s)
+
+        Returns:
+          dict: Merged draw_dataset sections
+        """
+        if seen is None:
+            seen = set()
+        if isinstance(presets, six.string_types):
+            presets = [presets]
+
+        kw = {}
+        for name in presets:
+            preset = self.available_presets.get(name)
+            if preset is None or name in seen:
+                continue
+            seen.add(name)
+            for parent_key in ["inherits", "extends"]:
+                if parent_key in preset:
+                    merge_dicts(kw, self.get_preset_kw(preset[parent_key],
+                      seen))
+            merge_dicts(kw, preset.get("draw_dataset", {}))
+        return kw
+
+    def collect(self, **kwargs):
+        """
+        Collects the dataset requests of a report.
+
+        Walks figures, subplots, and datasets in the manner of
+        :meth:`draw_report<myplotspec.FigureManager.FigureManager.draw_report>`,
+        applying defaults, presets, and 'all' entries at each level.
+
+        Arguments:
+          yaml_spec (str, dict, list): Specification of report; see
+            :func:`load_yaml_spec<moldynplot.load_yaml_spec>`
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          list: Requests, each a tuple of dataset class and its keyword
+          arguments
+        """
+        spec = merge_dicts(load_yaml_spec(kwargs.pop("yaml_spec", {})),
+          kwargs)
+        verbose = spec.get("verbose", 1)
+
+        def iter_level(level):
+            level = level or {}
+            for i in sorted([i for i in level if i != "all"], key=str):
+                node = merge_dicts(deepcopy(level.get("all") or {}),
+                  level[i] or {})
+                yield node
+
+        def get_node_kw(kw, node):
+            kw = deepcopy(kw)
+            for preset_key in ["preset", "presets"]:
+                if preset_key in node:
+                    merge_dicts(kw, self.get_preset_kw(node[preset_key]))
+            return kw
+
+        requests = []
+        report_kw = merge_dicts(
+          deepcopy(self.defaults.get("draw_dataset", {}) or {}),
+          get_node_kw({}, spec))
+        for figure in iter_level(spec.get("figures")):
+            figure_kw = get_node_kw(report_kw, figure)
+            for subplot in iter_level(figure.get("subplots")):
+                subplot_kw = get_node_kw(figure_kw, subplot)
+                for dataset in iter_level(subplot.get("datasets")):
+                    dataset_kw = merge_dicts(get_node_kw(subplot_kw, dataset),
+                      dict((k, v) for k, v in dataset.items() if
+                      k not in ["preset", "presets"]))
+                    request = deepcopy(dataset_kw.get("dataset_kw") or {})
+                    if "infile" in dataset_kw:
+                        request["infile"] = dataset_kw["infile"]
+                    if "infile" not in request and "infiles" not in request:
+                        continue
+                    try:
+                        cls = import_class(request.pop("cls"))
+                    except (KeyError, ImportError, AttributeError,
+                            ValueError):
+                        continue
+                    request["verbose"] = dataset_kw.get("verbose", verbose)
+                    requests.append((cls, request))
+
+        return requests
+
+    def plan(self, requests):
+        """
+        Groups dataset requests by the input they read.
+
+        Arguments:
+          requests (list): Requests, each a tuple of dataset class and its
+            keyword arguments
+
+        Returns:
+          list: Groups, each a tuple of dataset class, list of variants
+          (keyword arguments of each dataset to be constructed), and list
+          of the requests served by each variant
+        """
+        groups = {}
+        order = []
+        for cls, request in requests:
+            if not all(name in cls.__dict__ for name in
+                    ["product_kw", "view_kw", "load_variants"]):
+                continue
+            derived = set(cls.view_kw) | set(self.ignored_kw)
+            for flag, options in cls.product_kw.items():
+                derived |= set([flag]) | set(options)
+            source_key = (cls, freeze(dict((k, v) for k, v in request.items()
+                if k not in derived)))
+            if source_key not in groups:
+                groups[source_key] = []
+                order.append(source_key)
+            groups[source_key].append(request)
+
+        plan = []
+        for source_key in order:
+            cls = source_key[0]
+            variants = []
+            served = []
+            for request in groups[source_key]:
+                for variant, served_i in zip(variants, served):
+                    if self.merge_request(cls, variant, request):
+                        served_i.append(request)
+                        break
+                else:
+                    variants.append(deepcopy(request))
+                    served.append([request])
+            plan.append((cls, variants, served))
+
+        return plan
+
+    def merge_request(self, cls, variant, request):
+        """
+        Merges a request into a variant, if they differ only in the
+        derived products they calculate.
+
+        Arguments:
+          cls (type): Dataset class
+          variant (dict): Keyword arguments of variant; updated in place
+          request (dict): Keyword arguments of request
+
+        Returns:
+          bool: True if *request* was merged into *variant*
+        """
+        for key in cls.view_kw:
+            if freeze(variant.get(key)) != freeze(request.get(key)):
+                return False
+        for flag, options in cls.product_kw.items():
+            if not (variant.get(flag) and request.get(flag)):
+                continue
+            if (isinstance(variant[flag], six.string_types) and isinstance(
+                    request[flag], six.string_types) and variant[flag] !=
+                    request[flag]):
+                return False
+            for key in options:
+                if freeze(variant.get(key)) != freeze(request.get(key)):
+                    return False
+
+        for flag, options in cls.product_kw.items():
+            if request.get(flag) and not isinstance(variant.get(flag),
+                    six.string_types):
+                variant[flag] = request[flag]
+                for key in options:
+                    if key in request:
+                        variant[key] = deepcopy(request[key])
+                    else:
+                        variant.pop(key, None)
+        return True
+
+    def get_cache_keys(self, cls, request):
+        """
+        Generates the keys under which a request may be found in the
+        dataset cache.
+
+        Arguments:
+          cls (type): Dataset class
+          request (dict): Keyword arguments of request
+
+        Returns:
+          list: Cache keys
+        """
+        keys = []
+        for kw in [request, dict((k, v) for k, v in request.items() if
+                k != "verbose")]:
+            try:
+                key = cls.get_cache_key(**deepcopy(kw))
+                hash(key)
+            except TypeError:
+                continue
+            if key is not None and key not in keys:
+                keys.append(key)
+        return keys
+
+    def load(self, **kwargs):
+        """
+        Collects, plans, and loads the datasets of a report into the
+        dataset cache of the figure manager.
+
+        Groups whose requests are all already cached are skipped. Errors
+        while loading a group are reported and the group is left to be
+        loaded while drawing.
+
+        Arguments:
+          yaml_spec (str, dict, list): Specification of report
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          int: Number of inputs read
+        """
+        dataset_cache = getattr(self.figure_manager, "dataset_cache", None)
+        if dataset_cache is None:
+            return 0
+        verbose = kwargs.get("verbose", 1)
+
+        n_read = 0
+        for cls, variants, served in self.plan(self.collect(**kwargs)):
+            keys = [[self.get_cache_keys(cls, r) for r in served_i] for
+                served_i in served]
+            if all(len(k) > 0 and all(k_i in dataset_cache for k_i in k)
+                    for keys_i in keys for k in keys_i):
+                continue
+            if verbose >= 1:
+                wiprint("loading {0} request(s) for {1} as {2} ".format(
+                  sum(len(s) for s in served), cls.__name__,
+                  len(variants)) + "dataset(s) sharing one input")
+            try:
+                datasets = cls.load_variants(variants,
+                  dataset_cache=dataset_cache)
+            except Exception as error:
+                if verbose >= 1:
+                    wiprint("could not plan {0} ({1}); ".format(
+                      cls.__name__, error) + "loading while drawing")
+                continue
+            for dataset, keys_i in zip(datasets, keys):
+                for k in keys_i:
+                    for k_i in k:
+                        dataset_cache[k_i] = dataset
+            n_read += 1
+
+        return n_read
+
+
+class DatasetPlannerMixin(object):
+    """
+    Loads the datasets of all figures of a report using
+    :class:`DatasetPlanner` before drawing, such that each input is read
+    once.
+    """
+
+    def draw_report(self, **kwargs):
+        """
+        Draws report, first loading the datasets of all figures using
+        :class:`DatasetPlanner`.
+
+        Arguments:
+          plan_datasets (bool): Plan and load datasets before drawing
+          kwargs (dict): Additional keyword arguments passed to
+            :meth:`draw_report
+            <myplotspec.FigureManager.FigureManager.draw_report>`
+        """
+        if kwargs.pop("plan_datasets", True):
+            DatasetPlanner(self).load(**kwargs)
+        return super(DatasetPlannerMixin, self).draw_report(**kwargs)
+
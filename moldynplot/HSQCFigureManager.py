@@ -19,13 +19,14 @@ if __name__ == "__main__":
     import moldynplot
 
 import numpy as np
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 
 
 ################################### CLASSES ###################################
-class HSQCFigureManager(FigureManager):
+class HSQCFigureManager(ParallelReportMixin, FigureManager):
     """
     Manages the generation of HSQC figures.
 
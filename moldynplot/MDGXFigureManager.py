@@ -19,11 +19,12 @@ if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
 
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 ################################### CLASSES ###################################
-class MDGXFigureManager(FigureManager):
+class MDGXFigureManager(ParallelReportMixin, FigureManager):
     """
     Manages the generation of MDGX figures.
     """
@@ -225,10 +226,31 @@ class MDGXFigureManager(FigureManager):
         draw_edge=True,
         verbose=1, debug=0, **kwargs):
         """
-        .. todo:
-            - Use violinplot function only to get vertices, and then
-              draw manually, rather than calculating KDE twice. May
-              alternatively calculate KDE myself in MDGXDataset.
+        Draws violin plots of the error of each selection of a dataset.
+
+        Bodies, edges, percentiles, MAE, and RMSE are all drawn from the
+        distribution summaries precomputed and cached by
+        :meth:`MDGXDataset.get_distributions
+        <moldynplot.dataset.MDGXDataset.MDGXDataset.get_distributions>`,
+        rather than by matplotlib's violinplot.
+
+        Arguments:
+          subplot (Axes): Axes on which to draw
+          draw_body (bool): Draw violin bodies
+          draw_percentile (bool): Draw 25th, 50th, and 75th percentiles
+          draw_mae (bool): Draw mean absolute error
+          draw_rmse (bool): Draw root mean square error
+          draw_edge (bool): Draw violin edges
+          violin_kw (dict): Keyword arguments used to configure violins,
+            as accepted by matplotlib's violinplot; 'points' and
+            'bw_method' are passed to :meth:`get_distributions`, 'widths'
+            is the maximum width of each violin, 'vert' draws violins
+            vertically if True (default) or horizontally if False, and
+            'showextrema' (default True), 'showmeans', and 'showmedians'
+            draw lines at the extrema, mean, and median of each violin in
+            the color of its edge
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
         """
         from .myplotspec import get_color, get_colors, multi_get_copy
         import numpy as np
@@ -238,15 +260,37 @@ class MDGXFigureManager(FigureManager):
         if "infile" in kwargs:
             dataset_kw["infile"] = kwargs["infile"]
         dataset = self.load_dataset(verbose=verbose, debug=debug, **dataset_kw)
-        dataframe = dataset.dataframe
 
         # Configure plot settings
         plot_kw = multi_get_copy("plot_kw", kwargs, {})
         get_colors(plot_kw, kwargs)
         violin_kw = multi_get_copy("violin_kw", kwargs, {})
         get_colors(violin_kw, plot_kw)
-        y = [d["error"] for d in dataset.selections]
+        unknown = set(violin_kw) - set(["points", "bw_method", "widths",
+            "vert", "showextrema", "showmeans", "showmedians"])
+        if len(unknown) > 0:
+            raise TypeError("Unrecognized violin_kw {0}".format(
+              ", ".join(sorted(unknown))))
+        summary_df, coords, density = dataset.get_distributions(
+          points=violin_kw.get("points", 100),
+          bw_method=violin_kw.get("bw_method", "scott"))
         x = kwargs.get("x", range(1,len(dataset.selections)+1,1))
+        widths = np.broadcast_to(np.array(violin_kw.get("widths", 0.5),
+          np.float64), (len(x),))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            half_widths = np.nan_to_num(0.5 * widths[:,np.newaxis] * density
+              / density.max(axis=1)[:,np.newaxis])
+        vert = violin_kw.get("vert", True)
+
+        def plot(position, value, **plot_kw):
+            """
+            Plots in coordinates of violin, along its position and value.
+            """
+            if vert:
+                return subplot.plot(position, value, **plot_kw)
+            else:
+                return subplot.plot(value, position, **plot_kw)
+
         if draw_percentile:
             percentile_kw = plot_kw.copy()
             percentile_kw.update(kwargs.get("percentile_kw", {}))
@@ -269,74 +313,73 @@ class MDGXFigureManager(FigureManager):
             body_kw.update(kwargs.get("body_kw", {}))
             colors = multi_get_copy(["color", "colors", "facecolor",
               "facecolors"], body_kw)
-            if colors is not None:
-                colors = map(get_color, colors)
-
-            bodies = subplot.violinplot(y, x, **violin_kw)["bodies"]
-            for i, body in enumerate(bodies):
-                body.set_edgecolors("none")
+            if isinstance(colors, list):
+                colors = [get_color(c) for c in colors]
+            for i, summary in enumerate(summary_df.itertuples()):
                 if isinstance(colors, list):
-                    body.set_facecolors(colors[i])
-                elif colors is not None:
-                    body.set_facecolor(colors)
-                if "alpha" in body_kw:
-                    body.set_alpha(body_kw["alpha"])
-                if "zorder" in body_kw:
-                    body.set_zorder(body_kw["zorder"])
-                vertices = body.get_paths()[0].vertices
+                    facecolor = colors[i]
+                else:
+                    facecolor = colors
+                if vert:
+                    fill_between = subplot.fill_betweenx
+                else:
+                    fill_between = subplot.fill_between
+                fill_between(coords[i], x[i]-half_widths[i],
+                  x[i]+half_widths[i], facecolor=facecolor, edgecolor="none",
+                  alpha=body_kw.get("alpha", 0.3),
+                  zorder=body_kw.get("zorder", 1))
 
                 # Plot percentiles
                 if draw_percentile:
-                    prc_y = np.percentile(y[i], 25)
-                    prc_xmin = vertices[np.abs(
-                      vertices[:vertices.shape[0],1]-prc_y).argmin(),0] 
-                    subplot.plot([prc_xmin, x[i]+(x[i]-prc_xmin)],
-                      [prc_y, prc_y], **percentile_kw)
-                    prc_y = np.percentile(y[i], 50)
-                    prc_xmin = vertices[np.abs(
-                      vertices[:vertices.shape[0],1]-prc_y).argmin(),0]
-                    subplot.plot([prc_xmin, x[i]+(x[i]-prc_xmin)],
-                      [prc_y, prc_y], **median_kw)
-                    prc_y = np.percentile(y[i], 75)
-                    prc_xmin = vertices[np.abs(
-                      vertices[:vertices.shape[0],1]-prc_y).argmin(),0]
-                    subplot.plot([prc_xmin, x[i]+(x[i]-prc_xmin)],
-                      [prc_y, prc_y], **percentile_kw)
+                    for prc_y, prc_kw in [(summary.q25, percentile_kw),
+                      (summary.median, median_kw),
+                      (summary.q75, percentile_kw)]:
+                        prc_dx = np.interp(prc_y, coords[i], half_widths[i])
+                        plot([x[i]-prc_dx, x[i]+prc_dx], [prc_y, prc_y],
+                          **prc_kw)
 
                 if draw_mae:
-                    subplot.plot([x[i]], [y[i].mean()], **mae_kw)
+                    plot([x[i]], [summary.mae], **mae_kw)
 
                 if draw_rmse:
                     if verbose >= 2:
-                        print("{0:2d}: {1:5.2f}".format(x[i],
-                          np.sqrt((y[i]**2).mean())))
-                    subplot.plot([x[i]], [np.sqrt((y[i]**2).mean())],
-                      **rmse_kw)
+                        print("{0:2d}: {1:5.2f}".format(x[i], summary.rmse))
+                    plot([x[i]], [summary.rmse], **rmse_kw)
 
-        # Plot edges
-        if draw_edge:
-            edge_kw = plot_kw.copy()
-            edge_kw.update(kwargs.get("edge_kw", {}))
-            colors = multi_get_copy(["color", "colors", "edgecolor",
-              "edgecolors"], edge_kw)
-            if colors is not None:
-                colors = map(get_color, colors)
-            bodies = subplot.violinplot(y, x, **violin_kw)["bodies"]
-            for i, body in enumerate(bodies):
-                body.set_facecolors("none")
-                if isinstance(colors, list):
-                    body.set_edgecolors(colors[i])
-                elif colors is not None:
-                    body.set_edgecolor(colors)
-                if "alpha" in edge_kw:
-                    body.set_alpha(edge_kw["alpha"])
-                if "zorder" in edge_kw:
-                    body.set_zorder(edge_kw["zorder"])
-                if "linewidth" in edge_kw:
-                    body.set_linewidth(edge_kw["linewidth"])
-                elif "lw" in edge_kw:
-                    body.set_linewidth(edge_kw["lw"])
-                body.get_paths()[0].codes[-1] = 1 # Open closed polygon
+        # Plot edges, and extrema, means, and medians as by violinplot
+        edge_kw = plot_kw.copy()
+        edge_kw.update(kwargs.get("edge_kw", {}))
+        colors = multi_get_copy(["color", "colors", "edgecolor",
+          "edgecolors"], edge_kw)
+        if isinstance(colors, list):
+            colors = [get_color(c) for c in colors]
+        line_kw = dict(alpha=edge_kw.get("alpha", 0.3),
+          zorder=edge_kw.get("zorder", 2),
+          lw=edge_kw.get("linewidth", edge_kw.get("lw", 1.0)))
+        for i, summary in enumerate(summary_df.itertuples()):
+            if isinstance(colors, list):
+                edgecolor = colors[i]
+            else:
+                edgecolor = colors
+            if draw_edge:
+                # Open polygon, as drawn by violinplot with final segment
+                #   omitted
+                plot(np.concatenate((x[i]-half_widths[i],
+                  x[i]+half_widths[i][::-1])),
+                  np.concatenate((coords[i], coords[i][::-1])),
+                  color=edgecolor, **line_kw)
+            lines = []
+            if violin_kw.get("showextrema", True):
+                lines += [summary.min, summary.max]
+                plot([x[i], x[i]], [summary.min, summary.max],
+                  color=edgecolor, **line_kw)
+            if violin_kw.get("showmeans", False):
+                lines += [summary.mean]
+            if violin_kw.get("showmedians", False):
+                lines += [summary.median]
+            for value in lines:
+                plot([x[i]-0.25*widths[i], x[i]+0.25*widths[i]],
+                  [value, value], color=edgecolor, **line_kw)
 
 #################################### MAIN #####################################
 if __name__ == "__main__":
@@ -16,11 +16,12 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 ################################### CLASSES ###################################
-class PDist2DFigureManager(FigureManager):
+class PDist2DFigureManager(ParallelReportMixin, FigureManager):
     """
     Manages the generation of 2D probability distribution figures.
     """
@@ -177,11 +178,142 @@ class PDist2DFigureManager(FigureManager):
             wspace:    0.05
     """
 
+    @staticmethod
+    def build_heatmap(x, pdist, y, min_cutoff=None, subensemble_pop=None,
+      gamma2=None, logz=False,
+      gamma2_excluded=(55, 56, 57, 58, 59, 60, 61, 111, 112, 113, 114, 115,
+        116, 117)):
+        """
+        Builds heatmap of probability distributions as a function of
+        residue number.
+
+        Placement, normalization, cutoff, and transformation are applied
+        to the distributions of all residues at once.
+
+        Arguments:
+          x (ndarray): Residue number of each column of *pdist*
+          pdist (ndarray): Probability distribution of each residue
+            (y, residue); not modified
+          y (ndarray): Grid of y over which distributions are defined
+          min_cutoff (float): Population below which grid points are
+            set to NaN, after which distributions are renormalized
+          subensemble_pop (float): Population by which to scale
+            normalized distributions
+          gamma2 (ndarray): Γ2 at each point of *y*; if provided,
+            population is converted to population-weighted Γ2
+          logz (bool): Transform z to -log₁₀(z)
+          gamma2_excluded (tuple): Residues for which Γ2 is not
+            calculated
+
+        Returns:
+          (ndarray, ndarray, tuple): Residue numbers spanning heatmap,
+          including one past the last residue; heatmap (y, residue);
+          and x, lower bound, and upper bound of outline of nonzero
+          region of each residue, with NaN gaps
+        """
+        import numpy as np
+        from .SequenceFigureManager import SequenceFigureManager
+
+        # Select first column of each residue
+        x = np.array(x, np.int64)
+        residues, first = np.unique(x, return_index=True)
+        z = np.array(pdist, np.float64)[:, first]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Normalize, optionally scale by extected sum
+            z /= np.nansum(z, axis=0)
+            if subensemble_pop is not None:
+                z *= subensemble_pop
+
+            # Set grid points below selected weight to NaN
+            if min_cutoff is not None:
+                z[z < min_cutoff] = np.nan
+
+            # Normalize again, and optionally scale again
+            z /= np.nansum(z, axis=0)
+            if subensemble_pop is not None:
+                z *= subensemble_pop
+
+        # Convert from population to population-weighted Γ2, skipping
+        #   selected residues for which Γ2 cannot be back-calculated
+        valid = ~np.isnan(z).all(axis=0)
+        if gamma2 is not None:
+            valid &= ~np.isin(residues, gamma2_excluded)
+            z[:, ~valid] = np.nan
+            z *= np.asarray(gamma2, np.float64)[:, np.newaxis]
+
+        # Place within grid spanning residues
+        hm_x = np.arange(x.min(), x.max() + 2, 1, np.int64)
+        hm_z = np.full((y.size, hm_x.size), np.nan)
+        hm_z[:, residues - x.min()] = z
+        if logz:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                hm_z = -1 * np.log10(hm_z)
+
+        # Outline first and last nonzero grid points of each residue
+        nonzero = ~np.isnan(z[:, valid])
+        lower = y[np.argmax(nonzero, axis=0)]
+        upper = y[y.size - 1 - np.argmax(nonzero[::-1], axis=0)]
+        if valid.any():
+            ol_x, (ol_ylb, ol_yub) = SequenceFigureManager.\
+                build_sequence_arrays(residues[valid], [lower, upper])
+        else:
+            ol_x, ol_ylb, ol_yub = np.array([]), np.array([]), np.array([])
+
+        return hm_x, hm_z, (ol_x, ol_ylb, ol_yub)
+
+    def draw_surface(self, subplot, dataset, free_energy=True,
+      draw_colorbar=True, **kwargs):
+        """
+        Draws joint probability distribution or free energy surface of
+        two columns of a timeseries.
+
+        Arguments:
+          subplot (Axes): Axes on which to draw
+          dataset (TimeSeriesDataset): Dataset whose `pdist2d_df` and
+            `fes_df` have been calculated using *calc_pdist2d*
+          free_energy (bool): Draw free energy rather than probability
+          draw_colorbar (bool): Draw colorbar
+          heatmap_kw (dict): Keyword arguments passed to pcolormesh
+          draw_contour (bool): Draw contours
+          contour_kw (dict): Keyword arguments passed to contour
+          kwargs (dict): Additional keyword arguments
+        """
+        import numpy as np
+        from .myplotspec import multi_get_copy
+
+        if free_energy:
+            surface_df = dataset.fes_df
+        else:
+            surface_df = dataset.pdist2d_df
+        x = np.array(surface_df.index.values, np.float64)
+        y = np.array(surface_df.columns.values, np.float64)
+        x_edges = np.concatenate(([1.5 * x[0] - 0.5 * x[1]],
+          (x[:-1] + x[1:]) / 2, [1.5 * x[-1] - 0.5 * x[-2]]))
+        y_edges = np.concatenate(([1.5 * y[0] - 0.5 * y[1]],
+          (y[:-1] + y[1:]) / 2, [1.5 * y[-1] - 0.5 * y[-2]]))
+        z = np.ma.masked_invalid(surface_df.values.T)
+
+        heatmap_kw = multi_get_copy("heatmap_kw", kwargs, {})
+        pcolormesh = subplot.pcolormesh(x_edges, y_edges, z, **heatmap_kw)
+        if kwargs.get("draw_contour", False):
+            contour_kw = multi_get_copy("contour_kw", kwargs, {})
+            subplot.contour(x, y, z, **contour_kw)
+
+        # Draw colorbar
+        if draw_colorbar:
+            from .myplotspec.axes import set_colorbar
+            if not hasattr(subplot, "_mps_partner_subplot"):
+                from .myplotspec.axes import add_partner_subplot
+                add_partner_subplot(subplot, **kwargs)
+            set_colorbar(subplot, pcolormesh, **kwargs)
+
     @manage_defaults_presets()
     @manage_kwargs()
     def draw_dataset(self, subplot, min_cutoff=None, logz=False,
         draw_heatmap=True, draw_mask=True, draw_colorbar=True, **kwargs):
         import numpy as np
+        from . import residue_index
         from .myplotspec import get_colors, multi_get_copy
 
         # Process arguments and load data
@@ -190,12 +322,14 @@ class PDist2DFigureManager(FigureManager):
         if "infile" in kwargs:
             dataset_kw["infile"] = kwargs["infile"]
         dataset = self.load_dataset(verbose=verbose, **dataset_kw)
+        if hasattr(dataset, "fes_df"):
+            return self.draw_surface(subplot, dataset,
+              draw_colorbar=draw_colorbar, **kwargs)
         if dataset is not None and hasattr(dataset, "pdist_df"):
             pdist_df = dataset.pdist_df
         else:
             pdist_df = dataset.dataframe
-        x = np.array( [filter(lambda x: x in "0123456789.", s)
-              for s in pdist_df.columns.values], np.int)
+        x = residue_index(pdist_df.columns)["number"].values
 
         # Configure plot settings
         plot_kw = multi_get_copy("plot_kw", kwargs, {})
@@ -204,9 +338,7 @@ class PDist2DFigureManager(FigureManager):
         # Draw heatmap
         if draw_heatmap:
             heatmap_kw = multi_get_copy("heatmap_kw", kwargs, {})
-            hm_x = np.arange(x.min(), x.max()+2, 1, np.int)
-            hm_y = pdist_df.index.values
-            hm_z = np.zeros((hm_x.size, hm_y.size)) * np.nan
+            hm_y = np.array(pdist_df.index.values, np.float64)
 
             gamma2_z = kwargs.get("gamma2_z", False)
             if gamma2_z:
@@ -215,77 +347,28 @@ class PDist2DFigureManager(FigureManager):
                 tc  = 6.72e-9 # CVNH: 8.7e-9; LysM: 6.72e-9   # s
                 gamma2 = k / (hm_y ** 6) * 1e9 * 1e9
                 gamma2 *= (4 * tc + ((3 * tc) / (1 + (w * tc ) ** 2)))
+            else:
+                gamma2 = None
 
-            subensemble_pop = kwargs.get("subensemble_pop", None)
+            hm_x, hm_z, outline = self.build_heatmap(x, pdist_df.values,
+              hm_y, min_cutoff=min_cutoff,
+              subensemble_pop=kwargs.get("subensemble_pop", None),
+              gamma2=gamma2, logz=logz)
             draw_outline = kwargs.get("draw_outline", True)
-            if draw_outline:
-                ol_x = []
-                ol_ylb = []
-                ol_yub = []
-
-            for residue in range(x.min(), x.max() + 1):
-                index_within_hm = np.argmax(hm_x == residue)
-                try:
-                    index_within_pdist = np.where(x == residue)[0][0]
-                except IndexError:
-                    hm_z[index_within_hm][:] = np.nan
-                    if draw_outline:
-                        ol_x.append(None)
-                        ol_ylb.append(None)
-                        ol_yub.append(None)
-                    continue
-                    
-                pdist_of_residue = pdist_df.values[:, index_within_pdist]
-
-                # Normalize, optionally scale by extected sum
-                pdist_of_residue /= np.nansum(pdist_of_residue)
-                if subensemble_pop is not None:
-                    pdist_of_residue *= subensemble_pop
-
-                # Set grid points below selected weight to 0
-                if min_cutoff is not None:
-                    pdist_of_residue[pdist_of_residue < min_cutoff] = np.nan
 
-                # Normalize again, and optionally scale again
-                pdist_of_residue /= np.nansum(pdist_of_residue)
-                if subensemble_pop is not None:
-                    pdist_of_residue *= subensemble_pop
-
-                # Convert from population to population-weighted Γ2
-                if gamma2_z:
-                    # Skip selected residues that have distance but for which
-                    #   Γ2 cannot be back-calculated
-                    if (residue in [55,56,57,58,59,60,61,
-                                    111,112,113,114,115,116,117]
-                    or (np.isnan(pdist_of_residue).all())):
-                        hm_z[index_within_hm][:] = np.nan
-                        if draw_outline:
-                            ol_x.append(None)
-                            ol_ylb.append(None)
-                            ol_yub.append(None)
-                        continue
-                    pdist_of_residue *= gamma2
-                    #print("{0:>4d} {1:>8.2f} {2:>8.2f}".format(residue,
-                    #  np.nansum(pdist_of_residue), np.nanmax(pdist_of_residue)))
-                if draw_outline:
-                    ol_x.extend([residue - 0.5, residue + 0.5])
-                    nonzero = np.where(np.logical_not(np.isnan(pdist_of_residue)))[0]
-                    ol_ylb.extend([hm_y[nonzero[0]], hm_y[nonzero[0]]])
-                    ol_yub.extend([hm_y[nonzero[-1]], hm_y[nonzero[-1]]])
-
-                hm_z[index_within_hm] = pdist_of_residue
-            hm_z = hm_z.T
-            if logz:
-                hm_z = -1 * np.log10(hm_z)
-            pcolormesh = subplot.pcolor(hm_x - 0.5, hm_y, hm_z, **heatmap_kw)
+            # pcolor previously drew cells between adjacent values of y,
+            #   discarding the last row and column of z; retain this layout
+            pcolormesh = subplot.pcolormesh(hm_x - 0.5, hm_y,
+              hm_z[:-1, :-1], **heatmap_kw)
             if draw_mask:
                 mask_kw = multi_get_copy("mask_kw", kwargs, {})
                 mask_z = np.ma.masked_where(
-                  np.logical_not(np.isnan(hm_z)),
-                  np.ones_like(hm_z))
+                  np.logical_not(np.isnan(hm_z[:-1, :-1])),
+                  np.ones_like(hm_z[:-1, :-1]))
                 subplot.pcolormesh(hm_x - 0.5, hm_y, mask_z, **mask_kw)
             if draw_outline:
                 outline_kw = kwargs.get("outline_kw", {})
+                ol_x, ol_ylb, ol_yub = outline
                 subplot.plot(ol_x, ol_ylb, **outline_kw)
                 subplot.plot(ol_x, ol_yub, **outline_kw)
 
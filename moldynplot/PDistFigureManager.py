@@ -16,11 +16,14 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
+from .DatasetPlanner import DatasetPlannerMixin
 ################################### CLASSES ###################################
-class PDistFigureManager(FigureManager):
+class PDistFigureManager(DatasetPlannerMixin, ParallelReportMixin,
+    FigureManager):
     """
     Manages the generation of probability distribution figures.
     """
@@ -19,13 +19,14 @@ if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
 
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 
 
 ################################### CLASSES ###################################
-class SAXSFigureManager(FigureManager):
+class SAXSFigureManager(ParallelReportMixin, FigureManager):
     """
     Manages the generation of time series figures
     """
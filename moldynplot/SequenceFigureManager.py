@@ -18,13 +18,16 @@ if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
 
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
+from .DatasetPlanner import DatasetPlannerMixin
 
 
 ################################### CLASSES ###################################
-class SequenceFigureManager(FigureManager):
+class SequenceFigureManager(DatasetPlannerMixin, ParallelReportMixin,
+    FigureManager):
     """
     Manages the generation of sequence figures.
 
@@ -395,6 +398,67 @@ class SequenceFigureManager(FigureManager):
             ms: 20
     """
 
+    @staticmethod
+    def build_sequence_arrays(x, ys, stepline=True, gapline=False):
+        """
+        Builds arrays for plotting values as a function of residue
+        number, with gaps where residues are missing.
+
+        Values are scattered into a grid spanning from the lowest to
+        the highest residue number in one step; residues without data
+        are represented by a single NaN, which matplotlib draws as a
+        break in the line or filled area. If a residue appears more
+        than once, its first value is used.
+
+        Arguments:
+          x (ndarray): Residue number of each value
+          ys (list): One or more arrays of values, each the same length
+            as *x*
+          stepline (bool): Represent each residue as a horizontal step
+            from number - 0.5 to number + 0.5, rather than as a point
+          gapline (bool): Add a gap after each residue, such that
+            adjacent residues are not connected
+
+        Returns:
+          (ndarray, list): x and list of y arrays, ready to be passed to
+          :meth:`plot<matplotlib.axes.Axes.plot>` or
+          :meth:`fill_between<matplotlib.axes.Axes.fill_between>`
+        """
+        import numpy as np
+
+        # Locate first value of each residue within grid
+        x = np.array(x, np.int64)
+        residues = np.arange(x.min(), x.max() + 1)
+        present = np.zeros(residues.size, np.bool_)
+        first = np.zeros(residues.size, np.int64)
+        numbers, indexes = np.unique(x, return_index=True)
+        present[numbers - x.min()] = True
+        first[numbers - x.min()] = indexes
+
+        # Lay out points of each residue; missing residues retain only
+        #   their first point, which is NaN
+        if stepline:
+            offsets = [-0.5, 0.5]
+        else:
+            offsets = [0.0]
+        n_points = len(offsets) + (1 if gapline else 0)
+        keep = np.zeros((residues.size, n_points), np.bool_)
+        keep[:, 0] = True
+        keep[present] = True
+
+        grid_x = np.full((residues.size, n_points), np.nan)
+        grid_x[present, :len(offsets)] = (residues[present, np.newaxis] +
+                                          np.array(offsets))
+        grid_x = grid_x[keep]
+        grid_ys = []
+        for y in ys:
+            grid_y = np.full((residues.size, n_points), np.nan)
+            grid_y[present, :len(offsets)] = np.asarray(y, np.float64)[
+                first[present], np.newaxis]
+            grid_ys.append(grid_y[keep])
+
+        return grid_x, grid_ys
+
     @manage_defaults_presets()
     @manage_kwargs()
     def draw_dataset(self, subplot, y_key=None, yse_key=None, yse_min=None,
@@ -430,6 +494,7 @@ class SequenceFigureManager(FigureManager):
         """
         from warnings import warn
         import numpy as np
+        from . import residue_index
         from .myplotspec import get_colors, multi_get_copy
 
         # Process arguments and load data
@@ -443,9 +508,10 @@ class SequenceFigureManager(FigureManager):
             skipping.""")
             return
         df = dataset.sequence_df
-        x = np.array(
-          [filter(lambda x: x in "0123456789.", s) for s in df.index.values],
-          np.int)
+        residue_df = getattr(dataset, "residue_df", None)
+        if residue_df is None or not residue_df.index.equals(df.index):
+            residue_df = residue_index(df.index)
+        x = residue_df["number"].values
 
         # Verbose output
         if verbose >= 2:
@@ -472,42 +538,26 @@ class SequenceFigureManager(FigureManager):
             else:
                 fill_between_kw = multi_get_copy("fill_between_kw", kwargs, {})
                 get_colors(fill_between_kw, plot_kw)
-                fb_x, fb_lb, fb_ub = [], [], []
-
-                for residue in range(x.min(), x.max() + 1):
-                    if residue in x:
-                        index = np.argmax(x == residue)
-                        fb_x.extend([residue - 0.5, residue + 0.5])
-                        # Priority given to explicit upper and lower bounds
-                        if ylb_key is not None and yub_key is not None:
-                            fb_lb.extend(
-                              [df[ylb_key][index], df[ylb_key][index]])
-                            fb_ub.extend(
-                              [df[yub_key][index], df[yub_key][index]])
-                        # Otherwise try for 95% CI using standard error
-                        else:
-                            if yse_key is not None:
-                                yse = df[yse_key][index]
-                                if yse_min is not None and yse < yse_min:
-                                    yse = yse_min
-                            elif yse_min is not None:
-                                yse = yse_min
-                            else:
-                                yse = 0
-                            fb_lb.extend([df[y_key][index] - yse * 1.96,
-                                df[y_key][index] - yse * 1.96])
-                            fb_ub.extend([df[y_key][index] + yse * 1.96,
-                                df[y_key][index] + yse * 1.96])
-                    # Add explicit gaps in sequence if no data is available
+                # Priority given to explicit upper and lower bounds
+                if ylb_key is not None and yub_key is not None:
+                    lb = np.array(df[ylb_key].values, np.float64)
+                    ub = np.array(df[yub_key].values, np.float64)
+                # Otherwise try for 95% CI using standard error
+                else:
+                    y = np.array(df[y_key].values, np.float64)
+                    if yse_key is not None:
+                        yse = np.array(df[yse_key].values, np.float64)
+                        if yse_min is not None:
+                            yse = np.maximum(yse, yse_min)
+                    elif yse_min is not None:
+                        yse = yse_min
                     else:
-                        fb_x.append(None)
-                        fb_lb.append(None)
-                        fb_ub.append(None)
-            fb_x = np.array(fb_x, np.float)
-            fb_lb = np.array(fb_lb, np.float)
-            fb_ub = np.array(fb_ub, np.float)
-
-            subplot.fill_between(fb_x, fb_lb, fb_ub, **fill_between_kw)
+                        yse = 0
+                    lb = y - yse * 1.96
+                    ub = y + yse * 1.96
+                fb_x, (fb_lb, fb_ub) = self.build_sequence_arrays(x,
+                  [lb, ub])
+                subplot.fill_between(fb_x, fb_lb, fb_ub, **fill_between_kw)
 
         # Plot error bar
         if draw_errorbar:
@@ -530,26 +580,11 @@ class SequenceFigureManager(FigureManager):
                 warn("""'draw_plot' is enabled but the necessary
                 parameter 'y_key' has not been provided, skipping.""")
             else:
-                p_x, p_y = [], []
                 stepline = kwargs.get("stepline", True)
                 gapline = kwargs.get("gapline", False)
-                for residue in range(x.min(), x.max() + 1):
-                    if residue in x:
-                        index = np.argmax(x == residue)
-                        if stepline:
-                            p_x.extend([residue - 0.5, residue + 0.5])
-                            p_y.extend([df[y_key][index], df[y_key][index]])
-                        else:
-                            p_x.append(residue)
-                            p_y.append(df[y_key][index])
-                        if gapline:
-                            p_x.append(None)
-                            p_y.append(None)
-                    else:
-                        p_x.append(None)
-                        p_y.append(None)
-                p_x = np.array(p_x, np.float)
-                p_y = np.array(p_y, np.float)
+                p_x, (p_y,) = self.build_sequence_arrays(x,
+                  [np.array(df[y_key].values, np.float64)], stepline=stepline,
+                  gapline=gapline)
                 plot = subplot.plot(p_x, p_y, **plot_kw)[0]
                 if verbose >= 2:
                     print(y_key, np.nanmean(p_y))
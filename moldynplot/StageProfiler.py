@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+#   moldynplot.StageProfiler.py
+#
+#   Copyright (C) 2015-2017 Karl T Debiec
+#   All rights reserved.
+#
+#   This software may be modified and distributed under the terms of the
+#   BSD license. See the LICENSE file for details.
+"""
+Records the time and memory used by each stage of a dataset's pipeline
+"""
+################################### MODULES ###################################
+from __future__ import (absolute_import, division, print_function,
+    unicode_literals)
+if __name__ == "__main__":
+    __package__ = str("moldynplot")
+    import moldynplot
+from contextlib import contextmanager
+import os
+import sys
+from timeit import default_timer
+
+
+################################## FUNCTIONS ##################################
+def get_cpu_time():
+    """
+    Gets CPU time used by this process.
+
+    Returns:
+      float: User and system CPU time (s)
+    """
+    times = os.times()
+    return times[0] + times[1]
+
+
+def get_peak_rss():
+    """
+    Gets peak resident set size of this process.
+
+    Returns:
+      int: Peak resident set size (bytes); None if unavailable on this
+      platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return int(peak_rss)
+    return int(peak_rss) * 1024
+
+
+################################### CLASSES ###################################
+class StageProfiler(object):
+    """
+    Records the time and memory used by each stage of a dataset's
+    pipeline.
+
+    Each stage records its wall time, CPU time, the peak resident set
+    size (RSS) of the process on completion, and the number of rows it
+    processed. Stages may be nested; e.g. 'parse' within 'read'. Peak RSS
+    is the high-water mark of the whole process, such that a stage whose
+    peak RSS exceeds that of the previous stage raised it.
+
+    Recording a stage costs a few microseconds, so datasets record their
+    stages whether or not the result is written.
+
+    Usage::
+
+        profiler = StageProfiler()
+        with profiler.stage("read") as stage:
+            df = read()
+            stage["rows"] = df.shape[0]
+        profiler.to_dataframe()
+        profiler.write("profile.json", format="chrome")
+    """
+
+    def __init__(self, stages=None):
+        """
+        Arguments:
+          stages (list): Previously recorded stages, e.g. those of the
+            dataset from which this one's data was taken
+        """
+        self.stages = [dict(s) for s in stages] if stages else []
+        self.depth = 0
+
+    def copy(self):
+        """
+        Returns:
+          StageProfiler: Profiler including the stages recorded so far
+        """
+        return StageProfiler(self.stages)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Records a stage.
+
+        Arguments:
+          name (str): Name of stage
+          rows (int): Number of rows processed; may alternatively be set
+            within the stage as item 'rows' of the yielded record
+
+        Yields:
+          dict: Record of stage
+        """
+        record = dict(name=name, depth=self.depth, rows=rows, pid=os.getpid())
+        self.stages.append(record)
+        self.depth += 1
+        start_cpu_time = get_cpu_time()
+        record["start"] = default_timer()
+        try:
+            yield record
+        finally:
+            record["wall time"] = default_timer() - record["start"]
+            record["cpu time"] = get_cpu_time() - start_cpu_time
+            record["peak rss"] = get_peak_rss()
+            self.depth -= 1
+
+    def to_dataframe(self):
+        """
+        Returns:
+          DataFrame: One row per stage, in the order in which they
+          started, with columns 'depth', 'start' (s, relative to the
+          first stage), 'wall time' (s), 'cpu time' (s), 'peak rss'
+          (bytes), and 'rows'
+        """
+        import pandas as pd
+
+        columns = ["name", "depth", "start", "wall time", "cpu time",
+            "peak rss", "rows"]
+        df = pd.DataFrame([[s.get(c) for c in columns] for s in self.stages],
+          columns=columns)
+        if df.shape[0] > 0:
+            df["start"] -= df["start"].min()
+        df = df.set_index("name")
+
+        return df
+
+    def to_json(self):
+        """
+        Returns:
+          dict: Stages, with start times relative to the first stage
+        """
+        t0 = min([s["start"] for s in self.stages] or [0])
+        stages = []
+        for s in self.stages:
+            stage = dict((k, v) for k, v in s.items() if k != "pid")
+            stage["start"] = s["start"] - t0
+            stages.append(stage)
+
+        return dict(stages=stages)
+
+    def to_chrome_trace(self):
+        """
+        Formats stages as Chrome trace events, which may be viewed in
+        chrome://tracing or Perfetto.
+
+        Each stage is a complete ('X') event, with CPU time, peak RSS,
+        and rows as arguments; peak RSS is also a counter ('C') event.
+
+        Returns:
+          dict: Trace
+        """
+        t0 = min([s["start"] for s in self.stages] or [0])
+        events = []
+        for s in self.stages:
+            ts = (s["start"] - t0) * 1e6
+            args = {"cpu time (s)": s.get("cpu time"),
+                "peak rss (MB)": (s["peak rss"] / 1048576 if s.get(
+                  "peak rss") is not None else None), "rows": s.get("rows")}
+            events.append(dict(name=s["name"], cat="moldynplot", ph="X",
+              ts=ts, dur=s.get("wall time", 0) * 1e6, pid=s["pid"], tid=0,
+              args=args))
+            if s.get("peak rss") is not None:
+                events.append(dict(name="peak rss", cat="moldynplot",
+                  ph="C", ts=ts + s.get("wall time", 0) * 1e6,
+                  pid=s["pid"], args={"MB": args["peak rss (MB)"]}))
+
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def write(self, outfile, format="json", **kwargs):
+        """
+        Writes stages to json.
+
+        Arguments:
+          outfile (str): Path to output file; may contain environment
+            variables
+          format (str): Format; may be 'json', or 'chrome' for Chrome
+            trace format
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+        """
+        from os.path import expandvars
+        import json
+        from .myplotspec import wiprint
+
+        verbose = kwargs.get("verbose", 1)
+        outfile = expandvars(outfile)
+        if format == "json":
+            profile = self.to_json()
+        elif format == "chrome":
+            profile = self.to_chrome_trace()
+        else:
+            raise ValueError("Unrecognized profile format '{0}'; ".format(
+              format) + "may be 'json' or 'chrome'")
+
+        if verbose >= 1:
+            wiprint("writing profile to '{0}'".format(outfile))
+        with open(outfile, "w") as out:
+            json.dump(profile, out, indent=1)
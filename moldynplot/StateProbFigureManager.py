@@ -19,13 +19,14 @@ if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
 
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
 
 
 ################################### CLASSES ###################################
-class StateProbFigureManager(FigureManager):
+class StateProbFigureManager(ParallelReportMixin, FigureManager):
     """
     Class to manage the generation of probability distribution figures
     """
@@ -178,6 +179,14 @@ class StateProbFigureManager(FigureManager):
             to subplot.plot()
           handles (OrderedDict, optional): Nascent OrderedDict of
             [labels]: handles on subplot
+          infile (str): Path to hdf5 file containing state probabilities
+            at 'assign/stateprobs', or if *state_kw* is provided, a
+            timeseries from which to calculate them
+          state_kw (dict, optional): Keyword arguments passed to
+            :meth:`TimeSeriesDataset.calc_state_probs
+            <moldynplot.dataset.TimeSeriesDataset.TimeSeriesDataset.calc_state_probs>`
+            to assign states of timeseries in *infile*; states should
+            be named 'bound' and 'unbound'
           kwargs (dict): Additional keyword arguments
         """
         from .myplotspec import get_colors, multi_get_copy
@@ -204,6 +213,14 @@ class StateProbFigureManager(FigureManager):
                 y = 1.0 - kwargs.pop("P unbound")
             else:
                 return
+        elif "state_kw" in kwargs:
+            from .dataset.TimeSeriesDataset import TimeSeriesDataset
+
+            state_kw = multi_get_copy("state_kw", kwargs, {})
+            probs = TimeSeriesDataset.calc_state_probs(
+                infile=kwargs["infile"], verbose=verbose, **state_kw)
+            y = 1.0 - probs["P unbound"]
+            yerr = probs["P unbound se"] * 1.96
         else:
             dataset = H5Dataset(default_address="assign/stateprobs",
                 default_key="pbound", **kwargs)
@@ -16,11 +16,14 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
+from .DatasetPlanner import DatasetPlannerMixin
 ################################### CLASSES ###################################
-class TimeSeries2DFigureManager(FigureManager):
+class TimeSeries2DFigureManager(DatasetPlannerMixin, ParallelReportMixin,
+    FigureManager):
     """
     Manages the generation of 2D time series figures.
 
@@ -354,11 +357,147 @@ class TimeSeries2DFigureManager(FigureManager):
             zticklabels: [0,"",2,"",4,"",6,"",8,"",10]
     """
 
+    @staticmethod
+    def aggregate_heatmap(x, y, z, shape, aggregate="mean", chunk_size=65536,
+      **kwargs):
+        """
+        Aggregates a time series to a coarser grid for display.
+
+        Frames and columns are divided into at most *shape* contiguous
+        bins of nearly equal size; axes that are already smaller than
+        *shape* are not aggregated. Each bin is reduced either to its
+        most common value, appropriate for integer-coded categorical
+        data such as secondary structure, or to its mean, ignoring NaN.
+        Frames are processed *chunk_size* at a time.
+
+        Arguments:
+          x (ndarray): Center of each frame
+          y (ndarray): Center of each column
+          z (ndarray): Values (frame, column)
+          shape (tuple): Maximum number of bins along x and y
+          aggregate (str): Reduction applied within each bin; may be
+            'mode' or 'mean'
+          chunk_size (int): Approximate number of frames to process at
+            once
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          (ndarray, ndarray, ndarray): Edges of bins along x and y, and
+          aggregated values (x bin, y bin)
+        """
+        import numpy as np
+        from .myplotspec import wiprint
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        if aggregate not in ("mode", "mean"):
+            raise ValueError("Aggregation '{0}' not understood; may be "
+                             "'mode' or 'mean'".format(aggregate))
+
+        def bin_starts(size, n_bins):
+            return np.unique(np.linspace(0, size, min(size, max(1, n_bins)),
+              endpoint=False).astype(np.int64))
+
+        def bin_edges(centers, starts):
+            if centers.size == 1:
+                edges = np.array([centers[0] - 0.5, centers[0] + 0.5])
+            else:
+                mid = (centers[1:] + centers[:-1]) / 2
+                edges = np.concatenate(([2 * centers[0] - mid[0]], mid,
+                  [2 * centers[-1] - mid[-1]]))
+            return np.append(edges[starts], edges[-1])
+
+        x_starts = bin_starts(z.shape[0], shape[0])
+        y_starts = bin_starts(z.shape[1], shape[1])
+        if verbose >= 1:
+            wiprint("""Aggregating {0} x {1} heatmap to {2} x {3} using
+                    {4}""".format(z.shape[0], z.shape[1], x_starts.size,
+              y_starts.size, aggregate))
+        if aggregate == "mode":
+            # Categories are assumed to be integers, as in secondary
+            #   structure assignments; values in between are ignored
+            if np.isnan(z).all():
+                categories = np.array([])
+            else:
+                low, high = int(np.nanmin(z)), int(np.nanmax(z))
+                categories = np.arange(low, high + 1)
+            y_bins = np.repeat(np.arange(y_starts.size),
+              np.diff(np.append(y_starts, z.shape[1])))
+
+        # Reduce frames in chunks of whole bins
+        bounds = np.append(x_starts, z.shape[0])
+        per_bin = max(1, z.shape[0] // x_starts.size)
+        bins_per_chunk = max(1, chunk_size // per_bin)
+        hm_z = np.full((x_starts.size, y_starts.size), np.nan)
+        for i in range(0, x_starts.size, bins_per_chunk):
+            j = min(i + bins_per_chunk, x_starts.size)
+            block = z[bounds[i]:bounds[j]]
+            starts = x_starts[i:j] - bounds[i]
+            if aggregate == "mean":
+                block = np.array(block, np.float64)
+                finite = ~np.isnan(block)
+                total = np.add.reduceat(np.add.reduceat(
+                  np.where(finite, block, 0), starts, axis=0), y_starts,
+                  axis=1)
+                count = np.add.reduceat(np.add.reduceat(
+                  finite.astype(np.int64), starts, axis=0), y_starts, axis=1)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    hm_z[i:j] = total / count
+            elif categories.size > 0:
+                # Count each category within each bin in one pass, by
+                #   combining bin and category into a single code
+                with np.errstate(invalid="ignore"):
+                    codes = block - low
+                    known = codes == np.floor(codes)
+                codes = np.where(known, codes, 0).astype(np.int64)
+                bins = (np.repeat(np.arange(j - i), np.diff(np.append(starts,
+                  block.shape[0])))[:, np.newaxis] * y_starts.size +
+                        y_bins[np.newaxis, :])
+                counts = np.bincount((bins * categories.size + codes)[known],
+                  minlength=(j - i) * y_starts.size * categories.size)
+                counts = np.reshape(counts,
+                  (j - i, y_starts.size, categories.size))
+                hm_z[i:j] = np.where(counts.max(axis=2) > 0,
+                  categories[np.argmax(counts, axis=2)], np.nan)
+
+        return bin_edges(x, x_starts), bin_edges(y, y_starts), hm_z
+
     @manage_defaults_presets()
     @manage_kwargs()
     def draw_dataset(self, subplot, label=None, handles=None, logz=False,
             draw_heatmap=False, draw_colorbar=False, draw_contour=False,
-            draw_legend=False, draw_label=True, **kwargs):
+            draw_legend=False, draw_label=True, raster=False, **kwargs):
+        """
+        Draws a dataset on a subplot
+
+        Arguments:
+          subplot (Axes): :class:`Axes<matplotlib.axes.Axes>` on which
+            to draw
+          dataset_kw (dict): Keyword arguments passed to
+            :meth:`load_dataset
+            <myplotspec.FigureManager.FigureManager.load_dataset>`
+          logz (bool): Draw log₁₀ of z
+          draw_heatmap (bool): Draw heatmap of time series
+          heatmap_kw (dict): Keyword arguments passed to
+            :meth:`pcolor<matplotlib.axes.Axes.pcolor>`, or
+            :meth:`pcolormesh<matplotlib.axes.Axes.pcolormesh>` if
+            *raster* is enabled
+          raster (bool): Aggregate heatmap to the resolution of the
+            subplot in pixels using :meth:`aggregate_heatmap`, and draw
+            as a single mesh rather than one polygon per frame and
+            column; log₁₀ is taken after aggregation
+          raster_kw (dict): Keyword arguments passed to
+            :meth:`aggregate_heatmap`; 'shape' (number of x and y bins)
+            defaults to the size of the subplot in pixels, and
+            'aggregate' to the 'downsample_mode' of *dataset_kw* if
+            present, otherwise 'mean'
+          draw_colorbar (bool): Draw colorbar
+          draw_contour (bool): Draw contour of time series
+          draw_label (bool): Draw label on subplot
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+        """
         import numpy as np
         import six
         from .myplotspec import get_colors, multi_get_copy
@@ -374,18 +513,44 @@ class TimeSeries2DFigureManager(FigureManager):
         # Draw heatmap
         if draw_heatmap:
             heatmap_kw = multi_get_copy("heatmap_kw", kwargs, {})
-            hm_x = timeseries_df.index.values
-            if "hm_y" in heatmap_kw:
-                hm_y = heatmap_kw.pop("hm_y")
+            if raster:
+                raster_kw = multi_get_copy("raster_kw", kwargs, {})
+                if "shape" not in raster_kw:
+                    extent = subplot.get_window_extent()
+                    raster_kw["shape"] = (int(np.ceil(extent.width)),
+                      int(np.ceil(extent.height)))
+                if "aggregate" not in raster_kw:
+                    raster_kw["aggregate"] = dataset_kw.get("downsample_mode",
+                      "mean")
+                hm_x = np.array(timeseries_df.index.values, np.float64)
+                if "hm_y" in heatmap_kw:
+                    hm_y = np.array(heatmap_kw.pop("hm_y"), np.float64)
+                else:
+                    try:
+                        hm_y = np.array(timeseries_df.columns, np.float64)
+                    except (TypeError, ValueError):
+                        hm_y = np.arange(1, timeseries_df.shape[1] + 1,
+                          dtype=np.float64)
+                hm_x, hm_y, hm_z = self.aggregate_heatmap(hm_x, hm_y,
+                  timeseries_df.values, verbose=verbose, **raster_kw)
+                if logz:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        hm_z = np.log10(hm_z)
+                pcolormesh = subplot.pcolormesh(hm_x, hm_y, hm_z.T,
+                  **heatmap_kw)
             else:
-                try:
-                    hm_y = np.array(timeseries_df.columns, np.float)
-                except:
-                    hm_y = np.array(range(1, timeseries_df.shape[1] + 2))
-            hm_z = timeseries_df.values.T
-            if logz:
-                hm_z = np.log10(hm_z)
-            pcolormesh = subplot.pcolor(hm_x, hm_y, hm_z, **heatmap_kw)
+                hm_x = timeseries_df.index.values
+                if "hm_y" in heatmap_kw:
+                    hm_y = heatmap_kw.pop("hm_y")
+                else:
+                    try:
+                        hm_y = np.array(timeseries_df.columns, np.float)
+                    except:
+                        hm_y = np.array(range(1, timeseries_df.shape[1] + 2))
+                hm_z = timeseries_df.values.T
+                if logz:
+                    hm_z = np.log10(hm_z)
+                pcolormesh = subplot.pcolor(hm_x, hm_y, hm_z, **heatmap_kw)
 
             # Draw colorbar
             if draw_colorbar:
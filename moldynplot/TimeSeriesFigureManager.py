@@ -16,11 +16,14 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
+from . import ParallelReportMixin
 from .myplotspec.FigureManager import FigureManager
 from .myplotspec.manage_defaults_presets import manage_defaults_presets
 from .myplotspec.manage_kwargs import manage_kwargs
+from .DatasetPlanner import DatasetPlannerMixin
 ################################### CLASSES ###################################
-class TimeSeriesFigureManager(FigureManager):
+class TimeSeriesFigureManager(DatasetPlannerMixin, ParallelReportMixin,
+    FigureManager):
     """
     Manages the generation of time series figures.
 
@@ -334,11 +337,166 @@ class TimeSeriesFigureManager(FigureManager):
             yticklabels: []
     """
 
+    @staticmethod
+    def _bin_frames(x, width, origin=0.0, breaks=None):
+        """
+        Divides frames into bins of equal width in x.
+
+        Arguments:
+          x (ndarray): x of each frame, in ascending order
+          width (float): Width of each bin
+          origin (float): x of an edge between bins, e.g. the lower limit
+            of the plot
+          breaks (ndarray): Boolean array marking frames that are gaps in
+            the series (e.g. NaN); each run of such frames is placed in a
+            bin of its own, such that bins do not span gaps
+
+        Returns:
+          (ndarray, ndarray): Index of first frame in each nonempty bin,
+          and bin of each frame (numbered among nonempty bins)
+        """
+        import numpy as np
+
+        x = np.asarray(x, np.float64)
+        key = np.floor((x - origin) / width)
+        change = key[1:] != key[:-1]
+        if breaks is not None:
+            breaks = np.asarray(breaks, bool)
+            change |= breaks[1:] != breaks[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+        bins = np.repeat(np.arange(starts.size),
+          np.diff(np.append(starts, x.size)))
+
+        return starts, bins
+
+    @staticmethod
+    def get_bin_width(subplot, x, n_bins):
+        """
+        Determines width in x of bins used to decimate a series.
+
+        Arguments:
+          subplot (Axes): Axes on which series will be drawn
+          x (ndarray): x of each frame, in ascending order
+          n_bins (int): Number of bins spanning the x limits of
+            *subplot*
+
+        Returns:
+          (float, float): Width of each bin, and x of an edge between
+          bins; if x is autoscaled, the limits are taken to include the
+          full extent of *x*, since they will once it is drawn
+        """
+        import numpy as np
+
+        lower, upper = sorted(subplot.get_xlim())
+        if subplot.get_autoscalex_on() and len(x) > 0:
+            lower = min(lower, np.nanmin(x))
+            upper = max(upper, np.nanmax(x))
+        if not upper > lower:
+            return None, None
+
+        return (upper - lower) / n_bins, lower
+
+    @staticmethod
+    def decimate(x, y, width, origin=0.0):
+        """
+        Reduces a series to the points that determine its appearance.
+
+        Frames are divided into bins of *width* in x, and within each
+        the first, last, minimum, and maximum points are retained in
+        their original order. When bins are no wider than the pixel
+        columns of the plot, the line drawn through the retained points
+        spans the same extent within each column as that drawn through
+        all points, including the segments joining adjacent bins. Runs
+        of NaN are binned separately, such that gaps in the series are
+        preserved; series that are not reduced are returned as is.
+
+        Arguments:
+          x (ndarray): x of each frame, in ascending order
+          y (ndarray): y of each frame
+          width (float): Width of each bin
+          origin (float): x of an edge between bins
+
+        Returns:
+          (ndarray, ndarray): Decimated x and y
+        """
+        import numpy as np
+
+        x = np.asarray(x)
+        y = np.asarray(y, np.float64)
+        if x.size == 0 or not width:
+            return x, y
+        starts, bins = TimeSeriesFigureManager._bin_frames(x, width, origin,
+          np.isnan(y))
+        if x.size <= 4 * starts.size:
+            return x, y
+        last = np.append(starts[1:], x.size) - 1
+
+        # Locate first occurrence of minimum and maximum of each bin; bins
+        #   of NaN have neither, and retain only their first and last
+        with np.errstate(invalid="ignore"):
+            low = np.fmin.reduceat(y, starts)
+            high = np.fmax.reduceat(y, starts)
+        selected = [starts, last]
+        for extreme in (low, high):
+            match = np.flatnonzero(y == extreme[bins])
+            selected.append(match[np.unique(bins[match], return_index=True)[1]])
+        selected = np.unique(np.concatenate(selected))
+
+        return x[selected], y[selected]
+
+    @staticmethod
+    def decimate_envelope(x, lb, ub, width, origin=0.0):
+        """
+        Reduces lower and upper bounds of a filled region to their
+        extremes within each bin.
+
+        Frames are divided into bins of *width* in x; within each, the
+        lowest lower bound and highest upper bound are placed at the
+        first and last x of the bin, such that the filled region covers
+        the same extent as the original. Runs of frames in which either
+        bound is NaN are binned separately and remain NaN, such that the
+        region is not filled across gaps. Series that are not reduced
+        are returned as is.
+
+        Arguments:
+          x (ndarray): x of each frame, in ascending order
+          lb (ndarray): Lower bound of each frame
+          ub (ndarray): Upper bound of each frame
+          width (float): Width of each bin
+          origin (float): x of an edge between bins
+
+        Returns:
+          (ndarray, ndarray, ndarray): Decimated x, lower bound, and upper
+          bound
+        """
+        import numpy as np
+
+        x = np.asarray(x)
+        lb = np.asarray(lb, np.float64)
+        ub = np.asarray(ub, np.float64)
+        if x.size == 0 or not width:
+            return x, lb, ub
+        gaps = np.isnan(lb) | np.isnan(ub)
+        starts, bins = TimeSeriesFigureManager._bin_frames(x, width, origin,
+          gaps)
+        if x.size <= 2 * starts.size:
+            return x, lb, ub
+        last = np.append(starts[1:], x.size) - 1
+
+        with np.errstate(invalid="ignore"):
+            lb = np.where(gaps[starts], np.nan, np.fmin.reduceat(lb, starts))
+            ub = np.where(gaps[starts], np.nan, np.fmax.reduceat(ub, starts))
+        lb = np.repeat(lb, 2)
+        ub = np.repeat(ub, 2)
+        x = x[np.column_stack((starts, last)).flatten()]
+
+        return x, lb, ub
+
     @manage_defaults_presets()
     @manage_kwargs()
     def draw_dataset(self, subplot, label=None, column=None, handles=None,
             draw_pdist=False, draw_fill_between=False, draw_mean=False,
-            draw_plot=True, **kwargs):
+            draw_plot=True, decimate=False, **kwargs):
         """
         Draws a dataset on a subplot
 
@@ -358,6 +516,12 @@ class TimeSeriesFigureManager(FigureManager):
             dataset
           draw_mean (bool): Draw point at mean value value of
             probability distribution
+          decimate (bool, int): Reduce plot and fill_between to the
+            points that determine their appearance within each of a
+            number of bins spanning the x limits of the subplot, using
+            :meth:`decimate` and :meth:`decimate_envelope`; if True, the
+            number of bins is twice the width of the subplot in pixels;
+            plot is not decimated if *plot_kw* draws markers or no line
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
         """
@@ -384,6 +548,18 @@ class TimeSeriesFigureManager(FigureManager):
         # Configure plot settings
         plot_kw = multi_get_copy("plot_kw", kwargs, {})
         get_colors(plot_kw, kwargs)
+        if decimate is True:
+            n_bins = 2 * int(np.ceil(subplot.get_window_extent().width))
+        elif decimate:
+            n_bins = int(decimate)
+        else:
+            n_bins = None
+
+        if n_bins is not None:
+            linestyle = plot_kw.get("linestyle", plot_kw.get("ls", "-"))
+            draw_line = linestyle not in (None, "", " ", "None", "none")
+            draw_marker = plot_kw.get("marker") not in (None, "", " ",
+              "None", "none")
 
         # Draw fill_between
         if draw_fill_between:
@@ -414,6 +590,10 @@ class TimeSeriesFigureManager(FigureManager):
                 fb_yub = dataset.timeseries_df[yub_key]
             else:
                 warn("inappropriate fill_between settings")
+            if n_bins is not None:
+                width, origin = self.get_bin_width(subplot, fb_x, n_bins)
+                fb_x, fb_ylb, fb_yub = self.decimate_envelope(fb_x, fb_ylb,
+                  fb_yub, width, origin)
             subplot.fill_between(fb_x, fb_ylb, fb_yub, **fill_between_kw)
 
         # Draw plot
@@ -424,6 +604,9 @@ class TimeSeriesFigureManager(FigureManager):
             else:
                 p_x = dataset.timeseries_df.index.values
                 p_y = dataset.timeseries_df[column]
+            if n_bins is not None and draw_line and not draw_marker:
+                width, origin = self.get_bin_width(subplot, p_x, n_bins)
+                p_x, p_y = self.decimate(p_x, p_y, width, origin)
             plot = subplot.plot(p_x, p_y, **plot_kw)[0]
             handle_kw = multi_get_copy("handle_kw", kwargs, {})
             handle_kw["mfc"] = plot.get_color()
@@ -125,12 +125,121 @@ def three_one(three):
         "TYR": "Y", "VAL": "V"}[three.upper()]
 
 
+def residue_index(residues):
+    """
+    Parses residues in the form ``XAA:#`` into their names and numbers.
+
+    All residues are parsed at once, such that sorting, selection, and
+    plotting may use the resulting integer numbers directly rather than
+    splitting each string again.
+
+    Arguments:
+      residues (list, Index): Residues in the form ``XAA:#``, ``XAA#``,
+        or ``#``; names followed by ':' may contain any character other
+        than ':', e.g. ``T3P:5``, while names not followed by ':' may
+        contain only letters
+
+    Returns:
+      DataFrame: DataFrame whose index is *residues* and whose columns
+      are 'number' (int) and 'name' (categorical; empty if absent)
+    """
+    import numpy as np
+    import pandas as pd
+
+    residues = pd.Index(residues)
+    parsed = pd.Series(residues.astype(str), index=residues).str.extract(
+      r"^(?:(?P<name>[^:]*):|(?P<bare_name>[A-Za-z]*))(?P<number>-?[0-9]+)$",
+      expand=True)
+    if parsed["number"].isnull().any():
+        raise ValueError("Residues '{0}' not in the form 'XAA:#'".format(
+          list(residues[parsed["number"].isnull().values])))
+
+    residue_df = pd.DataFrame(index=residues)
+    residue_df["number"] = parsed["number"].values.astype(np.int64)
+    residue_df["name"] = pd.Categorical(
+      parsed["name"].fillna(parsed["bare_name"]).values)
+
+    return residue_df
+
+
+def sort_residues(df, residue_df=None):
+    """
+    Sorts a DataFrame whose index contains residues by residue number.
+
+    Arguments:
+      df (DataFrame): DataFrame whose index contains residues in the
+        form ``XAA:#``
+      residue_df (DataFrame, optional): Residue index of *df*, as
+        returned by :func:`residue_index`; parsed if omitted
+
+    Returns:
+      (DataFrame, DataFrame): *df* and its residue index, sorted by
+      residue number
+    """
+    import numpy as np
+
+    if residue_df is None:
+        residue_df = residue_index(df.index)
+    order = np.argsort(residue_df["number"].values, kind="mergesort")
+
+    return df.iloc[order], residue_df.iloc[order]
+
+
+def get_fork_context():
+    """
+    Gets a multiprocessing context that starts processes by forking.
+
+    Forked processes inherit the state of the parent, including nested
+    functions and loaded datasets, which need not then be pickled.
+
+    Returns:
+      module, BaseContext: Fork context if available, otherwise
+      :mod:`multiprocessing`, whose processes are forked on POSIX
+      systems under Python 2
+    """
+    import multiprocessing
+
+    try:
+        return multiprocessing.get_context("fork")
+    except (AttributeError, ValueError):
+        return multiprocessing
+
+
+def multiprocess_worker(function, arguments, queue_in, queue_out):
+    """
+    Runs a function with arguments selected by indexes from one queue,
+    and outputs results to another, until None is received.
+
+    Arguments:
+      function (function): Function to run
+      arguments (list): Arguments to pass to function
+      queue_in (Queue): Queue of index of argument
+      queue_out (Queue): Queue of index, whether function completed, and
+        either result or traceback
+    """
+    import traceback
+
+    while True:
+        i = queue_in.get()
+        if i is None:
+            break  # 'None' signals that queue is empty
+        try:
+            queue_out.put((i, True, function(arguments[i])))
+        except Exception:
+            queue_out.put((i, False, traceback.format_exc()))
+
+
 def multiprocess_map(function, arguments, n_processes=1):
     """
     Runs a function with arguments using n_processes.
 
     Meant as a replacement for :func:`multiproccessing.Pool.imap_unordered`,
-    which can only accept module-level functions.
+    which can only accept module-level functions. Processes are forked
+    (see :func:`get_fork_context`), such that *function* may be a nested
+    function and *function* and *arguments* are inherited by workers
+    rather than pickled; only the index of each argument is sent to
+    workers. Where forking is unavailable, *function* and *arguments*
+    must be picklable.
 
     Arguments:
       function (function): Function to run
@@ -139,49 +248,250 @@ def multiprocess_map(function, arguments, n_processes=1):
 
     Returns:
       list: results returned from function
-    """
-    from multiprocessing import Queue, Process
-
-    def spawn(function):
-        """
-        Arguments:
-          function: Function to run
-
-        Returns:
-          function: New Function that accepts arguments from queue_in
-          and outputs results of function to queue_out
-        """
 
-        def run_function(queue_in, queue_out):
-            while True:
-                i, argument = queue_in.get()
-                if i is None:
-                    break  # 'None' signals that queue is empty
-                queue_out.put((i, function(argument)))
+    Raises:
+      RuntimeError: *function* raised an exception, or a worker process
+        exited without returning a result
+    """
+    try:
+        from queue import Empty
+    except ImportError:
+        from Queue import Empty
 
-        return run_function
+    context = get_fork_context()
+    arguments = list(arguments)
 
     # Initialize queues
-    queue_in = Queue(1)
-    queue_out = Queue()
+    queue_in = context.Queue()
+    queue_out = context.Queue()
 
     # Initialize processes and link to input and output queues
-    processes = [Process(target=spawn(function), args=(queue_in, queue_out))
-        for i in range(n_processes)]
+    processes = [context.Process(target=multiprocess_worker,
+      args=(function, arguments, queue_in, queue_out)) for i in
+        range(n_processes)]
     for p in processes:
         p.daemon = True
         p.start()
 
     # Construct input queue, including 'None' signals to terminate
-    input = [queue_in.put((i, argument)) for i, argument in
-        enumerate(arguments)]
+    for i in range(len(arguments)):
+        queue_in.put(i)
     for i in range(n_processes):
-        queue_in.put((None, None))
+        queue_in.put(None)
 
-    # Retrieve output queue
-    output = [queue_out.get() for i in range(len(input))]
+    # Retrieve output queue, failing if all workers exit prematurely
+    output = []
+    while len(output) < len(arguments):
+        try:
+            output.append(queue_out.get(timeout=1))
+        except Empty:
+            if any(p.is_alive() for p in processes):
+                continue
+            try:
+                output.append(queue_out.get(timeout=1))
+            except Empty:
+                raise RuntimeError("Worker processes exited after " +
+                  "returning {0} of {1} results".format(len(output),
+                    len(arguments)))
 
     # Rejoin processes and return results
     for p in processes:
         p.join()
-    return [x for i, x in sorted(output)]
+    errors = [x for i, completed, x in sorted(output) if not completed]
+    if len(errors) > 0:
+        raise RuntimeError("{0} of {1} calls ".format(len(errors),
+          len(arguments)) + "raised an exception:\n" + "\n".join(errors))
+    return [x for i, completed, x in sorted(output)]
+
+
+def merge_dicts(base, update):
+    """
+    Recursively merges one dictionary into another.
+
+    Arguments:
+      base (dict): Dictionary to be updated in place
+      update (dict): Dictionary whose values take precedence; nested
+        dictionaries are merged rather than replaced
+
+    Returns:
+      dict: *base*
+    """
+    from copy import deepcopy
+
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_dicts(base[key], value)
+        else:
+            base[key] = deepcopy(value)
+    return base
+
+
+def load_yaml_spec(yaml_spec):
+    """
+    Loads a YAML specification of a report.
+
+    Arguments:
+      yaml_spec (str, dict, list): Path to YAML file, which may contain
+        environment variables, or specification already loaded as a
+        dict; if list, specifications are merged in order such that
+        later ones take precedence
+
+    Returns:
+      dict: Specification
+    """
+    from copy import deepcopy
+    from os.path import expandvars
+    import six
+    import yaml
+
+    if isinstance(yaml_spec, six.string_types):
+        with open(expandvars(yaml_spec), "r") as yaml_file:
+            return yaml.load(yaml_file, Loader=yaml.Loader) or {}
+    elif isinstance(yaml_spec, dict):
+        return deepcopy(yaml_spec)
+    spec = {}
+    for yaml_spec_i in yaml_spec:
+        merge_dicts(spec, load_yaml_spec(yaml_spec_i))
+    return spec
+
+
+def draw_report_worker(figure_manager, spec):
+    """
+    Draws a report in a worker process using the Agg backend.
+
+    Arguments:
+      figure_manager (FigureManager): Figure manager used to draw
+      spec (dict): Specification of report
+
+    Returns:
+      str: Traceback if report could not be drawn, otherwise None
+    """
+    import traceback
+    import matplotlib.pyplot as plt
+
+    try:
+        plt.switch_backend("Agg")
+        figure_manager.draw_report(**spec)
+        plt.close("all")
+    except Exception:
+        return traceback.format_exc()
+
+
+def draw_report_parallel(figure_manager, n_processes=None, **kwargs):
+    """
+    Draws the figures of a report in parallel.
+
+    The specification is split into one report per figure, each
+    retaining the shared 'all' figure and the report-level settings,
+    and each is drawn by :meth:`draw_report` of *figure_manager* in a
+    worker process using the non-interactive Agg backend. Workers are
+    forked from the current process after the datasets of all figures
+    have been loaded into the dataset cache of *figure_manager* using
+    :class:`DatasetPlanner<moldynplot.DatasetPlanner.DatasetPlanner>`,
+    such that they are shared with all workers copy-on-write rather than
+    read again by each; *figure_manager* is inherited by the workers
+    rather than pickled, and only the index of each figure is sent to
+    them. Reports that save all figures to a single outfile, or for
+    which processes cannot be forked, are drawn serially.
+
+    Arguments:
+      figure_manager (FigureManager): Figure manager used to draw
+      n_processes (int, optional): Number of worker processes; if None
+        or 0, the number of available cores
+      plan_datasets (bool): Load datasets before forking workers
+      yaml_spec (str, dict, list): Specification of report; see
+        :func:`load_yaml_spec`
+      kwargs (dict): Additional keyword arguments passed to
+        :meth:`draw_report`
+
+    Returns:
+      int: Number of figures drawn
+
+    Raises:
+      RuntimeError: A figure could not be drawn
+    """
+    from copy import deepcopy
+    from multiprocessing import cpu_count
+    import os
+    import six
+    from .myplotspec import wiprint
+
+    # Process arguments
+    verbose = kwargs.get("verbose", 1)
+    spec = load_yaml_spec(kwargs.pop("yaml_spec", {}))
+    for key, value in kwargs.items():
+        spec[key] = value
+    figures = spec.get("figures", {})
+    indexes = sorted([i for i in figures if isinstance(i, int) or (
+      isinstance(i, six.string_types) and i.isdigit())], key=int)
+    if not n_processes:
+        n_processes = cpu_count()
+    n_processes = max(1, min(n_processes, len(indexes)))
+
+    # Draw serially if figures cannot be separated
+    if (n_processes == 1 or spec.get("outfile") is not None
+      or not hasattr(os, "fork")):
+        figure_manager.draw_report(**spec)
+        return len(indexes)
+
+    # Load datasets of all figures once, before forking workers
+    if spec.get("plan_datasets", True):
+        from .DatasetPlanner import DatasetPlanner
+
+        DatasetPlanner(figure_manager).load(**deepcopy(spec))
+
+    # Split report into one specification per figure
+    specs = []
+    for i in indexes:
+        spec_i = dict((k, v) for k, v in spec.items() if k != "figures")
+        spec_i["figures"] = dict((k, v) for k, v in figures.items() if
+          k not in indexes)
+        spec_i["figures"][i] = figures[i]
+        specs.append(deepcopy(spec_i))
+
+    if verbose >= 1:
+        wiprint("drawing {0} figures using {1} processes".format(
+          len(specs), n_processes))
+    errors = [e for e in multiprocess_map(
+      lambda spec_i: draw_report_worker(figure_manager, spec_i), specs,
+      n_processes) if e is not None]
+    if len(errors) > 0:
+        raise RuntimeError("{0} of {1} figures ".format(len(errors),
+          len(specs)) + "could not be drawn:\n" + "\n".join(errors))
+
+    return len(specs)
+
+
+################################### CLASSES ###################################
+class ParallelReportMixin(object):
+    """
+    Provides command-line functionality to figure managers, drawing the
+    figures of a report in parallel using :func:`draw_report_parallel`.
+    """
+
+    def main(self):
+        """
+        Provides command-line functionality.
+        """
+        import argparse
+        from inspect import getmodule
+
+        parser = argparse.ArgumentParser(
+          description=getmodule(self.__class__).__doc__,
+          formatter_class=argparse.RawDescriptionHelpFormatter)
+        parser.add_argument("-yaml", type=str, nargs="+", required=True,
+          dest="yaml_spec", metavar="/PATH/TO/YAML.yml",
+          help="""YAML specification of report; if several are provided,
+          later take precedence""")
+        parser.add_argument("-n", "--n_processes", type=int, default=1,
+          metavar="N", help="""number of processes used to draw figures; 0
+          for one per available core (default: 1)""")
+        verbosity = parser.add_mutually_exclusive_group()
+        verbosity.add_argument("-v", "--verbose", action="count", default=1,
+          help="""enable verbose output, may be specified more than
+          once""")
+        verbosity.add_argument("-q", "--quiet", action="store_const",
+          const=0, dest="verbose", help="""disable verbose output""")
+
+        kwargs = vars(parser.parse_args())
+        draw_report_parallel(self, **kwargs)
@@ -17,7 +17,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
 from .SequenceDataset import SequenceDataset
@@ -123,11 +122,7 @@ class ChemicalShiftDataset(SequenceDataset):
 
         # Cut data
         if "use_indexes" in kwargs:
-            use_indexes = np.array(kwargs.pop("use_indexes"))
-            res_index = np.array(
-              [int(i.split(":")[1]) for i in self.sequence_df.index.values])
-            self.sequence_df = self.sequence_df[
-                np.in1d(res_index, use_indexes)]
+            self.select_residues(kwargs.pop("use_indexes"))
 
         # Calculate relaxation
         if calc_relax:
@@ -154,6 +149,8 @@ class ChemicalShiftDataset(SequenceDataset):
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
     def read(self, **kwargs):
@@ -227,11 +224,7 @@ class ChemicalShiftDataset(SequenceDataset):
         self.dfs = dfs
 
         # Sort
-        if df.index.name == "residue":
-            df = df.loc[
-                sorted(df.index.values, key=lambda x: int(x.split(":")[1]))]
-        else:
-            df = df.loc[sorted(df.index.values)]
+        df, self.residue_df = self.sort_sequence(df)
 
         return df
 
@@ -19,10 +19,9 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
-import h5py
 import numpy as np
 import pandas as pd
+import six
 from ..myplotspec.Dataset import Dataset
 from ..myplotspec import sformat, wiprint
 
@@ -78,8 +77,16 @@ class CorrDataset(Dataset):
         return "Dataset previously loaded from '{0}' and '{1}'".format(
           cache_key[1][1], cache_key[2][1])
 
-    def __init__(self, verbose=1, debug=0, **kwargs):
+    def __init__(self, verbose=1, debug=0, calc_stats=False, **kwargs):
         """
+        Arguments:
+          x_kw (dict): Keyword arguments used to load x dataset
+          y_kw (dict): Keyword arguments used to load y dataset
+          calc_stats (bool): Calculate correlation statistics using
+            :meth:`calc_stats`; store in instance variable `stats_df`
+          stats_kw (dict): Keyword arguments passed to :meth:`calc_stats`
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
         """
         from ..myplotspec import multi_get_copy
 
@@ -115,6 +122,150 @@ class CorrDataset(Dataset):
 
         self.dataframe = corr
 
+        # Calculate statistics
+        if calc_stats:
+            self.stats_df = self.calc_stats(corr, verbose=verbose,
+              **kwargs.get("stats_kw", {}))
+            if verbose >= 2:
+                wiprint("Correlation statistics:")
+                print(self.stats_df)
+            if isinstance(calc_stats, six.string_types):
+                self.stats_df.to_csv(calc_stats, sep=str(" "))
+
+    @staticmethod
+    def _calc_weighted_stats(weight, x, y):
+        """
+        Calculates weighted correlation statistics.
+
+        Arguments:
+          weight (ndarray): Weight of each point (replicate, point,
+            field); zero for points excluded from a replicate
+          x (ndarray): x values, broadcastable to *weight*
+          y (ndarray): y values, broadcastable to *weight*
+
+        Returns:
+          dict: R, R², MAE, RMSE, and slope of y against x (replicate,
+          field)
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            total = weight.sum(axis=1)
+            x_mean = (weight * x).sum(axis=1) / total
+            y_mean = (weight * y).sum(axis=1) / total
+            x_dev = x - x_mean[:, np.newaxis]
+            y_dev = y - y_mean[:, np.newaxis]
+            xx = (weight * x_dev ** 2).sum(axis=1)
+            yy = (weight * y_dev ** 2).sum(axis=1)
+            xy = (weight * x_dev * y_dev).sum(axis=1)
+            diff = y - x
+            r = xy / np.sqrt(xx * yy)
+            return dict(r=r, r2=r ** 2,
+              mae=(weight * np.abs(diff)).sum(axis=1) / total,
+              rmse=np.sqrt((weight * diff ** 2).sum(axis=1) / total),
+              slope=xy / xx)
+
+    @staticmethod
+    def calc_stats(corr, n_bootstrap=1000, ci=95, propagate_se=False,
+      seed=None, **kwargs):
+        """
+        Calculates correlation statistics of all fields at once.
+
+        R, R², MAE, RMSE, and slope are calculated for each field from
+        the points at which both x and y are available. Confidence
+        intervals are estimated by bootstrapping: a matrix of the number
+        of times each point is drawn in each replicate is sampled at
+        once from a multinomial distribution, and statistics of all
+        replicates are calculated from it together.
+
+        The scatter of the points already reflects their measurement
+        error, so standard errors of x and y are not folded into the
+        bootstrap. If *propagate_se*, the spread of each statistic due
+        to measurement error alone is instead reported separately: the
+        values are perturbed by normally-distributed noise of their
+        standard errors *n_bootstrap* times, without resampling, and the
+        standard deviation of the resulting statistics is reported.
+
+        Arguments:
+          corr (DataFrame): Correlation DataFrame whose columns are a
+            MultiIndex of field and 'x' or 'y', as built by
+            :class:`CorrDataset`
+          n_bootstrap (int): Number of bootstrap replicates; if 0,
+            confidence intervals are not calculated
+          ci (float): Width of confidence interval, in percent
+          propagate_se (bool): Calculate spread of statistics arising
+            from standard errors of fields ('<field>_se')
+          seed (int): Seed of random number generator
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: Statistics whose index is field and whose columns
+          are 'n', 'r', 'r2', 'mae', 'rmse', 'slope', and, if
+          bootstrapped, the standard error ('_se') and lower and upper
+          bounds of the confidence interval ('_lb', '_ub') of each, and,
+          if propagated, the standard deviation arising from standard
+          errors of fields ('_prop_se') of each
+        """
+        verbose = kwargs.get("verbose", 1)
+        stats = ["r", "r2", "mae", "rmse", "slope"]
+
+        fields = [c for c in corr.columns.get_level_values(0).unique() if
+            not c.endswith("_se") and (c, "x") in corr.columns and
+            (c, "y") in corr.columns]
+        x = np.array(corr[[(f, "x") for f in fields]].values, np.float64)
+        y = np.array(corr[[(f, "y") for f in fields]].values, np.float64)
+        mask = np.isfinite(x) & np.isfinite(y)
+        x[~mask] = 0
+        y[~mask] = 0
+
+        # Calculate statistics of data
+        point = CorrDataset._calc_weighted_stats(
+          mask[np.newaxis].astype(np.float64), x[np.newaxis], y[np.newaxis])
+        stats_df = pd.DataFrame(index=pd.Index(fields, name="field"))
+        stats_df["n"] = mask.sum(axis=0)
+        for stat in stats:
+            stats_df[stat] = point[stat][0]
+        if n_bootstrap is None or n_bootstrap < 1 or x.shape[0] == 0:
+            return stats_df
+
+        # Bootstrap
+        if verbose >= 1:
+            wiprint("bootstrapping correlation statistics of {0} ".format(
+              len(fields)) + "fields using {0} replicates".format(
+              n_bootstrap))
+        random = np.random.RandomState(seed)
+        n_points = x.shape[0]
+        counts = random.multinomial(n_points, np.ones(n_points) / n_points,
+          size=n_bootstrap).astype(np.float64)
+        weight = counts[:, :, np.newaxis] * mask[np.newaxis]
+        replicates = CorrDataset._calc_weighted_stats(weight, x[np.newaxis],
+          y[np.newaxis])
+        for stat in stats:
+            stats_df[stat + "_se"] = np.nanstd(replicates[stat], axis=0,
+              ddof=1)
+            stats_df[stat + "_lb"] = np.nanpercentile(replicates[stat],
+              (100 - ci) / 2, axis=0)
+            stats_df[stat + "_ub"] = np.nanpercentile(replicates[stat],
+              100 - (100 - ci) / 2, axis=0)
+
+        # Propagate standard errors
+        if propagate_se:
+            perturbed = []
+            for values, axis in [(x, "x"), (y, "y")]:
+                se = np.zeros_like(values)
+                for i, field in enumerate(fields):
+                    if (field + "_se", axis) in corr.columns:
+                        se[:, i] = np.nan_to_num(np.array(
+                          corr[(field + "_se", axis)].values, np.float64))
+                perturbed.append(values + se * random.normal(
+                  size=(n_bootstrap,) + values.shape))
+            replicates = CorrDataset._calc_weighted_stats(
+              mask[np.newaxis].astype(np.float64), *perturbed)
+            for stat in stats:
+                stats_df[stat + "_prop_se"] = np.nanstd(replicates[stat],
+                  axis=0, ddof=1)
+
+        return stats_df
+
 
 #################################### MAIN #####################################
 if __name__ == "__main__":
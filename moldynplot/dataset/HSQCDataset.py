@@ -18,7 +18,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
 from ..myplotspec.Dataset import Dataset
@@ -132,6 +131,8 @@ class HSQCDataset(Dataset):
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
     def _read_nmr(self, infile, **kwargs):
@@ -22,7 +22,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
 from .RelaxDataset import RelaxDataset
@@ -85,6 +84,12 @@ class IREDDataset(RelaxDataset):
                          environment variables and wildcards""")
         except argparse.ArgumentError:
             pass
+        try:
+            input_group.add_argument("-n_threads", default=argparse.SUPPRESS,
+              dest="n_threads", metavar="N", type=int, help="""number of
+                threads with which to parse infiles concurrently""")
+        except argparse.ArgumentError:
+            pass
 
         # Arguments inherited from superclass
         RelaxDataset.construct_argparser(parser)
@@ -108,62 +113,54 @@ class IREDDataset(RelaxDataset):
 
         # Process arguments
         verbose = kwargs.get("verbose", 1)
-        df = pd.DataFrame()
+        relax = ReplicaAccumulator(["r1", "r2", "noe"])
+        order = ReplicaAccumulator(["s2"])
+        for relax_df in relax_dfs:
+            relax.add(relax_df)
+        for order_df in order_dfs:
+            order.add(order_df)
 
-        # Process relaxation
-        if len(relax_dfs) == 1:
-            if verbose >= 1:
-                wiprint("""Single relaxation infile provided; skipping error
-                        calculation""")
-            df["r1"] = relax_dfs[0]["r1"]
-            if "r1 se" in relax_dfs[0]:
-                df["r1 se"] = relax_dfs[0]["r1 se"]
-            df["r2"] = relax_dfs[0]["r2"]
-            if "r2 se" in relax_dfs[0]:
-                df["r2 se"] = relax_dfs[0]["r2 se"]
-            df["noe"] = relax_dfs[0]["noe"]
-            if "noe se" in relax_dfs[0]:
-                df["noe se"] = relax_dfs[0]["noe se"]
-        elif len(relax_dfs) >= 2:
-            if verbose >= 1:
-                wiprint("""Calculating mean and standard error of {0}
-                        relaxation infiles""".format(len(relax_dfs)))
-            n_relax_dfs = len(relax_dfs)
-            relax_dfs = pd.concat(relax_dfs)
-            relax_mean = relax_dfs.groupby(level=0).mean()
-            relax_se = relax_dfs.groupby(level=0).std() / np.sqrt(n_relax_dfs)
-            df["r1"] = relax_mean["r1"]
-            df["r1 se"] = relax_se["r1"]
-            df["r2"] = relax_mean["r2"]
-            df["r2 se"] = relax_se["r2"]
-            df["noe"] = relax_mean["noe"]
-            df["noe se"] = relax_se["noe"]
-
-        # Process order parameters
-        if len(order_dfs) == 1:
-            if verbose >= 1:
-                wiprint("""Single order parameter infile provided; skipping
-                        error calculation""")
-            df["s2"] = order_dfs[0]["s2"]
-            if "s2 se" in order_dfs[0]:
-                df["s2 se"] = order_dfs[0]["s2 se"]
-        elif len(order_dfs) >= 2:
+        df = IREDDataset._combine_replicas(relax, order, verbose=verbose)
+        df, _ = IREDDataset.sort_sequence(df)
+
+        return df
+
+    @staticmethod
+    def _combine_replicas(relax, order, **kwargs):
+        """
+        Combines accumulated relaxation and order parameter replicas
+        into a single DataFrame.
+
+        Arguments:
+          relax (ReplicaAccumulator): Accumulated relaxation data
+          order (ReplicaAccumulator): Accumulated order parameters
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          df (DataFrame): Averaged DataFrame including relax and order
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        dfs = []
+
+        for accumulator, kind in [(relax, "relaxation"),
+          (order, "order parameter")]:
+            if accumulator.n_replicas == 0:
+                continue
             if verbose >= 1:
-                wiprint("""Calculating mean and standard error of {0} order
-                        parameter infiles""".format(len(order_dfs)))
-            n_order_dfs = len(order_dfs)
-            order_dfs = pd.concat(order_dfs)
-            order_mean = order_dfs.groupby(level=0).mean()
-            order_se = order_dfs.groupby(level=0).std() / np.sqrt(n_order_dfs)
-            df["s2"] = order_mean["s2"]
-            df["s2 se"] = order_se["s2"]
-
-        # Sort by index
-        if df.index.name == "residue":
-            df = df.loc[
-                sorted(df.index.values, key=lambda x: int(x.split(":")[1]))]
-        else:
-            df = df.loc[sorted(df.index.values)]
+                if accumulator.n_replicas == 1:
+                    wiprint("""Single {0} infile provided; skipping error
+                            calculation""".format(kind))
+                else:
+                    wiprint("""Calculating mean and standard error of {0} {1}
+                            infiles""".format(accumulator.n_replicas, kind))
+            dfs.append(accumulator.to_dataframe())
+        if len(dfs) == 0:
+            return pd.DataFrame()
+        df = pd.concat(dfs, axis=1)
+        df.index.name = dfs[0].index.name
 
         return df
 
@@ -278,13 +275,13 @@ class IREDDataset(RelaxDataset):
             :func:`read_csv<pandas.read_csv>` (text only)
           indexfile (str): Path to index file; may contain environment
             variables
+          n_threads (int): Number of threads with which to parse infiles
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
 
         Returns:
           df (DataFrame): iRED sequence DataFrame
         """
-        import re
         from ..myplotspec import multi_pop_merged
 
         # Process arguments
@@ -293,23 +290,16 @@ class IREDDataset(RelaxDataset):
         if len(infiles) == 0:
             raise Exception(sformat("""No infiles found matching
             '{0}'""".format(infile_args)))
-        re_h5 = re.compile(
-          r"^(?P<path>(.+)\.(h5|hdf5))((:)?(/)?(?P<address>.+))?$",
-          flags=re.UNICODE)
 
         # Load data
-        relax_dfs = []
-        order_dfs = []
-        for infile in infiles:
-            if re_h5.match(infile):
-                df = self._read_hdf5(infile, **kwargs)
-            else:
-                df = self._read_text(infile, **kwargs)
+        relax = ReplicaAccumulator(["r1", "r2", "noe"])
+        order = ReplicaAccumulator(["s2"])
+        for infile, df in self._iter_infiles(infiles, **kwargs):
             columns = df.columns.values
             if "r1" in columns and "r2" in columns and "noe" in columns:
-                relax_dfs.append(df)
+                relax.add(df)
             if "s2" in columns:
-                order_dfs.append(df)
+                order.add(df)
             if not (
                 ("r1" in columns and "r2" in columns and "noe" in columns) or (
                   "s2" in columns)):
@@ -318,7 +308,150 @@ class IREDDataset(RelaxDataset):
                   order parameter ('s2') columns""".format(infile)))
 
         # Average, if applicable
-        df = self.average_independent(relax_dfs, order_dfs)
+        df = self._combine_replicas(relax, order, **kwargs)
+        df, self.residue_df = self.sort_sequence(df)
+
+        return df
+
+    def _iter_infiles(self, infiles, n_threads=1, **kwargs):
+        """
+        Parses infiles, optionally using a pool of threads.
+
+        Infiles are parsed concurrently, but yielded in the order in
+        which they are listed, as each becomes available.
+
+        Arguments:
+          infiles (list): Paths to input files
+          n_threads (int): Number of threads with which to parse infiles
+          kwargs (dict): Additional keyword arguments passed to
+            :meth:`_read_hdf5` or :meth:`_read_text`
+
+        Yields:
+          (str, DataFrame): Path to infile, and DataFrame parsed from it
+        """
+        import re
+        from multiprocessing.pool import ThreadPool
+
+        re_h5 = re.compile(
+          r"^(?P<path>(.+)\.(h5|hdf5))((:)?(/)?(?P<address>.+))?$",
+          flags=re.UNICODE)
+
+        def read_infile(infile):
+            if re_h5.match(infile):
+                return infile, self._read_hdf5(infile, **kwargs)
+            else:
+                return infile, self._read_text(infile, **kwargs)
+
+        if n_threads <= 1 or len(infiles) <= 1:
+            for infile in infiles:
+                yield read_infile(infile)
+        else:
+            pool = ThreadPool(min(n_threads, len(infiles)))
+            try:
+                for infile, df in pool.imap(read_infile, infiles):
+                    yield infile, df
+            finally:
+                pool.terminate()
+
+
+class ReplicaAccumulator(object):
+    """
+    Accumulates the mean and standard error of a set of fields over
+    independent replicas, one replica at a time.
+
+    Values are stored in arrays indexed by residue, allocated when the
+    first replica is added and extended only if later replicas contain
+    additional residues. The mean and variance are updated using
+    Welford's algorithm, such that no replica need be retained after it
+    has been added.
+
+    Attributes:
+      fields (list): Names of fields to accumulate
+      n_replicas (int): Number of replicas added
+    """
+
+    def __init__(self, fields):
+        """
+        Arguments:
+          fields (list): Names of fields to accumulate
+        """
+        self.fields = list(fields)
+        self.n_replicas = 0
+        self.residues = []
+        self.positions = {}
+        self.index_name = None
+        self.count = np.zeros((0, len(self.fields)))
+        self.mean = np.zeros((0, len(self.fields)))
+        self.m2 = np.zeros((0, len(self.fields)))
+        self.first_se = None
+
+    def add(self, df):
+        """
+        Adds one replica.
+
+        Arguments:
+          df (DataFrame): Replica, whose index contains residues and
+            whose columns include *fields*
+        """
+
+        # Extend arrays to include new residues
+        new = [r for r in df.index.values if r not in self.positions]
+        if len(new) > 0:
+            for residue in new:
+                self.positions[residue] = len(self.residues)
+                self.residues.append(residue)
+            extension = np.zeros((len(new), len(self.fields)))
+            self.count = np.concatenate((self.count, extension))
+            self.mean = np.concatenate((self.mean, extension))
+            self.m2 = np.concatenate((self.m2, extension))
+        if self.index_name is None:
+            self.index_name = df.index.name
+
+        # Update running mean and sum of squared deviations
+        rows = np.array([self.positions[r] for r in df.index.values], np.int64)
+        values = np.array(df[self.fields].values, np.float64)
+        valid = ~np.isnan(values)
+        count = self.count[rows] + valid
+        delta = np.where(valid, values - self.mean[rows], 0)
+        mean = self.mean[rows] + np.where(valid, delta / np.maximum(count, 1),
+          0)
+        self.m2[rows] += np.where(valid, delta * (values - mean), 0)
+        self.mean[rows] = mean
+        self.count[rows] = count
+
+        # Retain standard error of first replica, used if it is the only one
+        if self.n_replicas == 0:
+            se_fields = [f + " se" for f in self.fields]
+            self.first_se = pd.DataFrame(index=df.index)
+            for field in se_fields:
+                if field in df.columns.values:
+                    self.first_se[field] = df[field]
+        self.n_replicas += 1
+
+    def to_dataframe(self):
+        """
+        Builds DataFrame of accumulated mean and standard error.
+
+        Returns:
+          DataFrame: Mean and standard error of each field at each
+          residue; if a single replica has been added, standard error
+          is taken from its ' se' columns, if present
+        """
+        index = pd.Index(self.residues, name=self.index_name)
+        df = pd.DataFrame(index=index)
+        if self.n_replicas == 1:
+            se = self.first_se.reindex(index)
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                se = np.sqrt(self.m2 / (self.count - 1)) / np.sqrt(self.count)
+            se[self.count < 2] = np.nan
+            se = pd.DataFrame(se, index=index,
+              columns=[f + " se" for f in self.fields])
+        for i, field in enumerate(self.fields):
+            df[field] = np.where(self.count[:, i] > 0, self.mean[:, i],
+              np.nan)
+            if field + " se" in se.columns.values:
+                df[field + " se"] = se[field + " se"].values
 
         return df
 
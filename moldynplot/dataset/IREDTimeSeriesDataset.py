@@ -17,15 +17,15 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
-import h5py
 import numpy as np
 import pandas as pd
 import six
+from .. import residue_index
 from .IREDDataset import IREDDataset
 from .TimeSeriesDataset import TimeSeriesDataset
 from ..myplotspec.Dataset import Dataset
-from ..myplotspec import wiprint
+from ..StageProfiler import StageProfiler
+from ..myplotspec import sformat, wiprint
 
 
 ################################### CLASSES ###################################
@@ -107,36 +107,20 @@ class IREDTimeSeriesDataset(TimeSeriesDataset, IREDDataset):
         else:
             timeseries_df = None
 
-        # Process relaxation
-        if len(relax_dfs) >= 1:
-            if verbose >= 1:
-                wiprint("""Concatenating timeseries from {0} relaxation
-                        infiles""".format(len(relax_dfs)))
-            relax_df = pd.concat([rdf.stack() for rdf in relax_dfs],
-              axis=1).transpose()
-        else:
-            relax_df = None
-
-        # Process order parameters
-        if len(order_dfs) >= 1:
-            if verbose >= 1:
-                wiprint("""Concatenating timeseries from {0} order parameter
-                        infiles""".format(len(order_dfs)))
-            order_df = pd.concat([odf.stack() for odf in order_dfs],
-              axis=1).transpose()
-        else:
-            order_df = None
-
-        # Merge and sort relaxation and order parameters
-        if relax_df is not None and order_df is not None:
-            df = pd.merge(relax_df, order_df, how="outer", left_index=True,
-              right_index=True)
-            df = df[sorted(list(set(df.columns.get_level_values(0))),
-              key=lambda x: int(x.split(":")[1]))]
-        elif relax_df is None and order_df is not None:
-            df = order_df
-        elif order_df is None and relax_df is not None:
-            df = relax_df
+        # Process relaxation and order parameters
+        if verbose >= 1 and len(relax_dfs) >= 1:
+            wiprint("""Concatenating timeseries from {0} relaxation
+                    infiles""".format(len(relax_dfs)))
+        if verbose >= 1 and len(order_dfs) >= 1:
+            wiprint("""Concatenating timeseries from {0} order parameter
+                    infiles""".format(len(order_dfs)))
+        window_dfs = [[] for i in range(max(len(relax_dfs), len(order_dfs)))]
+        for i, relax_df in enumerate(relax_dfs):
+            window_dfs[i].append(relax_df)
+        for i, order_df in enumerate(order_dfs):
+            window_dfs[i].append(order_df)
+        if len(window_dfs) >= 1:
+            df = IREDTimeSeriesDataset.stack_windows(window_dfs)
         else:
             df = None
 
@@ -148,12 +132,80 @@ class IREDTimeSeriesDataset(TimeSeriesDataset, IREDDataset):
 
         return df
 
+    @staticmethod
+    def stack_windows(window_dfs, **kwargs):
+        """
+        Stacks a series of iRED windows into a single time series.
+
+        A single array of shape (window, residue, field) is allocated
+        and each window's values are copied into it in place; the
+        returned DataFrame wraps this array without copying it, unless
+        some residues lack some fields, in which case those columns are
+        dropped.
+
+        Arguments:
+          window_dfs (list): For each window, a list of DataFrames whose
+            index contains residues and whose columns contain fields
+            (e.g. one of relaxation data and one of order parameters)
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: DataFrame whose index is window number and whose
+          columns are a MultiIndex of residue and field
+        """
+
+        # Determine residues and fields
+        residues = []
+        fields = []
+        index_name = None
+        for dfs in window_dfs:
+            for df in dfs:
+                residues.extend(df.index.values)
+                fields.extend(df.columns.values)
+                index_name = index_name or df.index.name
+        residues = pd.Index(pd.unique(np.array(residues, object)))
+        fields = pd.Index(pd.unique(np.array(fields, object)))
+        if index_name == "residue":
+            residues = residues[np.argsort(
+              residue_index(residues)["number"].values, kind="mergesort")]
+        else:
+            residues = residues.sort_values()
+
+        # Fill block
+        block = np.full((len(window_dfs), residues.size, fields.size),
+          np.nan)
+        present = np.zeros((residues.size, fields.size), np.bool_)
+        for i, dfs in enumerate(window_dfs):
+            for df in dfs:
+                rows = residues.get_indexer(df.index)
+                columns = fields.get_indexer(df.columns)
+                block[i, rows[:, np.newaxis], columns] = df.values
+                present[rows[:, np.newaxis], columns] |= ~np.isnan(df.values)
+
+        # Wrap in DataFrame
+        df = pd.DataFrame(np.reshape(block, (block.shape[0], -1)),
+          columns=pd.MultiIndex.from_product([residues, fields],
+            names=[index_name, None]), copy=False)
+        if not present.all():
+            df = df.loc[:, present.flatten()]
+
+        return df
+
     def read(self, **kwargs):
         """
         Reads iRED time series data from one or more *infiles* into a
         DataFrame.
+
+        Arguments:
+          infile{s} (list): Path(s) to input file(s); may contain
+            environment variables and wildcards
+          n_threads (int): Number of threads with which to parse infiles
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          df (DataFrame): iRED time series DataFrame
         """
-        import re
         from ..myplotspec import multi_pop_merged
 
         # Process arguments
@@ -162,39 +214,40 @@ class IREDTimeSeriesDataset(TimeSeriesDataset, IREDDataset):
         if len(infiles) == 0:
             raise Exception(sformat("""No infiles found matching
             '{0}'""".format(infile_args)))
-        re_h5 = re.compile(
-          r"^(?P<path>(.+)\.(h5|hdf5))((:)?(/)?(?P<address>.+))?$",
-          flags=re.UNICODE)
+
+        if getattr(self, "profiler", None) is None:
+            self.profiler = StageProfiler()
 
         # Load data
         timeseries_dfs = []
         relax_dfs = []
         order_dfs = []
-        for infile in infiles:
-            if re_h5.match(infile):
-                df = self._read_hdf5(infile, **kwargs)
-            else:
-                df = self._read_text(infile, **kwargs)
-            if df.columns.nlevels == 2:
-                timeseries_dfs.append(df)
-            else:
-                columns = df.columns.values
-
-                if "r1" in columns and "r2" in columns and "noe" in columns:
-                    relax_dfs.append(df)
-                if "s2" in columns:
-                    order_dfs.append(df)
-                if not ((
-                              "r1" in columns and "r2" in columns and "noe"
-                  in columns) or (
-                      "s2" in columns)):
-                    raise Exception(sformat("""DataFrame loaded from '{0}' does
-                      not appear to contain either relaxation ('r1', 'r2',
-                      'noe') or order parameter ('s2')
-                      columns""".format(infile)))
+        with self.profiler.stage("parse") as record:
+            for infile, df in self._iter_infiles(infiles, **kwargs):
+                if df.columns.nlevels == 2:
+                    timeseries_dfs.append(df)
+                else:
+                    columns = df.columns.values
+
+                    if ("r1" in columns and "r2" in columns and "noe" in
+                            columns):
+                        relax_dfs.append(df)
+                    if "s2" in columns:
+                        order_dfs.append(df)
+                    if not (("r1" in columns and "r2" in columns and
+                            "noe" in columns) or ("s2" in columns)):
+                        raise Exception(sformat("""DataFrame loaded from '{0}'
+                          does not appear to contain either relaxation
+                          ('r1', 'r2', 'noe') or order parameter ('s2')
+                          columns""".format(infile)))
+            record["rows"] = sum(df.shape[0] for df in
+                timeseries_dfs + relax_dfs + order_dfs)
 
         # Concatenate into timeseries
-        df = self.concatenate_timeseries(timeseries_dfs, relax_dfs, order_dfs)
+        with self.profiler.stage("index") as record:
+            df = self.concatenate_timeseries(timeseries_dfs, relax_dfs,
+              order_dfs)
+            record["rows"] = df.shape[0]
         return df
 
 
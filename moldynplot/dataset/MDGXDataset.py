@@ -17,8 +17,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
-import h5py
 import numpy as np
 import pandas as pd
 from ..myplotspec.Dataset import Dataset
@@ -54,8 +52,23 @@ class MDGXDataset(Dataset):
 
     def __init__(self, infile, selections=None, **kwargs):
         """
+        Arguments:
+          infile (str): Path to input file; may contain environment
+            variables
+          selections (list): Selections of conformations, each the final
+            component(s) of the topology path of the conformations it
+            contains
+          kwargs (dict): Additional keyword arguments
+
+        Attributes:
+          dataframe (DataFrame): Conformations, including 'error' column
+          membership (DataFrame): Whether each conformation (row) is in
+            each unique selection (column); a conformation is in every
+            selection matching the end of its topology path
+          selections (list): DataFrame of conformations in each selection
+          stats_df (DataFrame): Count, mean absolute error (MAE), root
+            mean square error (RMSE), and maximum error of each selection
         """
-        from os.path import expandvars
 
         # Load
         super(MDGXDataset, self).__init__(infile=infile, **kwargs)
@@ -64,12 +77,219 @@ class MDGXDataset(Dataset):
         dataframe["error"] = np.abs(
           dataframe["qm_energy"] - dataframe["mm_energy"])
 
-        selection_dataframes = []
-        if selections is not None:
-            for selection in selections:
-                selection_dataframes.append(dataframe[
-                    dataframe["topology"].str.endswith("/" + selection)])
-        self.selections = selection_dataframes
+        # Select
+        self.selection_names = list(selections or [])
+        self.membership = self.index_selections(dataframe["topology"],
+          self.selection_names)
+        self.selections = [dataframe[self.membership[selection].values]
+            for selection in self.selection_names]
+
+        # Summarize
+        membership = self.membership.values
+        error = dataframe["error"].values
+        count = membership.sum(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stats_df = pd.DataFrame(dict(count=count,
+              mae=error.dot(membership) / count,
+              rmse=np.sqrt((error ** 2).dot(membership) / count),
+              max=[error[m].max() if m.any() else np.nan for m in
+                membership.T]), index=self.membership.columns,
+              columns=["count", "mae", "rmse", "max"])
+        self.stats_df = stats_df.reindex(self.selection_names)
+        self.stats_df.index.name = "selection"
+        self.distributions = {}
+
+    @staticmethod
+    def index_selections(topology, selections):
+        """
+        Determines the selections in which each conformation is
+        included.
+
+        A conformation is in each selection that matches the end of its
+        topology path; i.e. whose path ends with '/' followed by the
+        selection, such that a conformation may be in several
+        selections. Each distinct topology path is split once per
+        distinct number of components among the selections, rather than
+        each conformation once per selection.
+
+        Arguments:
+          topology (Series): Topology path of each conformation
+          selections (list): Selections
+
+        Returns:
+          DataFrame: Boolean membership of each conformation (row) in
+          each unique selection (column)
+        """
+        categories = pd.unique(pd.Series(selections, dtype=object))
+        topology = topology.astype("category")
+        paths = topology.cat.categories.astype(str)
+        codes = topology.cat.codes.values
+
+        path_membership = np.zeros((len(paths) + 1, len(categories)), bool)
+        for depth in sorted(set(s.count("/") + 1 for s in categories)):
+            suffixes = pd.Index(["/".join(p.rsplit("/", depth)[1:]) if
+              p.count("/") >= depth else None for p in paths], dtype=object)
+            for i, selection in enumerate(categories):
+                if selection.count("/") + 1 == depth:
+                    path_membership[:-1, i] = suffixes == selection
+
+        return pd.DataFrame(path_membership[codes], index=topology.index,
+          columns=pd.Index(categories, name="selection"))
+
+    @staticmethod
+    def calc_distributions(values, codes, n_groups, points=100,
+      bw_method="scott"):
+        """
+        Calculates distribution summaries of several groups of values in
+        one pass.
+
+        Kernel density estimates are evaluated at *points* evenly-spaced
+        coordinates spanning each group, as used by matplotlib's
+        violinplot, using a Gaussian kernel whose bandwidth is selected
+        as by :class:`scipy.stats.gaussian_kde`. Where the bandwidth is
+        at least four times the spacing of the coordinates, values are
+        linearly binned onto the coordinates and the binned counts are
+        convolved with the kernel, such that each value is visited a
+        fixed number of times regardless of the number of coordinates.
+        Where it is narrower, as for groups with long tails, binning
+        would smear the estimate; these are instead evaluated exactly,
+        as by gaussian_kde. Quartiles are interpolated as by
+        :func:`numpy.percentile`.
+
+        Arguments:
+          values (ndarray): Values of all groups
+          codes (ndarray): Index of the group to which each value
+            belongs
+          n_groups (int): Number of groups
+          points (int): Number of coordinates at which to evaluate
+            kernel density estimate
+          bw_method (str, float): Method used to select kernel
+            bandwidth; may be 'scott', 'silverman', or a scalar factor
+            by which standard deviation is multiplied
+
+        Returns:
+          (DataFrame, ndarray, ndarray): Summary of each group, including
+          count, minimum, maximum, quartiles, mean, mean absolute value
+          (MAE), and root mean square (RMSE); coordinates of kernel density
+          estimates (group, point); and kernel density estimates at
+          those coordinates (group, point)
+        """
+        values = np.asarray(values, np.float64)
+        codes = np.asarray(codes, np.int64)
+
+        # Calculate moments
+        count = np.bincount(codes, minlength=n_groups).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.bincount(codes, values, n_groups) / count
+            mae = np.bincount(codes, np.abs(values), n_groups) / count
+            rmse = np.sqrt(np.bincount(codes, values ** 2, n_groups) / count)
+            std = np.sqrt(np.bincount(codes, (values - mean[codes]) ** 2,
+              n_groups) / (count - 1))
+
+        # Calculate quartiles from values sorted within each group
+        order = np.lexsort((values, codes))
+        sorted_values = np.append(values[order], np.nan)
+        starts = np.concatenate(([0], np.cumsum(count)[:-1])).astype(np.int64)
+        empty = count == 0
+        minimum = np.where(empty, np.nan,
+          sorted_values[np.minimum(starts, values.size - 1)])
+        maximum = np.where(empty, np.nan,
+          sorted_values[np.maximum(starts + count.astype(np.int64) - 1, 0)])
+        quartiles = []
+        for q in [0.25, 0.50, 0.75]:
+            position = q * np.maximum(count - 1, 0)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.minimum(lower + 1, np.maximum(count - 1, 0)).astype(
+              np.int64)
+            fraction = position - lower
+            lower_value = sorted_values[np.minimum(starts + lower,
+              values.size - 1)]
+            upper_value = sorted_values[np.minimum(starts + upper,
+              values.size - 1)]
+            quartiles.append(np.where(empty, np.nan,
+              lower_value + fraction * (upper_value - lower_value)))
+
+        summary_df = pd.DataFrame(
+          dict(count=count.astype(np.int64), min=minimum, q25=quartiles[0],
+            median=quartiles[1], q75=quartiles[2], max=maximum, mean=mean,
+            mae=mae, rmse=rmse), columns=["count", "min", "q25", "median",
+            "q75", "max", "mean", "mae", "rmse"])
+
+        # Linearly bin values onto coordinates spanning each group
+        span = np.nan_to_num(maximum - minimum)
+        spacing = np.where(span > 0, span, 1) / (points - 1)
+        coords = np.nan_to_num(minimum)[:, np.newaxis] + spacing[:,
+          np.newaxis] * np.arange(points)
+        position = (values - np.nan_to_num(minimum)[codes]) / spacing[codes]
+        lower = np.clip(np.floor(position).astype(np.int64), 0, points - 2)
+        fraction = np.clip(position - lower, 0, 1)
+        binned = (np.bincount(codes * points + lower, 1 - fraction,
+          n_groups * points) + np.bincount(codes * points + lower + 1,
+          fraction, n_groups * points)).reshape(n_groups, points)
+
+        # Convolve binned counts with Gaussian kernel of each group
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if bw_method == "scott":
+                factor = count ** (-1 / 5)
+            elif bw_method == "silverman":
+                factor = (count * 3 / 4) ** (-1 / 5)
+            else:
+                factor = np.full(n_groups, float(bw_method))
+            bandwidth = np.where(count > 1, std * factor, np.nan)
+            offset = np.arange(points)[:, np.newaxis] - np.arange(points)
+            kernel = np.exp(-0.5 * (offset[np.newaxis] * (spacing /
+              bandwidth)[:, np.newaxis, np.newaxis]) ** 2) / (
+              np.sqrt(2 * np.pi) * bandwidth)[:, np.newaxis, np.newaxis]
+            density = np.einsum("gij,gj->gi", kernel, binned) / count[:,
+              np.newaxis]
+
+            # Evaluate exactly groups whose bandwidth is too narrow to bin
+            for group in np.flatnonzero(bandwidth < 4 * spacing):
+                start = starts[group]
+                group_values = sorted_values[start:start + int(count[group])]
+                density[group] = 0
+                for i in range(0, group_values.size, 1000):
+                    density[group] += np.exp(-0.5 * ((coords[group][:,
+                      np.newaxis] - group_values[np.newaxis, i:i + 1000])
+                      / bandwidth[group]) ** 2).sum(axis=1)
+                density[group] /= (count[group] * np.sqrt(2 * np.pi)
+                  * bandwidth[group])
+        density[~np.isfinite(density)] = 0
+
+        return summary_df, coords, density
+
+    def get_distributions(self, points=100, bw_method="scott", **kwargs):
+        """
+        Gets distribution summaries of the error of each selection.
+
+        Summaries are calculated using :meth:`calc_distributions` on
+        first request and cached for subsequent requests using the same
+        arguments.
+
+        Arguments:
+          points (int): Number of coordinates at which to evaluate
+            kernel density estimate
+          bw_method (str, float): Method used to select kernel bandwidth
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          (DataFrame, ndarray, ndarray): Summary of each selection,
+          coordinates of kernel density estimates, and kernel density
+          estimates; see :meth:`calc_distributions`
+        """
+        key = (points, bw_method)
+        if key not in self.distributions:
+            rows, codes = np.nonzero(self.membership.values)
+            summary_df, coords, density = self.calc_distributions(
+              self.dataframe["error"].values[rows], codes,
+              self.membership.shape[1], points=points, bw_method=bw_method)
+            order = self.membership.columns.get_indexer(self.selection_names)
+            summary_df = summary_df.iloc[order]
+            summary_df.index = pd.Index(self.selection_names,
+              name="selection")
+            self.distributions[key] = (summary_df, coords[order],
+              density[order])
+        return self.distributions[key]
 
 
 #################################### MAIN #####################################
@@ -17,93 +17,266 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
-import h5py
 import numpy as np
 import pandas as pd
 import six
 from .TimeSeriesDataset import TimeSeriesDataset
 from ..myplotspec import wiprint
+from ..StageProfiler import StageProfiler
 
 
 ################################### CLASSES ###################################
 class NatConTimeSeriesDataset(TimeSeriesDataset):
     """
     Represents native contacts as a function of time
+
+    Minimum distances between residues are thresholded into contacts
+    as they are read, block by block, such that the full distance
+    matrix is never held in memory.
+
+    Attributes:
+      timeseries_df (DataFrame): DataFrame whose index corresponds to
+        time and whose columns are the fraction of native contacts
+        formed at each cutoff
+      pdist_df (DataFrame): DataFrame whose index corresponds to the
+        fraction of native contacts formed and whose columns are the
+        probability of each fraction at each cutoff
     """
 
-    def __init__(self, downsample=None, calc_pdist=True, **kwargs):
+    def __init__(self, infile, cutoff=5.5, cutoffs=None, address="natcon",
+      chunk_size=65536, contacts_outfile=None, downsample=None,
+      calc_pdist=True, profile=False, **kwargs):
         """
         Arguments:
           infile (str): Path to input file, may contain environment
-            variables
-          usecols (list): Columns to select from DataFrame, once
-            dataframe has already been loaded
+            variables; may be cpptraj text output or hdf5
+          address (str): Address of distances within hdf5 infile
           dt (float): Time interval between points; units unspecified
           toffset (float): Time offset to be added to all points (i.e.
             time of first point)
           cutoff (float): Minimum distance within which a contact is
             considered to be formed
+          cutoffs (list): Multiple cutoffs to evaluate in the same pass;
+            overrides *cutoff*
+          chunk_size (int): Number of frames to read at once
+          contacts_outfile (str): Path to hdf5 file in which to store
+            bit-packed contact matrix for each cutoff; may contain
+            environment variables
           downsample (int): Interval by which to downsample points using
             mode
-          pdist (bool): Calculate probability distribution
+          calc_pdist (bool): Calculate probability distribution
+          profile (bool, str): Print the wall time, CPU time, peak
+            memory, and rows processed by each stage, as recorded in
+            instance variable `profiler`; if str, also write to this
+            path
+          profile_format (str): Format of profile written to *profile*;
+            may be 'json' or 'chrome'
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
         """
         verbose = kwargs.get("verbose", 1)
+        if getattr(self, "profiler", None) is None:
+            self.profiler = StageProfiler()
+        stage = self.profiler.stage
 
-        # Load
-        super(NatConTimeSeriesDataset, self).__init__(**kwargs)
-        dataframe = self.dataframe
-        n_contacts = self.dataframe.shape[1]
+        # Load and convert minimum distances to fraction native contacts
+        if cutoffs is None:
+            cutoffs = [cutoff]
+        with stage("read") as record:
+            self.timeseries_df, self.n_contacts = self.read_contacts(
+              infile=infile, cutoffs=cutoffs, address=address,
+              chunk_size=chunk_size, contacts_outfile=contacts_outfile,
+              verbose=verbose)
+            record["rows"] = self.timeseries_df.shape[0]
+        self.df = self.timeseries_df
 
-        # Convert minimum distances to percent native contacts
-        cutoff = kwargs.get("cutoff", 5.5)
-        percent = pd.DataFrame(
-          data=(dataframe.values <= cutoff).sum(axis=1) / dataframe.shape[1],
-          index=dataframe.index, columns=["percent_native_contacts"])
-        dataframe = self.dataframe = percent
-
-        # Downsample; flag included in function definition to prevent
-        #   superclass from downsampling before applying cutoff
+        # Process; downsampling is performed here using mode rather than
+        #   by superclass
+        super(NatConTimeSeriesDataset, self).__init__(calc_pdist=False,
+          **kwargs)
         if downsample is not None:
-            from scipy.stats.mstats import mode
-
-            if verbose >= 1:
-                print("downsampling by factor of {0} using mode".format(
-                  downsample))
-
-            reduced = dataframe.values[
-            :dataframe.shape[0] - (dataframe.shape[0] % downsample), :]
-            new_shape = (int(reduced.shape[0] / downsample), downsample,
-            reduced.shape[1])
-            index = np.reshape(dataframe.index.values[
-            :dataframe.shape[0] - (dataframe.shape[0] % downsample)],
-              new_shape[:-1]).mean(axis=1)
-            reduced = np.reshape(reduced, new_shape)
-            reduced = np.squeeze(mode(reduced, axis=1)[0])
-            reduced = pd.DataFrame(data=reduced, index=index,
-              columns=dataframe.columns.values)
-            reduced.index.name = "time"
-            dataframe = self.dataframe = reduced
+            with stage("downsample", rows=self.timeseries_df.shape[0]):
+                self.timeseries_df = self.downsample(df=self.timeseries_df,
+                  downsample=downsample, downsample_mode="mode",
+                  verbose=verbose)
+        dataframe = self.timeseries_df
+        n_contacts = self.n_contacts
 
         # Calculate probability distribution
         if calc_pdist:
             if verbose >= 1:
                 print("calculating probability distribution using histogram")
-            bins = np.linspace(0 - ((1 / n_contacts) / 2),
-              1 + ((1 / n_contacts) / 2), n_contacts + 1)
-            pdist, _ = np.histogram(self.dataframe.values, bins)
-            pdist = np.array(pdist, np.float) / pdist.sum()
-            pdist_x = np.zeros(bins.size * 2)
-            pdist_y = np.zeros(bins.size * 2)
-            pdist_x[::2] = pdist_x[1::2] = bins
-            pdist_y[1:-1:2] = pdist_y[2:-1:2] = pdist
-            self.pdist_x = pdist_x
-            self.pdist_y = pdist_y
+            with stage("pdist", rows=dataframe.shape[0]):
+                bins = np.linspace(0 - ((1 / n_contacts) / 2),
+                  1 + ((1 / n_contacts) / 2), n_contacts + 2)
+                pdist = np.zeros((n_contacts + 1, dataframe.shape[1]))
+                for i in range(dataframe.shape[1]):
+                    pdist[:, i], _ = np.histogram(dataframe.values[:, i], bins)
+                pdist /= pdist.sum(axis=0)
+                self.pdist_df = pd.DataFrame(pdist,
+                  index=np.linspace(0, 1, n_contacts + 1),
+                  columns=dataframe.columns)
+                pdist_x = np.zeros(bins.size * 2)
+                pdist_y = np.zeros(bins.size * 2)
+                pdist_x[::2] = pdist_x[1::2] = bins
+                pdist_y[1:-1:2] = pdist_y[2:-1:2] = pdist[:, 0]
+                self.pdist_x = pdist_x
+                self.pdist_y = pdist_y
 
         self.timeseries = dataframe
 
+        # Output profile
+        if profile:
+            self.output_profile(profile, **kwargs)
+
+    @staticmethod
+    def iter_distance_blocks(infile, address="natcon", chunk_size=65536,
+      **kwargs):
+        """
+        Iterates over blocks of frames of a minimum distance timeseries.
+
+        Arguments:
+          infile (str): Path to input file, may contain environment
+            variables; may be cpptraj text output or hdf5
+          address (str): Address of distances within hdf5 infile; if
+            infile is in the form ``path.h5:address``, the address
+            given there is used instead
+          chunk_size (int): Number of frames to yield at once
+
+        Yields:
+          (ndarray, ndarray): Index and distances of each block of
+          frames
+        """
+        from os.path import expandvars
+        import re
+        import h5py
+
+        infile = expandvars(infile)
+        re_h5 = re.compile(
+          r"^(?P<path>(.+)\.(h5|hdf5))((:)?(/)?(?P<address>.+))?$",
+          flags=re.UNICODE)
+        match = re_h5.match(infile)
+
+        if match:
+            path = match.groupdict()["path"]
+            if match.groupdict()["address"] is not None:
+                address = match.groupdict()["address"]
+            with h5py.File(path, "r") as h5_file:
+                dataset = h5_file[address]
+                if isinstance(dataset, h5py.Group):
+                    index = dataset["index"]
+                    dataset = dataset["values"]
+                else:
+                    index = None
+                for start in range(0, dataset.shape[0], chunk_size):
+                    stop = min(start + chunk_size, dataset.shape[0])
+                    if index is not None:
+                        block_index = np.array(index[start:stop])
+                    else:
+                        block_index = np.arange(start, stop)
+                    yield block_index, np.array(dataset[start:stop])
+        else:
+            reader = pd.read_csv(infile, sep=r"\s+", index_col=0,
+              chunksize=chunk_size)
+            for block in reader:
+                yield block.index.values, np.array(block.values, np.float32)
+
+    @staticmethod
+    def read_contacts(infile, cutoffs, contacts_outfile=None, **kwargs):
+        """
+        Reads minimum distances and converts them to native contacts.
+
+        Each block of distances is thresholded at every cutoff as it is
+        read; only the fraction of contacts formed in each frame is
+        retained, and optionally the contact matrix itself, stored
+        bit-packed along the contact axis using
+        :func:`numpy.packbits`.
+
+        Arguments:
+          infile (str): Path to input file, may contain environment
+            variables; may be cpptraj text output or hdf5
+          cutoffs (list): Minimum distances within which a contact is
+            considered to be formed
+          contacts_outfile (str): Path to hdf5 file in which to store
+            contact matrices, at addresses 'natcon/contacts/{cutoff}';
+            may contain environment variables; existing 'natcon' group
+            is replaced
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments passed to
+            :meth:`iter_distance_blocks`
+
+        Returns:
+          (DataFrame, int): Fraction of native contacts formed in each
+          frame at each cutoff, and number of contacts
+        """
+        from os.path import expandvars
+        import h5py
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        cutoffs = np.array(cutoffs, np.float64).flatten()
+        if cutoffs.size == 1:
+            columns = ["percent_native_contacts"]
+        else:
+            columns = ["percent_native_contacts {0:g}".format(c)
+                for c in cutoffs]
+        if verbose >= 1:
+            wiprint("""Loading native contacts from '{0}' using cutoff(s)
+                    {1}""".format(infile, ", ".join(
+              "{0:g}".format(c) for c in cutoffs)))
+        h5_file = None
+        if contacts_outfile is not None:
+            h5_file = h5py.File(expandvars(contacts_outfile), "a")
+            if "natcon" in h5_file:
+                del h5_file["natcon"]
+
+        try:
+            indexes = []
+            fractions = []
+            n_contacts = None
+            for index, distances in NatConTimeSeriesDataset.\
+                    iter_distance_blocks(infile, **kwargs):
+                contacts = distances[np.newaxis] <= cutoffs.astype(
+                  distances.dtype)[:, np.newaxis, np.newaxis]
+                indexes.append(index)
+                fractions.append(contacts.sum(axis=2).T / distances.shape[1])
+
+                # Store contacts bit-packed
+                if h5_file is not None:
+                    packed = np.packbits(contacts, axis=2)
+                    if n_contacts is None:
+                        h5_file.create_dataset("natcon/index",
+                          data=index, maxshape=(None,), chunks=True)
+                        for i, cutoff in enumerate(cutoffs):
+                            dataset = h5_file.create_dataset(
+                              "natcon/contacts/{0:g}".format(cutoff),
+                              data=packed[i], maxshape=(None,
+                                packed.shape[2]), chunks=True,
+                              compression="gzip")
+                            dataset.attrs["cutoff"] = cutoff
+                            dataset.attrs["n_contacts"] = distances.shape[1]
+                    else:
+                        size = h5_file["natcon/index"].shape[0]
+                        h5_file["natcon/index"].resize(
+                          (size + index.size,))
+                        h5_file["natcon/index"][size:] = index
+                        for i, cutoff in enumerate(cutoffs):
+                            dataset = h5_file[
+                                "natcon/contacts/{0:g}".format(cutoff)]
+                            dataset.resize(
+                              (size + index.size, packed.shape[2]))
+                            dataset[size:] = packed[i]
+                n_contacts = distances.shape[1]
+        finally:
+            if h5_file is not None:
+                h5_file.close()
+
+        df = pd.DataFrame(np.concatenate(fractions),
+          index=np.concatenate(indexes), columns=columns)
+        df.index.name = "frame"
+
+        return df, n_contacts
+
 
 #################################### MAIN #####################################
 if __name__ == "__main__":
@@ -17,16 +17,32 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
+import numpy as np
+import pandas as pd
 from .SequenceDataset import SequenceDataset
 from .TimeSeriesDataset import TimeSeriesDataset
+from ..myplotspec.Dataset import Dataset
+from ..myplotspec import wiprint
+from ..StageProfiler import StageProfiler
 
 
 ################################### CLASSES ###################################
 class PRETimeSeriesDataset(TimeSeriesDataset, SequenceDataset):
     """
     Represents paramagnetic relaxation enhancement (PRE) timeseries data
+
+    Attributes:
+      timeseries_df (DataFrame): DataFrame whose index corresponds
+        to time and whose columns are the distance between the spin
+        label and each residue as a function of time
+      mean_df (DataFrame): DataFrame whose index corresponds to residue
+        and whose columns are the mean and standard error of distance,
+        back-calculated PRE I/I0 and Γ2 ('rho2'), and the r⁻⁶-averaged
+        distance
     """
 
+    default_pre_kw = dict(k=0.0123, w=800e6, tc=9.3e-9, r2=12.4, t=0.01)
+
     @staticmethod
     def construct_argparser(parser_or_subparsers=None, **kwargs):
         """
@@ -61,83 +77,239 @@ class PRETimeSeriesDataset(TimeSeriesDataset, SequenceDataset):
         if parser.get_default("cls") is None:
             parser.set_defaults(cls=PRETimeSeriesDataset)
 
+        # Arguments unique to this class
+        add_argument = Dataset.add_argument
+        arg_groups = {ag.title: ag for ag in parser._action_groups}
+
+        # Action arguments
+        action_group = arg_groups.get("action",
+          parser.add_argument_group("action"))
+        add_argument(action_group, "--pre_k", default=argparse.SUPPRESS,
+          dest="pre_k", metavar="K", type=float,
+          help="""dipolar coupling constant (Å⁶ ns⁻²); default 0.0123""")
+        add_argument(action_group, "--pre_w", default=argparse.SUPPRESS,
+          dest="pre_w", metavar="W", type=float,
+          help="""proton Larmor frequency (s⁻¹); default 800e6""")
+        add_argument(action_group, "--pre_tc", default=argparse.SUPPRESS,
+          dest="pre_tc", metavar="TC", type=float,
+          help="""correlation time (s); default 9.3e-9""")
+        add_argument(action_group, "--pre_r2", default=argparse.SUPPRESS,
+          dest="pre_r2", metavar="R2", type=float,
+          help="""diamagnetic transverse relaxation rate (s⁻¹); default
+          12.4""")
+        add_argument(action_group, "--pre_t", default=argparse.SUPPRESS,
+          dest="pre_t", metavar="T", type=float,
+          help="""INEPT delay (s); default 0.01""")
+        add_argument(action_group, "--pre_float32", action="store_const",
+          const=np.float32, default=argparse.SUPPRESS, dest="pre_dtype",
+          help="""calculate PRE in single precision""")
+
         # Arguments inherited from superclass
         TimeSeriesDataset.construct_argparser(parser)
         SequenceDataset.construct_argparser(parser)
 
         return parser
 
-    def __init__(self, dt=None, downsample=None, outfile=None, **kwargs):
+    def __init__(self, dt=None, downsample=None, outfile=None,
+      interactive=False, profile=False, **kwargs):
         """
-        Args:
-            verbose (int): Level of verbose output
-            kwargs (dict): Additional Keyword Arguments
+        Arguments:
+          infile{s} (list): Path(s) to input file(s) containing distance
+            timeseries; may contain environment variables and wildcards
+          indexfile (str): Path to index file from which to load residue
+            names of the columns of the distance timeseries; may contain
+            environment variables
+          dt (float): Time interval between points; units unspecified
+          downsample (int): Interval by which to downsample points
+          pre_kw (dict): Keyword arguments passed to :meth:`calc_pre`,
+            including the physical constants *k*, *w*, *tc*, *r2*, and
+            *t*
+          block_kw (dict): Keyword arguments used to configure block
+            averaging
+          outfile (str): Path to output text file
+          interactive (bool): Provide iPython prompt and reading and
+            processing data
+          profile (bool, str): Print the wall time, CPU time, peak
+            memory, and rows processed by each stage, as recorded in
+            instance variable `profiler`; if str, also write to this
+            path
+          profile_format (str): Format of profile written to *profile*;
+            may be 'json' or 'chrome'
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
         """
-
         # Process arguments
         verbose = kwargs.get("verbose", 1)
         self.dataset_cache = kwargs.get("dataset_cache", None)
+        indexfile = kwargs.pop("indexfile", None)
+        pre_kw = self.default_pre_kw.copy()
+        pre_kw.update(kwargs.get("pre_kw", {}))
+        for key in ["k", "w", "tc", "r2", "t", "dtype"]:
+            if "pre_" + key in kwargs:
+                pre_kw[key] = kwargs["pre_" + key]
+
+        if getattr(self, "profiler", None) is None:
+            self.profiler = StageProfiler()
+        stage = self.profiler.stage
 
         # Read data
         if not hasattr(self, "timeseries_df"):
-            self.timeseries_df = self.df = self.read(**kwargs)
+            with stage("read") as record:
+                self.timeseries_df = self.df = self.read(**kwargs)
+                record["rows"] = self.timeseries_df.shape[0]
+        n_rows = self.timeseries_df.shape[0]
         if dt:
             self.timeseries_df.set_index(
               self.timeseries_df.index.values * float(dt), inplace=True)
             self.timeseries_df.index.name = "time"
         if downsample:
-            self.timeseries_df = self.downsample(df=self.timeseries_df,
-              downsample=downsample, **kwargs)
-
-        import pandas as pd
-        pd.set_option('display.width', 200)
-        import numpy as np
-
-        distance_df = pd.DataFrame(data=self.timeseries_df.values,
-          dtype=np.double, columns=self.timeseries_df.columns)
-
-        k   = 0.0123    # Å6 ns-2
-        w   = 800e6     # s-1
-        tc  =  9.3e-9   # s
-        r2  = 12.4      # s
-        t   = 0.01      # s
-
-        rho2_df = k / (distance_df ** 6) * 1e9 * 1e9  # s-2
-        rho2_df *= (4 * tc + ((3 * tc) / (1 + (w * tc ) ** 2)))
-        I_I0_df = (r2 * np.exp(-1 * rho2_df * t)) / (r2 + rho2_df)
+            with stage("downsample", rows=n_rows):
+                self.timeseries_df = self.downsample(df=self.timeseries_df,
+                  downsample=downsample, **kwargs)
+            n_rows = self.timeseries_df.shape[0]
 
+        # Calculate PRE and block averages of all quantities in one pass
+        with stage("pre", rows=n_rows):
+            pre_mean_df, block_df = self.calc_pre(df=self.timeseries_df,
+              verbose=verbose, **pre_kw)
         block_kw = dict(min_n_blocks=2, max_cut=0.1, all_factors=False,
           fit_exp=True, fit_sig=False)
         block_kw.update(kwargs.get("block_kw", {}))
+        with stage("mean", rows=block_df.shape[0]):
+            block_mean_df, self.block_averager = self.calc_mean(df=block_df,
+              verbose=verbose, **block_kw)
 
-        distance_mean_df, block_averager = self.calc_mean(df=distance_df,
-          verbose=verbose, **block_kw)
-        distance_mean_df.columns = ["distance", "distance se"]
-        rho2_mean_df, block_averager = self.calc_mean(df=rho2_df,
-          verbose=verbose, **block_kw)
-        rho2_mean_df.columns = ["rho2", "rho2 se"]
-        I_I0_mean_df, block_averager = self.calc_mean(df=I_I0_df,
-          verbose=verbose, **block_kw)
-        I_I0_mean_df.columns = ["I/I0", "I/I0 se"]
-        mean_df = distance_mean_df.join(I_I0_mean_df).join(rho2_mean_df)
-        mean_df = self._read_index(df=mean_df,
-          indexfile="/Volumes/KDebiecSSD/AMBER15IPQ/protein/MOCVNHLYSM"
-                    "/ff15ipq10.3_spceb_T_tau_10.0ps/analysis"
-                    "/MOCVNHLYSM_index.dat")
-        print(mean_df)
+        # Assemble mean DataFrame; means are exact, standard errors are
+        #   from block averaging
+        se = np.reshape(block_mean_df.values[:, 1], (3, -1))
+        mean_df = pd.DataFrame(index=self.timeseries_df.columns)
+        for i, field in enumerate(["distance", "I/I0", "rho2"]):
+            mean_df[field] = pre_mean_df[field]
+            mean_df[field + " se"] = se[i]
+        mean_df["r6 distance"] = pre_mean_df["r6 distance"]
+        mean_df["r6 distance se"] = (mean_df["r6 distance"] / 6) * (
+          mean_df["rho2 se"] / mean_df["rho2"])
+        if indexfile is not None:
+            mean_df = self._read_index(df=mean_df, indexfile=indexfile,
+              verbose=verbose)
+        else:
+            mean_df.index.name = "residue"
+        self.mean_df = mean_df
 
+        # Output data
+        if verbose >= 2:
+            print("Processed mean DataFrame:")
+            print(self.mean_df)
         if outfile is not None:
-            with open(outfile, "w") as out:
-                out.write(
-                  "#residue        distance distance se        I/I0     I/I0 "
-                  "se        rho2     rho2 se\n")
-                for residue in mean_df.index:
-                    row = mean_df.loc[residue]
-                    out.write(
-                      "{0:12s} {1:11.3f} {2:11.3f} {3:11.3f} {4:11.3f} {"
-                      "5:11.2f} {6:11.2f}\n".format(residue, row["distance"],
-                        row["distance se"], row["I/I0"], row["I/I0 se"],
-                        row["rho2"], row["rho2 se"]))
+            with stage("write", rows=mean_df.shape[0]):
+                with open(outfile, "w") as out:
+                    out.write("#residue        distance distance se  "
+                      "      I/I0     I/I0 se        rho2     rho2 se "
+                      "r6 distance r6 distance se\n")
+                    for residue in mean_df.index:
+                        row = mean_df.loc[residue]
+                        out.write(
+                          "{0:12s} {1:11.3f} {2:11.3f} {3:11.3f} {4:11.3f} {"
+                          "5:11.2f} {6:11.2f} {7:11.3f} {8:14.3f}\n".format(
+                            str(residue), row["distance"], row["distance se"],
+                            row["I/I0"], row["I/I0 se"], row["rho2"],
+                            row["rho2 se"], row["r6 distance"],
+                            row["r6 distance se"]))
+
+        # Output profile
+        if profile:
+            self.output_profile(profile, **kwargs)
+
+        # Interactive prompt
+        if interactive:
+            from IPython import embed
+
+            embed()
+
+    @staticmethod
+    def calc_pre(df, k=0.0123, w=800e6, tc=9.3e-9, r2=12.4, t=0.01,
+      dtype=np.float64, chunk_size=65536, n_blocks=4096, **kwargs):
+        """
+        Back-calculates PRE from a distance timeseries.
+
+        Γ2 ('rho2') and I/I0 are calculated from each distance in a
+        single pass over chunks of frames, from which the exact mean of
+        each quantity is accumulated along with block averages over
+        *n_blocks* equal blocks of frames. Full-size intermediate
+        DataFrames of Γ2 and I/I0 are never constructed.
+
+        Arguments:
+          df (DataFrame): Timeseries DataFrame of distances (Å)
+          k (float): Dipolar coupling constant (Å⁶ ns⁻²)
+          w (float): Proton Larmor frequency (s⁻¹)
+          tc (float): Correlation time (s)
+          r2 (float): Diamagnetic transverse relaxation rate (s⁻¹)
+          t (float): INEPT delay (s)
+          dtype (type): Precision in which to calculate; float32 halves
+            memory relative to float64
+          chunk_size (int): Approximate number of frames processed at
+            once
+          n_blocks (int): Maximum number of blocks over which to average;
+            trailing frames that do not fill a block are included in
+            the means but not the block averages
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          (DataFrame, DataFrame): Mean distance, I/I0, Γ2, and
+          r⁻⁶-averaged distance of each column of *df*; and block
+          averages of distance, I/I0, and Γ2, whose columns are ordered
+          by quantity and then by column of *df*
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        distance = df.values
+        n_frames, n_columns = distance.shape
+        block_size = max(1, int(np.ceil(n_frames / n_blocks)))
+        n_blocks = n_frames // block_size
+        n_blocked = n_blocks * block_size
+        chunk_size = max(1, chunk_size // block_size) * block_size
+        coefficient = k * 1e9 * 1e9 * (4 * tc + ((3 * tc) / (1 + (w * tc) **
+          2)))  # Å6 s-2
+        if verbose >= 1:
+            wiprint("""Calculating PRE over {0} frames in blocks of {1}
+                    """.format(n_frames, block_size))
+
+        # Calculate distance, I/I0, and rho2 chunk by chunk
+        sums = np.zeros((4, n_columns), np.float64)
+        blocks = np.zeros((n_blocks, 3, n_columns), dtype)
+        for start in range(0, n_frames, chunk_size):
+            stop = min(start + chunk_size, n_frames)
+            chunk = np.empty((4, stop - start, n_columns), dtype)
+            chunk[0] = distance[start:stop]
+            np.power(chunk[0], -6, out=chunk[3])
+            np.multiply(chunk[3], coefficient, out=chunk[2])
+            chunk[1] = (r2 * np.exp(-1 * chunk[2] * t)) / (r2 + chunk[2])
+            sums += chunk.sum(axis=1, dtype=np.float64)
+
+            # Reduce complete blocks within chunk
+            n_chunk_blocks = (min(stop, n_blocked) - start) // block_size
+            if n_chunk_blocks > 0:
+                first = start // block_size
+                blocks[first:first + n_chunk_blocks] = np.reshape(
+                  chunk[:3, :n_chunk_blocks * block_size],
+                  (3, n_chunk_blocks, block_size, n_columns)).mean(
+                  axis=2).transpose((1, 0, 2))
+
+        # Organize results
+        means = sums / n_frames
+        mean_df = pd.DataFrame(index=df.columns)
+        mean_df["distance"] = means[0]
+        mean_df["I/I0"] = means[1]
+        mean_df["rho2"] = means[2]
+        mean_df["r6 distance"] = means[3] ** (-1 / 6)
+        block_df = pd.DataFrame(np.reshape(blocks, (n_blocks, 3 * n_columns)),
+          index=np.reshape(df.index.values[:n_blocked],
+            (n_blocks, block_size)).mean(axis=1))
+        block_df.index.name = df.index.name
+
+        return mean_df, block_df
 
 
 #################################### MAIN #####################################
@@ -22,7 +22,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
 from .SequenceDataset import SequenceDataset
@@ -100,11 +99,7 @@ class RelaxDataset(SequenceDataset):
 
         # Cut data
         if "use_indexes" in kwargs:
-            use_indexes = np.array(kwargs.pop("use_indexes"), np.int)
-            res_index = np.array(
-              [int(i.split(":")[1]) for i in self.sequence_df.index.values])
-            self.sequence_df = self.sequence_df[
-                np.in1d(res_index, use_indexes)]
+            self.select_residues(kwargs.pop("use_indexes"))
 
         # Calculate r2/r1 ratio
         if "r1" in self.sequence_df and "r2" in self.sequence_df:
@@ -139,6 +134,8 @@ class RelaxDataset(SequenceDataset):
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
     def write_for_relax(self, outfile, **kwargs):
@@ -146,7 +143,7 @@ class RelaxDataset(SequenceDataset):
         Writes sequence DataFrame in format readable by relax.
         """
         from os.path import expandvars
-        from . import three_one
+        from .. import residue_index, three_one
 
         # Process arguments
         df = kwargs.get("df")
@@ -156,12 +153,12 @@ class RelaxDataset(SequenceDataset):
             else:
                 raise ()
         outfile = expandvars(outfile)
-        res_index = np.array([int(i.split(":")[1]) for i in df.index.values])
-        res_code = np.array(
-          [three_one(i.split(":")[0]) for i in df.index.values])
+        residue_df = getattr(self, "residue_df", None)
+        if residue_df is None or not residue_df.index.equals(df.index):
+            residue_df = residue_index(df.index)
 
-        df["index"] = res_index
-        df["code"] = res_code
+        df["index"] = residue_df["number"].values
+        df["code"] = residue_df["name"].map(three_one).values
 
         with open(outfile + "r1", "w") as r1_file:
             with open(outfile + "r2", "w") as r2_file:
@@ -29,6 +29,125 @@ class SAXSDataset(Dataset):
     Represents Small-Angle X-ray Scattering (SAXS) data
     """
 
+    @staticmethod
+    def fit_scale(intensity, target_I, target_Ise=None):
+        """
+        Calculates the scale factor that best fits one or more SAXS
+        curves to a target.
+
+        The weighted least-squares scale factor of a linear model has
+        the closed form a = Σ w I T / Σ w I², where *I* is intensity, *T*
+        is target intensity, and w = 1 / σ² if the uncertainty of the
+        target is available and 1 otherwise.
+
+        Arguments:
+          intensity (ndarray): Intensity of one curve, or two-dimensional
+            array of intensities of multiple curves (curve, q)
+          target_I (ndarray): Target intensity, on the same q as
+            *intensity*
+          target_Ise (ndarray, optional): Standard error of target
+            intensity
+
+        Returns:
+          float, ndarray: Scale factor of each curve
+        """
+        intensity = np.array(intensity, np.float64)
+        target_I = np.array(target_I, np.float64)
+        if target_Ise is None:
+            weight = np.ones_like(target_I)
+        else:
+            weight = 1 / np.array(target_Ise, np.float64) ** 2
+
+        numerator = intensity.dot(weight * target_I)
+        denominator = np.einsum("...j,...j,j->...", intensity, intensity,
+          weight)
+
+        return numerator / denominator
+
+    @staticmethod
+    def calc_x2(intensity, target_I, target_Ise, scale=None,
+      chunk_size=4096):
+        """
+        Calculates χ² between one or more SAXS curves and a target.
+
+        Residuals are calculated directly, for blocks of *chunk_size*
+        curves at a time, such that memory use is bounded. Expanding the
+        sum of squares into the dot products used by :meth:`fit_scale`
+        would avoid this, but loses precision to cancellation when
+        curves fit their target closely.
+
+        Arguments:
+          intensity (ndarray): Intensity of one curve, or two-dimensional
+            array of intensities of multiple curves (curve, q)
+          target_I (ndarray): Target intensity, on the same q as
+            *intensity*
+          target_Ise (ndarray): Standard error of target intensity
+          scale (float, ndarray, optional): Scale factor of each curve;
+            if omitted, curves are not scaled
+          chunk_size (int): Number of curves to process at once
+
+        Returns:
+          float, ndarray: χ² of each curve
+
+        Raises:
+          ValueError: *target_Ise* is None
+        """
+        if target_Ise is None:
+            raise ValueError("Standard error of target intensity is "
+                             "required to calculate χ²")
+        intensity = np.array(intensity, np.float64)
+        target_I = np.array(target_I, np.float64)
+        target_Ise = np.array(target_Ise, np.float64)
+        if scale is None:
+            scale = 1.0
+        scale = np.array(scale, np.float64)
+
+        if intensity.ndim == 1:
+            residual = (scale * intensity - target_I) / target_Ise
+            return residual.dot(residual) / (target_I.size - 1)
+
+        scale = np.broadcast_to(scale, intensity.shape[:1])
+        x2 = np.zeros(intensity.shape[0])
+        for start in range(0, intensity.shape[0], chunk_size):
+            stop = start + chunk_size
+            residual = (scale[start:stop, np.newaxis] * intensity[start:stop]
+                        - target_I) / target_Ise
+            x2[start:stop] = np.einsum("ij,ij->i", residual, residual)
+
+        return x2 / (target_I.size - 1)
+
+    def load_target(self, target, q, **kwargs):
+        """
+        Loads a target SAXS dataset and interpolates it onto q.
+
+        Arguments:
+          target (str): Path to input file, may contain environment
+            variables
+          q (ndarray): q onto which to interpolate target
+
+        Returns:
+          (ndarray, ndarray, ndarray): Boolean array selecting values of
+          *q* within the range of the target, and target intensity and
+          standard error (None if unavailable) at those values of *q*
+        """
+        from os.path import expandvars
+        from scipy.interpolate import interp1d
+
+        target = self.load_dataset(infile=expandvars(target), loose=True).df
+        target_q = np.array(target.index.values, np.float64)
+        q = np.array(q, np.float64)
+        indexes = np.logical_and(q > target_q.min(), q < target_q.max())
+
+        target_I = interp1d(target_q, np.array(target["intensity"],
+          np.float64), kind="cubic")(q[indexes])
+        if "intensity se" in target.columns.values:
+            target_Ise = interp1d(target_q, np.array(target["intensity se"],
+              np.float64), kind="cubic")(q[indexes])
+        else:
+            target_Ise = None
+
+        return indexes, target_I, target_Ise
+
     def scale(self, scale, **kwargs):
         """
         Scales SAXS intensity, either by a constant or to match the
@@ -38,15 +157,10 @@ class SAXSDataset(Dataset):
           scale (float, str): If float, proportion by which to scale
             intensity; if str, path to input file to which intensity
             will be scaled, may contain environment variables
-          curve_fit_kw (dict): Keyword arguments passed to
-            scipy.optimize.curve_fit (scale to match target dataset
-            only)
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
         """
         from os.path import expandvars, isfile
-        from scipy.interpolate import interp1d
-        from scipy.optimize import curve_fit
         import six
 
         # Processs arguments
@@ -64,42 +178,12 @@ class SAXSDataset(Dataset):
                       scale) + "not found, not scaling.")
                 return
 
-            # Prepare target
-            target = self.load_dataset(infile=expandvars(scale), loose=True).df
-            if "intensity se" in target.columns.values:
-                scale_se = True
-            else:
-                scale_se = False
-            target_q = np.array(target.index.values, np.float64)
-            target_I = np.array(target["intensity"], np.float64)
-            if scale_se:
-                target_Ise = np.array(target["intensity se"], np.float64)
-
-            # Prepare own values over x range of target
             template = self.df
-            template_q = np.array(template.index.values, np.float64)
-            template_I = np.array(template["intensity"].values, np.float64)
-            indexes = np.logical_and(template_q > target_q.min(),
-              template_q < target_q.max())
-            template_q = template_q[indexes]
-            template_I = template_I[indexes]
-
-            # Update target
-            target_I = interp1d(target_q, target_I, kind="cubic")(template_q)
-            if scale_se:
-                target_Ise = interp1d(target_q, target_Ise, kind="cubic")(
-                  template_q)
-
-            def scale_I(_, a):
-                return a * template_I
-
-            #            curve_fit_kw = dict(p0=(1), bounds=(0.0,0.35))
-            curve_fit_kw = dict(p0=(1))  # Not clear why bounds broke
-            curve_fit_kw.update(kwargs.get("curve_fit_kw", {}))
-            if scale_se:
-                curve_fit_kw["sigma"] = target_Ise
-            scale = \
-                curve_fit(scale_I, template_q, target_I, **curve_fit_kw)[0][0]
+            indexes, target_I, target_Ise = self.load_target(scale,
+              template.index.values)
+            template_I = np.array(template["intensity"].values,
+              np.float64)[indexes]
+            scale = self.fit_scale(template_I, target_I, target_Ise)
         # 'scale' argument not understood
         else:
             if verbose >= 1:
@@ -116,34 +200,39 @@ class SAXSDataset(Dataset):
         return scale
 
     def x2(self, x2, **kwargs):
-        from os.path import expandvars, isfile
-        from scipy.interpolate import interp1d
+        """
+        Calculates χ² of SAXS intensity relative to a target dataset.
+
+        Arguments:
+          x2 (str): Path to input file relative to which χ² will be
+            calculated; may contain environment variables
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          float: χ²
+
+        Raises:
+          ValueError: Target lacks column 'intensity se'
+        """
 
         # Processs arguments
         verbose = kwargs.get("verbose", 1)
 
-        # Prepare target
-        target = self.load_dataset(infile=expandvars(x2), loose=True).df
-        target_q = np.array(target.index.values, np.float64)
-        target_I = np.array(target["intensity"], np.float64)
-        target_Ise = np.array(target["intensity se"], np.float64)
-
-        # Prepare own values over x range of target
         template = self.df
-        template_q = np.array(template.index.values, np.float64)
-        template_I = np.array(template["intensity"].values, np.float64)
-        indexes = np.logical_and(template_q > target_q.min(),
-          template_q < target_q.max())
-        template_q = template_q[indexes]
-        template_I = template_I[indexes]
-
-        # Update target
-        target_I = interp1d(target_q, target_I, kind="cubic")(template_q)
-        target_Ise = interp1d(target_q, target_Ise, kind="cubic")(template_q)
-
-        residual = ((template_I - target_I) / target_Ise) ** 2
-        x2 = residual.sum() / (residual.size - 1)
-        print(x2)
+        indexes, target_I, target_Ise = self.load_target(x2,
+          template.index.values)
+        if target_Ise is None:
+            raise ValueError("Target '{0}' lacks column 'intensity se', "
+                             "required to calculate χ²".format(x2))
+        template_I = np.array(template["intensity"].values,
+          np.float64)[indexes]
+        x2 = self.calc_x2(template_I, target_I, target_Ise)
+        if verbose >= 1:
+            wiprint("χ² relative to target: {0}".format(x2))
+
+        return x2
+
 
 #################################### MAIN #####################################
 if __name__ == "__main__":
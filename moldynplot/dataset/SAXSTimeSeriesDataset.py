@@ -17,14 +17,13 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
-import h5py
 import numpy as np
 import pandas as pd
 import six
 from .SAXSDataset import SAXSDataset
 from .TimeSeriesDataset import TimeSeriesDataset
 from ..myplotspec import wiprint
+from ..StageProfiler import StageProfiler
 
 
 ################################### CLASSES ###################################
@@ -35,8 +34,9 @@ class SAXSTimeSeriesDataset(TimeSeriesDataset, SAXSDataset):
 
     def __init__(self, infile, address="saxs", dt=None, toffset=None,
       downsample=None, calc_mean=False, calc_error=True, calc_x2=False,
-      error_method="std", scale=False, outfile=None, interactive=False,
-      **kwargs):
+      calc_frame_x2=False, calc_ensemble=False, error_method="std",
+      scale=False, lazy=False, chunk_size=4096, outfile=None,
+      interactive=False, profile=False, **kwargs):
         """
         Arguments:
           infile (str): Path to input file, may contain environment
@@ -47,6 +47,27 @@ class SAXSTimeSeriesDataset(TimeSeriesDataset, SAXSDataset):
           toffset (float): Time offset to be added to all points (i.e.
             time of first point)
           downsample (int): Interval by which to downsample points
+          lazy (bool): Do not load intensity into memory; mean, scale,
+            and χ² are instead calculated over blocks of frames read
+            from the hdf5 file as needed, and `timeseries_df` is None
+            unless *downsample* is specified
+          chunk_size (int): Number of frames to read from hdf5 file at
+            once
+          calc_frame_x2 (str): Path to experimental dataset against
+            which to fit scale and calculate χ² of every frame using
+            :meth:`compare_frames`; store in instance variable
+            `frame_x2_df`
+          calc_ensemble (str): Path to experimental dataset against
+            which to fit ensemble weights using :meth:`fit_ensemble`;
+            store in instance variable `ensemble_df`
+          ensemble_kw (dict): Keyword arguments passed to
+            :meth:`fit_ensemble`
+          profile (bool, str): Print the wall time, CPU time, peak
+            memory, and rows processed by each stage, as recorded in
+            instance variable `profiler`; if str, also write to this
+            path
+          profile_format (str): Format of profile written to *profile*;
+            may be 'json' or 'chrome'
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
 
@@ -55,44 +76,57 @@ class SAXSTimeSeriesDataset(TimeSeriesDataset, SAXSDataset):
           - Shift downsampling to superclass
         """
         from os.path import expandvars
+        import h5py
 
         # Arguments
         verbose = kwargs.get("verbose", 1)
         self.dataset_cache = kwargs.get("dataset_cache", None)
+        if getattr(self, "profiler", None) is None:
+            self.profiler = StageProfiler()
+        stage = self.profiler.stage
 
         # Read data
-        with h5py.File(expandvars(infile)) as h5_file:
-            q = ["{0:5.3f}".format(a) for a in
-                np.array(h5_file[address + "/q"])]
-        self.timeseries_df = self.read(
-          infile=infile + ":/" + address + "/intensity",
-          dataframe_kw=dict(columns=q), **kwargs)
-
-        # Process data
+        infile = expandvars(infile)
+        with h5py.File(infile, "r") as h5_file:
+            self.q = pd.Index(np.array(h5_file[address + "/q"], np.float64),
+              name="q")
+            n_frames = h5_file[address + "/intensity"].shape[0]
+        self.intensity_address = (infile, address + "/intensity")
+        self.index = pd.Index(np.arange(n_frames, dtype=np.float64))
         if dt:
-            self.timeseries_df.set_index(
-              self.timeseries_df.index.values * float(dt), inplace=True)
-            self.timeseries_df.index.name = "time"
+            self.index = pd.Index(self.index.values * float(dt), name="time")
         if toffset:
-            index_name = self.timeseries_df.index.name
-            self.timeseries_df.set_index(
-              self.timeseries_df.index.values + float(toffset), inplace=True)
-            self.timeseries_df.index.name = index_name
+            self.index = pd.Index(self.index.values + float(toffset),
+              name=self.index.name)
+        if lazy:
+            self.timeseries_df = None
+        else:
+            with stage("read", rows=n_frames):
+                self.timeseries_df = self.read(
+                  infile=infile + ":/" + address + "/intensity",
+                  dataframe_kw=dict(columns=self.q), **kwargs)
+            self.timeseries_df.index = self.index
+
+        # Process data
         if downsample:
-            self.downsample(downsample, downsample_mode="mean", **kwargs)
+            with stage("downsample", rows=n_frames):
+                self.timeseries_df = self.downsample_intensity(downsample,
+                  chunk_size=chunk_size, **kwargs)
+            self.index = self.timeseries_df.index
 
         # Calculate mean and standard error
         if calc_mean:
             block_kw = dict(min_n_blocks=2, max_cut=0.1, all_factors=False,
               fit_exp=True, fit_sig=False)
-            #            block_kw = dict(min_n_blocks=2, max_cut=0.1,
-            # all_factors=True,
-            #                            fit_exp=True, fit_sig=False)
             block_kw.update(kwargs.get("block_kw", {}))
-            self.mean_df, self.block_averager = self.calc_mean(
-              df=self.timeseries_df, mode="se", verbose=verbose, **block_kw)
-            self.mean_df.index.name = "q"
-            self.mean_df.columns = ["intensity", "intensity se"]
+            with stage("mean", rows=self.index.size):
+                mean, block_df = self.calc_intensity_mean(
+                  chunk_size=chunk_size, **kwargs)
+                block_mean_df, self.block_averager = self.calc_mean(
+                  df=block_df, mode="se", verbose=verbose, **block_kw)
+            self.mean_df = pd.DataFrame(
+              np.column_stack((mean, block_mean_df.values[:, 1])),
+              index=self.q, columns=["intensity", "intensity se"])
             self.df = self.mean_df
 
         # Scale
@@ -102,13 +136,26 @@ class SAXSTimeSeriesDataset(TimeSeriesDataset, SAXSDataset):
         # X2
         if calc_x2 and isinstance(calc_x2, six.string_types):
             self.x2(calc_x2, **kwargs)
+        if calc_frame_x2 and isinstance(calc_frame_x2, six.string_types):
+            with stage("frame x2", rows=self.index.size):
+                self.frame_x2_df = self.compare_frames(calc_frame_x2,
+                  chunk_size=chunk_size, **kwargs)
+            if verbose >= 2:
+                print("Processed per-frame χ² DataFrame:")
+                print(self.frame_x2_df)
+        if calc_ensemble and isinstance(calc_ensemble, six.string_types):
+            ensemble_kw = kwargs.get("ensemble_kw", {})
+            with stage("ensemble", rows=self.index.size):
+                self.ensemble_df, self.ensemble_x2 = self.fit_ensemble(
+                  calc_ensemble, verbose=verbose, **ensemble_kw)
 
         # Output data
-        if verbose >= 2:
+        if verbose >= 2 and self.timeseries_df is not None:
             print("Processed timeseries DataFrame:")
             print(self.timeseries_df)
-        if outfile is not None:
-            self.write(df=self.timeseries_df, outfile=outfile, **kwargs)
+        if outfile is not None and self.timeseries_df is not None:
+            with stage("write", rows=self.timeseries_df.shape[0]):
+                self.write(df=self.timeseries_df, outfile=outfile, **kwargs)
         if calc_mean:
             if verbose >= 2:
                 print("Processed mean DataFrame:")
@@ -116,10 +163,391 @@ class SAXSTimeSeriesDataset(TimeSeriesDataset, SAXSDataset):
             if isinstance(calc_mean, six.string_types):
                 self.write(df=self.mean_df, outfile=calc_mean, **kwargs)
 
+        # Output profile
+        if profile:
+            self.output_profile(profile, **kwargs)
+
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
+    def iter_intensity(self, chunk_size=4096, **kwargs):
+        """
+        Iterates over blocks of frames of intensity.
+
+        Frames are taken from `timeseries_df` if it has been loaded, and
+        otherwise read from the hdf5 file one block at a time.
+
+        Arguments:
+          chunk_size (int): Number of frames in each block
+
+        Yields:
+          (int, ndarray): Index of first frame in block, and intensity
+          of frames in block (frame, q)
+        """
+        import h5py
+
+        if self.timeseries_df is not None:
+            intensity = self.timeseries_df.values
+            for start in range(0, intensity.shape[0], chunk_size):
+                yield start, intensity[start:start + chunk_size]
+        else:
+            infile, address = self.intensity_address
+            with h5py.File(infile, "r") as h5_file:
+                intensity = h5_file[address]
+                for start in range(0, intensity.shape[0], chunk_size):
+                    yield start, intensity[start:start + chunk_size]
+
+    def downsample_intensity(self, downsample, chunk_size=4096, **kwargs):
+        """
+        Downsamples intensity by averaging over consecutive frames.
+
+        Frames are processed in blocks, such that the full-resolution
+        intensity need not be loaded into memory.
+
+        Arguments:
+          downsample (int): Interval by which to downsample frames;
+            trailing frames that do not fill an interval are discarded
+          chunk_size (int): Number of frames to process at once; rounded
+            to a multiple of *downsample*
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: Downsampled timeseries
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        n_frames = self.index.size - (self.index.size % downsample)
+        chunk_size = max(1, chunk_size // downsample) * downsample
+        if verbose >= 1:
+            wiprint("downsampling by factor of {0} using mean".format(
+              downsample))
+
+        reduced = np.zeros((n_frames // downsample, self.q.size))
+        for start, chunk in self.iter_intensity(chunk_size):
+            stop = min(start + chunk.shape[0], n_frames)
+            if stop <= start:
+                break
+            reduced[start // downsample:stop // downsample] = np.reshape(
+              chunk[:stop - start], (-1, downsample, self.q.size)).mean(axis=1)
+        index = np.reshape(self.index.values[:n_frames],
+          (-1, downsample)).mean(axis=1)
+
+        df = pd.DataFrame(reduced, index=index, columns=self.q)
+        df.index.name = "time"
+
+        return df
+
+    def calc_intensity_mean(self, chunk_size=4096, n_blocks=4096, **kwargs):
+        """
+        Calculates the mean intensity over all frames.
+
+        Frames are processed in blocks, accumulating the sum over all
+        frames along with the means over *n_blocks* equal blocks of
+        frames; the latter are small enough to be passed to
+        :meth:`calc_mean` to estimate the standard error.
+
+        Arguments:
+          chunk_size (int): Number of frames to process at once; rounded
+            to a multiple of the block size
+          n_blocks (int): Maximum number of blocks over which to average;
+            trailing frames that do not fill a block are included in
+            the mean but not the block averages
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          (ndarray, DataFrame): Mean intensity at each q, and block
+          averages of intensity
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        n_frames = self.index.size
+        block_size = max(1, int(np.ceil(n_frames / n_blocks)))
+        n_blocks = n_frames // block_size
+        n_blocked = n_blocks * block_size
+        chunk_size = max(1, chunk_size // block_size) * block_size
+        if verbose >= 1:
+            wiprint("""Calculating mean intensity over {0} frames in blocks
+                    of {1}""".format(n_frames, block_size))
+
+        total = np.zeros(self.q.size)
+        blocks = np.zeros((n_blocks, self.q.size))
+        for start, chunk in self.iter_intensity(chunk_size):
+            total += chunk.sum(axis=0, dtype=np.float64)
+            n_chunk_blocks = (min(start + chunk.shape[0], n_blocked) - start
+                             ) // block_size
+            if n_chunk_blocks > 0:
+                first = start // block_size
+                blocks[first:first + n_chunk_blocks] = np.reshape(
+                  chunk[:n_chunk_blocks * block_size],
+                  (n_chunk_blocks, block_size, self.q.size)).mean(axis=1,
+                  dtype=np.float64)
+
+        block_df = pd.DataFrame(blocks, columns=self.q,
+          index=np.reshape(self.index.values[:n_blocked],
+            (n_blocks, block_size)).mean(axis=1))
+        block_df.index.name = self.index.name
+
+        return total / n_frames, block_df
+
+    def compare_frames(self, target, chunk_size=4096, **kwargs):
+        """
+        Fits scale and calculates χ² of every frame relative to a
+        target dataset.
+
+        The target is interpolated onto q once, after which the
+        closed-form scale factor and χ² of each frame are calculated
+        from matrix-vector products over blocks of *chunk_size* frames.
+
+        Arguments:
+          target (str): Path to input file relative to which frames will
+            be compared; may contain environment variables
+          chunk_size (int): Number of frames to process at once
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: DataFrame whose index is the index of
+          `timeseries_df` and whose columns are the scale factor and χ²
+          of each frame
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        n_frames = self.index.size
+        if verbose >= 1:
+            wiprint("""Calculating scale and χ² of {0} frames relative to
+                    '{1}'""".format(n_frames, target))
+
+        indexes, target_I, target_Ise = self.load_target(target, self.q)
+        if target_Ise is None:
+            raise ValueError("Target '{0}' lacks column 'intensity se', "
+                             "required to calculate χ²".format(target))
+
+        scale = np.zeros(n_frames)
+        x2 = np.zeros(n_frames)
+        for start, chunk in self.iter_intensity(chunk_size):
+            stop = start + chunk.shape[0]
+            chunk = np.array(chunk[:, indexes], np.float64)
+            scale[start:stop] = self.fit_scale(chunk, target_I, target_Ise)
+            x2[start:stop] = self.calc_x2(chunk, target_I, target_Ise,
+              scale[start:stop])
+
+        frame_x2_df = pd.DataFrame(np.column_stack((scale, x2)),
+          index=self.index, columns=["scale", "x2"])
+
+        return frame_x2_df
+
+    def fit_ensemble(self, target, mode="maxent", chunk_size=4096,
+      **kwargs):
+        """
+        Fits weights of frames to reproduce a target dataset.
+
+        Arguments:
+          target (str): Path to input file to which ensemble will be
+            fit; may contain environment variables
+          mode (str): Method of fitting; may be 'maxent' for maximum
+            entropy reweighting using :meth:`calc_maxent_weights`, or
+            'greedy' for greedy subset selection using
+            :meth:`calc_greedy_subset`
+          chunk_size (int): Number of frames to read at once; only the
+            values of q within the range of the target are retained
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments passed to method
+            of fitting
+
+        Returns:
+          (DataFrame, float): DataFrame whose index is the index of
+          `timeseries_df` and whose column 'weight' is the fitted
+          weight of each frame; and χ² of the weighted ensemble after
+          scaling
+        """
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        indexes, target_I, target_Ise = self.load_target(target, self.q)
+        if target_Ise is None:
+            raise ValueError("Target '{0}' lacks column 'intensity se', "
+                             "required to fit ensemble".format(target))
+        intensity = np.concatenate([chunk[:, indexes] for _, chunk in
+          self.iter_intensity(chunk_size)])
+
+        # Fit
+        if mode == "maxent":
+            if verbose >= 1:
+                wiprint("""Fitting maximum entropy weights of {0} frames to
+                        '{1}'""".format(intensity.shape[0], target))
+            weights = self.calc_maxent_weights(intensity, target_I,
+              target_Ise, **kwargs)
+        elif mode == "greedy":
+            if verbose >= 1:
+                wiprint("""Selecting subset of {0} frames to fit
+                        '{1}'""".format(intensity.shape[0], target))
+            weights = self.calc_greedy_subset(intensity, target_I,
+              target_Ise, **kwargs)
+        else:
+            raise ValueError("Ensemble fitting mode '{0}' not "
+                             "understood".format(mode))
+
+        # Evaluate
+        average = weights.dot(intensity)
+        scale = self.fit_scale(average, target_I, target_Ise)
+        x2 = self.calc_x2(average, target_I, target_Ise, scale)
+        if verbose >= 1:
+            wiprint("""Fitted ensemble of {0} frames with nonzero weight;
+                    scale {1}, χ² {2}""".format(np.sum(weights > 0), scale,
+              x2))
+        ensemble_df = pd.DataFrame(weights, index=self.index,
+          columns=["weight"])
+
+        return ensemble_df, x2
+
+    @staticmethod
+    def calc_maxent_weights(intensity, target_I, target_Ise, theta=1.0,
+      prior=None, tol=1e-6, n_scale_iter=100, max_iter=1000, **kwargs):
+        """
+        Calculates maximum entropy weights of frames given a target.
+
+        Weights minimize χ²/2 - θ S, where S is the relative entropy
+        of the weights with respect to the *prior*. The problem is
+        solved in its dual form, in which weights are w ∝ w₀ exp(-Σ λ
+        I / σ) and the Lagrange multipliers λ (one per q) are optimized
+        by L-BFGS; the objective and its gradient are evaluated with
+        one pair of matrix-vector products over the intensity matrix,
+        in its own precision.
+
+        The scale factor between intensity and target is fit jointly
+        with the weights: the dual is solved for a given scale, and the
+        scale is updated until it equals the least-squares scale of the
+        resulting weighted average to within *tol*. Simply alternating
+        between the two converges slowly, so updates are made by the
+        secant method on the difference between the two scales, starting
+        each solution of the dual from the last.
+
+        Arguments:
+          intensity (ndarray): Intensity of each frame (frame, q)
+          target_I (ndarray): Target intensity
+          target_Ise (ndarray): Standard error of target intensity
+          theta (float): Confidence in prior relative to target; larger
+            values yield weights closer to the prior
+          prior (ndarray, optional): Prior weight of each frame; uniform
+            if omitted
+          tol (float): Relative tolerance of scale factor
+          n_scale_iter (int): Maximum number of updates of scale factor;
+            a warning is issued if the scale has not converged
+          max_iter (int): Maximum number of iterations of L-BFGS per
+            update
+
+        Returns:
+          ndarray: Weight of each frame, summing to one
+        """
+        from warnings import warn
+        from scipy.optimize import minimize
+        from scipy.special import logsumexp
+
+        # Prepare intensities in units of target standard error
+        n_frames = intensity.shape[0]
+        dtype = intensity.dtype
+        if prior is None:
+            log_prior = np.full(n_frames, -np.log(n_frames))
+        else:
+            log_prior = np.log(np.array(prior, np.float64) / np.sum(prior))
+        reduced = intensity / target_Ise.astype(dtype)
+        reduced_target = target_I / target_Ise
+
+        def log_weights(lambdas):
+            log_w = log_prior - reduced.dot(lambdas.astype(dtype))
+            return log_w - logsumexp(log_w)
+
+        def dual(lambdas, scale):
+            log_w = log_weights(lambdas * scale)
+            average = np.exp(log_w).astype(dtype).dot(reduced) * scale
+            value = logsumexp(log_prior - reduced.dot(
+              (lambdas * scale).astype(dtype))) + lambdas.dot(
+              reduced_target) + (theta / 2) * lambdas.dot(lambdas)
+            gradient = reduced_target - average + theta * lambdas
+            return value, gradient
+
+        # Fit scale and weights
+        lambdas = np.zeros(reduced_target.size)
+        scale = SAXSTimeSeriesDataset.fit_scale(
+          np.exp(log_prior).astype(dtype).dot(reduced), reduced_target)
+        last = None
+        for i in range(n_scale_iter):
+            lambdas = minimize(dual, lambdas, args=(scale,), jac=True,
+              method="L-BFGS-B", options=dict(maxiter=max_iter,
+                ftol=tol ** 2)).x
+            weights = np.exp(log_weights(lambdas * scale))
+            residual = SAXSTimeSeriesDataset.fit_scale(
+              weights.astype(dtype).dot(reduced), reduced_target) - scale
+            if abs(residual) <= tol * abs(scale):
+                break
+            if last is None or residual == last[1]:
+                update = scale + residual
+            else:
+                update = scale - residual * (scale - last[0]) / (
+                  residual - last[1])
+            last = (scale, residual)
+            scale = update
+        else:
+            warn("Scale factor did not converge within {0} ".format(
+              n_scale_iter) + "iterations; relative change {0}".format(
+              residual / scale))
+
+        return weights
+
+    @staticmethod
+    def calc_greedy_subset(intensity, target_I, target_Ise, n_select=100,
+      **kwargs):
+        """
+        Selects a subset of frames whose average best fits a target.
+
+        Frames are added one at a time, with replacement, choosing at
+        each step the frame that minimizes χ² of the scaled average.
+        Each step evaluates all candidate frames at once using the
+        closed-form scale and χ² of :meth:`fit_scale` and
+        :meth:`calc_x2`, requiring one matrix-vector product over the
+        intensity matrix.
+
+        Arguments:
+          intensity (ndarray): Intensity of each frame (frame, q)
+          target_I (ndarray): Target intensity
+          target_Ise (ndarray): Standard error of target intensity
+          n_select (int): Number of frames to select
+
+        Returns:
+          ndarray: Weight of each frame, proportional to the number of
+          times it was selected
+        """
+        weight = 1 / np.array(target_Ise, np.float64) ** 2
+        target_I = np.array(target_I, np.float64)
+
+        # Quantities that do not change as frames are selected
+        frame_target = intensity.dot(weight * target_I)
+        frame_square = np.einsum("ij,ij,j->i", intensity, intensity, weight)
+        target_square = np.sum(weight * target_I ** 2)
+
+        counts = np.zeros(intensity.shape[0], int)
+        total = np.zeros(target_I.size)
+        for n in range(1, n_select + 1):
+            # χ² of average of selected frames plus each candidate, after
+            #   optimal scaling, is t·t - (a·t)² / (a·a) (weighted)
+            cross = (total.dot(weight * target_I) + frame_target) / n
+            square = (total.dot(weight * total) + 2 * intensity.dot(
+              weight * total) + frame_square) / n ** 2
+            residual = target_square - cross ** 2 / square
+            best = np.argmin(residual)
+            counts[best] += 1
+            total += intensity[best]
+
+        return counts / n_select
+
 #################################### MAIN #####################################
 if __name__ == "__main__":
     SAXSTimeSeriesDataset.main()
@@ -17,9 +17,9 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
+from .. import sort_residues
 from ..myplotspec.Dataset import Dataset
 from ..myplotspec import sformat, wiprint
 
@@ -42,6 +42,11 @@ class SequenceDataset(Dataset):
           TYR:3    2.443613  0.004040  5.138383  0.025376  ...
           LYS:4    2.511626  0.004341  5.589428  0.026236  ...
           ...      ...       ...       ...       ...       ...
+
+      residue_df (DataFrame): DataFrame whose index matches that of
+        `sequence_df` and whose columns are the residue number (int)
+        and name (categorical), parsed once when data is read; see
+        :func:`residue_index<moldynplot.residue_index>`
     """
 
     default_hdf5_address = "/"
@@ -101,6 +106,40 @@ class SequenceDataset(Dataset):
 
         return parser
 
+    #: Derived products, and keyword arguments configuring each; see
+    #:   :class:`DatasetPlanner<moldynplot.DatasetPlanner.DatasetPlanner>`
+    product_kw = {"calc_pdist": ("pdist_kw",)}
+    #: Keyword arguments applied to sequence once read
+    view_kw = ("use_indexes", "outfile")
+
+    @classmethod
+    def load_variants(cls, variants, **kwargs):
+        """
+        Loads several datasets that differ only in keyword arguments
+        listed in `product_kw` and `view_kw`, reading their input once.
+
+        Arguments:
+          variants (list): Keyword arguments of each dataset
+          kwargs (dict): Additional keyword arguments passed to each
+            dataset
+
+        Returns:
+          list: Datasets
+        """
+        source = cls.__new__(cls)
+        source.dataset_cache = kwargs.get("dataset_cache", None)
+        source_df = source.read(**dict(variants[0], **kwargs))
+
+        datasets = []
+        for variant in variants:
+            dataset = cls.__new__(cls)
+            dataset.sequence_df = source_df.copy(deep=False)
+            dataset.residue_df = source.residue_df.copy(deep=False)
+            dataset.__init__(**dict(variant, **kwargs))
+            datasets.append(dataset)
+
+        return datasets
+
     @classmethod
     def get_cache_key(cls, **kwargs):
         """
@@ -155,15 +194,12 @@ class SequenceDataset(Dataset):
         self.dataset_cache = kwargs.get("dataset_cache", None)
 
         # Read data
-        self.sequence_df = self.read(**kwargs)
+        if not hasattr(self, "sequence_df"):
+            self.sequence_df = self.read(**kwargs)
 
         # Process data
         if "use_indexes" in kwargs:
-            use_indexes = np.array(kwargs.pop("use_indexes"), np.int)
-            res_index = np.array(
-              [int(i.split(":")[1]) for i in self.sequence_df.index.values])
-            self.sequence_df = self.sequence_df[
-                np.in1d(res_index, use_indexes)]
+            self.select_residues(kwargs.pop("use_indexes"))
 
         # Output data
         if verbose >= 2:
@@ -183,8 +219,44 @@ class SequenceDataset(Dataset):
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
+    @staticmethod
+    def sort_sequence(df):
+        """
+        Sorts sequence DataFrame by residue number, if its index
+        contains residues, or otherwise by index.
+
+        Arguments:
+          df (DataFrame): Sequence DataFrame
+
+        Returns:
+          (DataFrame, DataFrame): Sorted sequence DataFrame, and its
+          residue index if applicable (otherwise None)
+        """
+        if df.index.name == "residue":
+            return sort_residues(df)
+        else:
+            return df.loc[sorted(df.index.values)], None
+
+    def select_residues(self, use_indexes):
+        """
+        Selects residues from `sequence_df` by residue number.
+
+        Arguments:
+          use_indexes (list): Residue numbers to select
+        """
+        from .. import residue_index
+
+        if getattr(self, "residue_df", None) is None:
+            self.residue_df = residue_index(self.sequence_df.index)
+        selection = np.in1d(self.residue_df["number"].values,
+          np.array(use_indexes, np.int64))
+        self.sequence_df = self.sequence_df[selection]
+        self.residue_df = self.residue_df[selection]
+
     def _read_index(self, df, indexfile=None, **kwargs):
         """
         Reads index for sequence DataFrame.
@@ -237,11 +309,7 @@ class SequenceDataset(Dataset):
         df = self._read_index(df, **kwargs)
 
         # Sort
-        if df.index.name == "residue":
-            df = df.loc[
-                sorted(df.index.values, key=lambda x: int(x.split(":")[1]))]
-        else:
-            df = df.loc[sorted(df.index.values)]
+        df, self.residue_df = self.sort_sequence(df)
 
         return df
 
@@ -20,11 +20,12 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-import h5py
 import numpy as np
 import pandas as pd
 import six
-from IPython import embed
+from contextlib import contextmanager
+from .. import sort_residues
+from ..StageProfiler import StageProfiler
 from ..myplotspec.Dataset import Dataset
 from ..myplotspec import wiprint, sformat
 ################################### CLASSES ###################################
@@ -38,6 +39,46 @@ class TimeSeriesDataset(Dataset):
         whose columns are a series of quantities as a function of time.
     """
 
+    #: Derived products, and keyword arguments configuring each; see
+    #:   :class:`DatasetPlanner<moldynplot.DatasetPlanner.DatasetPlanner>`
+    product_kw = {"calc_pdist": ("pdist_kw", "pdist_bandwidth", "pdist_grid"),
+        "calc_mean": ("block_kw",), "calc_state_probs": ("state_kw",
+        "state_columns", "state_cutoffs", "states"),
+        "calc_pdist2d": ("pdist2d_kw",)}
+    #: Keyword arguments applied to timeseries once read
+    view_kw = ("dt", "toffset", "downsample", "downsample_mode", "outfile")
+
+    @classmethod
+    def load_variants(cls, variants, **kwargs):
+        """
+        Loads several datasets that differ only in keyword arguments
+        listed in `product_kw` and `view_kw`, reading their input once.
+
+        Arguments:
+          variants (list): Keyword arguments of each dataset
+          kwargs (dict): Additional keyword arguments passed to each
+            dataset
+
+        Returns:
+          list: Datasets
+        """
+        source = cls.__new__(cls)
+        source.dataset_cache = kwargs.get("dataset_cache", None)
+        source.profiler = StageProfiler()
+        with source.profiler.stage("read") as stage:
+            source_df = source.read(**dict(variants[0], **kwargs))
+            stage["rows"] = source_df.shape[0]
+
+        datasets = []
+        for variant in variants:
+            dataset = cls.__new__(cls)
+            dataset.profiler = source.profiler.copy()
+            dataset.timeseries_df = dataset.df = source_df.copy(deep=False)
+            dataset.__init__(**dict(variant, **kwargs))
+            datasets.append(dataset)
+
+        return datasets
+
     @staticmethod
     def construct_argparser(parser_or_subparsers=None, **kwargs):
         """
@@ -99,6 +140,30 @@ class TimeSeriesDataset(Dataset):
         add_argument(action_group, "--mean", const=True, default=False,
           dest="calc_mean", nargs="?",
           help="""calculate mean and standard error over timeseries""")
+        add_argument(action_group, "--stateprobs", const=True, default=False,
+          dest="calc_state_probs", metavar="OUTFILE", nargs="?",
+          help="""assign frames to states and calculate state probabilities;
+          if OUTFILE is provided, write to its 'assign/stateprobs'""")
+        add_argument(action_group, "--state_columns",
+          default=argparse.SUPPRESS, dest="state_columns", nargs="+",
+          metavar="COLUMN", help="""columns used to assign states""")
+        add_argument(action_group, "--state_cutoffs",
+          default=argparse.SUPPRESS, dest="state_cutoffs", nargs="+",
+          metavar="CUTOFF", type=float,
+          help="""cutoff below which frames are assigned to the first state;
+          if two are provided, frames enter the first state below the lower
+          and the second state above the upper (hysteresis)""")
+        add_argument(action_group, "--states", default=argparse.SUPPRESS,
+          dest="states", nargs=2, metavar="STATE",
+          help="""names of states below and above cutoff""")
+        add_argument(action_group, "--profile", const=True, default=False,
+          dest="profile", metavar="OUTFILE", nargs="?",
+          help="""record wall time, CPU time, peak memory, and rows processed
+          by each stage; if OUTFILE is provided, write to it""")
+        add_argument(action_group, "--profile_format", default="json",
+          dest="profile_format", choices=["json", "chrome"],
+          help="""format of profile OUTFILE; 'chrome' for Chrome trace
+          format, viewable in chrome://tracing""")
 
         # Arguments inherited from superclass
         Dataset.construct_argparser(parser)
@@ -106,7 +171,8 @@ class TimeSeriesDataset(Dataset):
         return parser
 
     def __init__(self, dt=None, toffset=None, downsample=None,
-      calc_pdist=False, calc_mean=False, outfile=None, interactive=False,
+      calc_pdist=False, calc_mean=False, calc_state_probs=False,
+      calc_pdist2d=False, outfile=None, interactive=False, profile=False,
       **kwargs):
         """
         Arguments:
@@ -126,8 +192,32 @@ class TimeSeriesDataset(Dataset):
             probability distribution calculation
           calc_mean (bool): Calculate mean and standard error using
             :method:`calc_mean`; store in instance variable `sequence_df`
+          calc_state_probs (bool, str): Assign frames to states and
+            calculate state probabilities using
+            :meth:`calc_state_probs`; store in instance variable
+            `state_probs`; if str, also write to 'assign/stateprobs' of
+            this hdf5 file
+          state_kw (dict): Keyword arguments used to configure state
+            assignment
+          calc_pdist2d (bool, str): Calculate joint probability
+            distribution of two columns using :meth:`calc_pdist2d` and
+            free energy using :meth:`calc_free_energy`; store in instance
+            variables `pdist2d_df` and `fes_df`; if str, also write free
+            energy to this path
+          pdist2d_kw (dict): Keyword arguments used to configure joint
+            probability distribution and free energy calculation; if
+            'infile' is included, the distribution is calculated from
+            that hdf5 file rather than from the loaded timeseries, and
+            may be cached using 'cache'; otherwise it is calculated from
+            the loaded timeseries, and is not cached
           interactive (bool): Provide iPython prompt and reading and
             processing data
+          profile (bool, str): Print the wall time, CPU time, peak
+            memory, and rows processed by each stage, as recorded in
+            instance variable `profiler`; if str, also write to this
+            path
+          profile_format (str): Format of profile written to *profile*;
+            may be 'json' or 'chrome'
           verbose (int): Level of verbose output
           kwargs (dict): Additional keyword arguments
 
@@ -143,31 +233,44 @@ class TimeSeriesDataset(Dataset):
         verbose = kwargs.get("verbose", 1)
         if not hasattr(self, "dataset_cache") or self.dataset_cache is None:
             self.dataset_cache = kwargs.get("dataset_cache", None)
+        if getattr(self, "profiler", None) is None:
+            self.profiler = StageProfiler()
+        stage = self.profiler.stage
 
         # Read data
         if not hasattr(self, "timeseries_df"):
-            self.timeseries_df = self.df = self.read(**kwargs)
+            with stage("read") as record:
+                self.timeseries_df = self.df = self.read(**kwargs)
+                record["rows"] = self.timeseries_df.shape[0]
+        n_rows = self.timeseries_df.shape[0]
 
         # Process data
-        if dt:
-            self.timeseries_df.set_index(
-              self.timeseries_df.index.values * float(dt), inplace=True)
-            self.timeseries_df.index.name = "time"
-        if toffset:
-            index_name = self.timeseries_df.index.name
-            self.timeseries_df.set_index(
-              self.timeseries_df.index.values + float(toffset), inplace=True)
-            self.timeseries_df.index.name = index_name
+        if dt or toffset:
+            with stage("dt/toffset", rows=n_rows):
+                if dt:
+                    self.timeseries_df.set_index(
+                      self.timeseries_df.index.values * float(dt),
+                      inplace=True)
+                    self.timeseries_df.index.name = "time"
+                if toffset:
+                    index_name = self.timeseries_df.index.name
+                    self.timeseries_df.set_index(
+                      self.timeseries_df.index.values + float(toffset),
+                      inplace=True)
+                    self.timeseries_df.index.name = index_name
         if downsample:
-            self.timeseries_df = self.downsample(df=self.timeseries_df,
-              downsample=downsample, **kwargs)
+            with stage("downsample", rows=n_rows):
+                self.timeseries_df = self.downsample(df=self.timeseries_df,
+                  downsample=downsample, **kwargs)
+            n_rows = self.timeseries_df.shape[0]
 
         # Output data
         if verbose >= 2:
             print("Processed timeseries DataFrame:")
             print(self.timeseries_df)
         if outfile is not None:
-            self.write(df=self.timeseries_df, outfile=outfile, **kwargs)
+            with stage("write", rows=n_rows):
+                self.write(df=self.timeseries_df, outfile=outfile, **kwargs)
 
         # Calculate probability distibution
         if calc_pdist:
@@ -177,35 +280,365 @@ class TimeSeriesDataset(Dataset):
             if "pdist_grid" in kwargs:
                 pdist_kw["grid"] = np.arange(kwargs["pdist_grid"][0],
                   kwargs["pdist_grid"][1], kwargs["pdist_grid"][2])
-            self.pdist_df = self.calc_pdist(df=self.timeseries_df,
-              verbose=verbose, **pdist_kw)
+            with stage("pdist", rows=n_rows):
+                self.pdist_df = self.calc_pdist(df=self.timeseries_df,
+                  verbose=verbose, **pdist_kw)
 
             # Output data
             if verbose >= 2:
                 print("Processed pdist DataFrame:")
                 print(self.pdist_df)
             if isinstance(calc_pdist, six.string_types):
-                self.write(df=self.pdist_df, outfile=calc_pdist, **kwargs)
+                with stage("write", rows=self.pdist_df.shape[0]):
+                    self.write(df=self.pdist_df, outfile=calc_pdist,
+                      **kwargs)
 
         # Calculate mean and standard error
         if calc_mean:
             block_kw = dict(min_n_blocks=2, max_cut=0.1, all_factors=False,
               fit_exp=True, fit_sig=False)
             block_kw.update(kwargs.get("block_kw", {}))
-            self.mean_df, self.block_averager = self.calc_mean(
-              df=self.timeseries_df, verbose=verbose, **block_kw)
+            with stage("mean", rows=n_rows):
+                self.mean_df, self.block_averager = self.calc_mean(
+                  df=self.timeseries_df, verbose=verbose, **block_kw)
 
             # Output data
             if verbose >= 2:
                 print("Processed mean DataFrame:")
                 print(self.mean_df)
             if isinstance(calc_mean, six.string_types):
-                self.write(df=self.mean_df, outfile=calc_mean, **kwargs)
+                with stage("write", rows=self.mean_df.shape[0]):
+                    self.write(df=self.mean_df, outfile=calc_mean, **kwargs)
+
+        # Assign states and calculate state probabilities
+        if calc_state_probs:
+            state_kw = kwargs.get("state_kw", {}).copy()
+            if "state_columns" in kwargs:
+                state_kw["columns"] = kwargs["state_columns"]
+            if "state_cutoffs" in kwargs:
+                if len(kwargs["state_cutoffs"]) == 1:
+                    state_kw["cutoff"] = kwargs["state_cutoffs"][0]
+                else:
+                    state_kw["cutoffs"] = kwargs["state_cutoffs"]
+            if "states" in kwargs:
+                state_kw["states"] = kwargs["states"]
+            block_kw = dict(min_n_blocks=2, max_cut=0.1, all_factors=False,
+              fit_exp=True, fit_sig=False)
+            block_kw.update(kwargs.get("block_kw", {}))
+            state_kw["block_kw"] = block_kw
+            with stage("state probs", rows=n_rows):
+                self.state_probs = self.calc_state_probs(
+                  df=self.timeseries_df, verbose=verbose, **state_kw)
+
+            # Output data
+            if verbose >= 1:
+                print("State probabilities:")
+                print(self.state_probs)
+            if isinstance(calc_state_probs, six.string_types):
+                with stage("write", rows=1):
+                    self.write_state_probs(self.state_probs,
+                      calc_state_probs, verbose=verbose)
+
+        # Calculate joint probability distribution and free energy
+        if calc_pdist2d:
+            pdist2d_kw = kwargs.get("pdist2d_kw", {})
+            with stage("pdist2d", rows=n_rows):
+                if pdist2d_kw.get("infile") is not None:
+                    self.pdist2d_df = self.calc_pdist2d(verbose=verbose,
+                      **pdist2d_kw)
+                else:
+                    self.pdist2d_df = self.calc_pdist2d(
+                      df=self.timeseries_df, verbose=verbose, **pdist2d_kw)
+                self.fes_df = self.calc_free_energy(self.pdist2d_df,
+                  **pdist2d_kw)
+
+            # Output data
+            if verbose >= 2:
+                print("Processed free energy DataFrame:")
+                print(self.fes_df)
+            if isinstance(calc_pdist2d, six.string_types):
+                with stage("write", rows=self.fes_df.shape[0]):
+                    self.write(df=self.fes_df, outfile=calc_pdist2d,
+                      **kwargs)
+
+        # Output profile
+        if profile:
+            self.output_profile(profile, **kwargs)
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
+    def output_profile(self, profile, **kwargs):
+        """
+        Outputs the stages recorded in instance variable `profiler`.
+
+        Arguments:
+          profile (bool, str): Print stages; if str, also write to this
+            path
+          profile_format (str): Format of profile written to *profile*;
+            see :meth:`StageProfiler.write
+            <moldynplot.StageProfiler.StageProfiler.write>`
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+        """
+        verbose = kwargs.get("verbose", 1)
+
+        if verbose >= 1:
+            print("Stage profile:")
+            print(self.profiler.to_dataframe())
+        if isinstance(profile, six.string_types):
+            self.profiler.write(profile,
+              format=kwargs.get("profile_format", "json"), verbose=verbose)
+
+    @staticmethod
+    def assign_states(values, cutoff=None, cutoffs=None, combine="all",
+      initial=None, **kwargs):
+        """
+        Assigns frames to one of two states based on one or more columns.
+
+        With a single *cutoff*, each column is below or above the cutoff
+        in each frame. With two *cutoffs* (hysteresis), each column
+        enters the lower state when below the lower cutoff and the upper
+        state when above the upper cutoff, and otherwise remains in its
+        previous state; this is evaluated without a loop over frames by
+        carrying forward the index of the last frame outside of the
+        cutoffs. Frames of each column are then combined into the lower
+        state if all (or any) columns are in their lower state.
+
+        Arguments:
+          values (ndarray): Values (frame, column)
+          cutoff (float): Cutoff of threshold assignment
+          cutoffs (list): Lower and upper cutoffs of hysteresis
+            assignment
+          combine (str): Assign frame to lower state if 'all' or 'any'
+            columns are in their lower state
+          initial (ndarray, optional): State of each column preceding
+            the first frame, used to continue hysteresis assignment
+            across blocks of frames; -1 if unassigned
+
+        Returns:
+          (ndarray, ndarray): State of each frame (0 for lower, 1 for
+          upper, -1 for unassigned), and state of each column at the
+          last frame
+        """
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        n_frames, n_columns = values.shape
+        if initial is None:
+            initial = np.full(n_columns, -1, np.int8)
+
+        # Assign each column
+        if cutoffs is None:
+            if cutoff is None:
+                raise TypeError("Either 'cutoff' or 'cutoffs' is required")
+            column_states = np.where(values < cutoff, 0, 1).astype(np.int8)
+            column_states[np.isnan(values)] = -1
+        else:
+            lower, upper = cutoffs
+            outside = np.full(values.shape, -1, np.int8)
+            outside[values < lower] = 0
+            outside[values > upper] = 1
+            last = np.where(outside >= 0,
+              np.arange(n_frames)[:, np.newaxis], -1)
+            np.maximum.accumulate(last, axis=0, out=last)
+            column_states = np.where(last >= 0,
+              outside[last, np.arange(n_columns)],
+              np.asarray(initial, np.int8)[np.newaxis, :]).astype(np.int8)
+        if n_frames > 0:
+            final = column_states[-1].copy()
+        else:
+            final = np.asarray(initial, np.int8)
+
+        # Combine columns
+        unassigned = (column_states < 0).any(axis=1)
+        if combine == "all":
+            states = np.where((column_states == 0).all(axis=1), 0, 1)
+        elif combine == "any":
+            states = np.where((column_states == 0).any(axis=1), 0, 1)
+        else:
+            raise ValueError("combine must be 'all' or 'any'")
+        states = states.astype(np.int8)
+        states[unassigned] = -1
+
+        return states, final
+
+    @staticmethod
+    @contextmanager
+    def open_values(df=None, infile=None, address=None, columns=None):
+        """
+        Opens timeseries values for reading in blocks of frames.
+
+        Arguments:
+          df (DataFrame): Timeseries DataFrame
+          infile (str): Path to hdf5 file, used if *df* is not provided;
+            may contain environment variables, and may be in the form
+            ``path.h5:address``; column names are read from the
+            'fields' attribute of the dataset if present
+          address (str): Address of timeseries within *infile*
+          columns (list): Columns to read; all if omitted
+
+        Yields:
+          (int, function): Number of frames, and function accepting
+          start and stop frames and returning values of those frames
+          (frame, column)
+        """
+        from os.path import expandvars
+        import re
+        import h5py
+
+        if isinstance(columns, six.string_types):
+            columns = [columns]
+
+        if df is not None:
+            if columns is None:
+                values = df.values
+            else:
+                values = df[columns].values
+            yield values.shape[0], lambda start, stop: values[start:stop]
+            return
+
+        path, h5_address = expandvars(infile), address
+        match = re.match(r"^(?P<path>.+\.(h5|hdf5)):/?(?P<address>.+)$", path)
+        if match:
+            path, h5_address = match.group("path"), match.group("address")
+        with h5py.File(path, "r") as h5_file:
+            dataset = h5_file[h5_address]
+            if columns is None or dataset.ndim == 1:
+                indexes = slice(None)
+            else:
+                fields = [f.decode() if isinstance(f, bytes) else f for f in
+                    dataset.attrs.get("fields", [])]
+                indexes = [fields.index(c) if c in fields else int(c) for c
+                    in columns]
+            yield dataset.shape[0], lambda start, stop: np.array(
+              dataset[start:stop])[..., indexes]
+
+    @staticmethod
+    def calc_state_probs(df=None, infile=None, address=None, columns=None,
+      states=("bound", "unbound"), chunk_size=65536, n_blocks=4096,
+      **kwargs):
+        """
+        Assigns frames to states and calculates state probabilities and
+        their standard errors.
+
+        Frames are processed in blocks of *chunk_size* using
+        :meth:`assign_states`, read either from *df* or directly from an
+        hdf5 file, such that trajectories need not fit in memory.
+        State counts are accumulated over all frames along with state
+        probabilities over *n_blocks* equal blocks of frames; the latter
+        are passed to :meth:`calc_mean` to estimate standard errors by
+        block averaging. Unassigned frames (e.g. preceding the first
+        crossing of a hysteresis cutoff) are excluded.
+
+        Arguments:
+          df (DataFrame): Timeseries DataFrame
+          infile (str): Path to hdf5 file, used if *df* is not provided;
+            see :meth:`open_values`
+          address (str): Address of timeseries within *infile*
+          columns (list): Columns from which to assign states; all if
+            omitted
+          states (list): Names of lower and upper states
+          chunk_size (int): Number of frames to process at once
+          n_blocks (int): Maximum number of blocks over which to average
+          block_kw (dict): Keyword arguments passed to :meth:`calc_mean`
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments passed to
+            :meth:`assign_states`
+
+        Returns:
+          Series: Probability of each state ('P <state>') and its
+          standard error ('P <state> se')
+        """
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+
+        with TimeSeriesDataset.open_values(df=df, infile=infile,
+          address=address, columns=columns) as (n_frames, read):
+            block_size = max(1, int(np.ceil(n_frames / n_blocks)))
+            n_blocks = n_frames // block_size
+            chunk_size = max(1, chunk_size // block_size) * block_size
+            if verbose >= 1:
+                wiprint("""Assigning states of {0} frames; calculating
+                        probabilities in blocks of {1}""".format(n_frames,
+                  block_size))
+
+            counts = np.zeros(2, np.int64)
+            block_counts = np.zeros((n_blocks, 2), np.int64)
+            final = None
+            for start in range(0, n_frames, chunk_size):
+                chunk = np.asarray(read(start, start + chunk_size),
+                  np.float64)
+                frame_states, final = TimeSeriesDataset.assign_states(chunk,
+                  initial=final, **kwargs)
+                assigned = frame_states >= 0
+                counts += np.bincount(frame_states[assigned], minlength=2)
+                block = (start + np.arange(frame_states.size)) // block_size
+                assigned &= block < n_blocks
+                block_counts += np.bincount(block[assigned] * 2 +
+                  frame_states[assigned], minlength=n_blocks * 2).reshape(
+                  n_blocks, 2)
+
+        # Calculate probabilities, and standard errors from block averages
+        probs = pd.Series(name="stateprobs")
+        n_assigned = counts.sum()
+        block_counts = block_counts[block_counts.sum(axis=1) > 0]
+        block_df = pd.DataFrame(block_counts / block_counts.sum(axis=1,
+          keepdims=True), columns=["P " + state for state in states])
+        if block_df.shape[0] >= 2:
+            mean_df, _ = TimeSeriesDataset.calc_mean(df=block_df,
+              verbose=verbose, **kwargs.get("block_kw", {}))
+            se = mean_df.iloc[:, -1]
+        else:
+            se = pd.Series(np.nan, index=block_df.columns)
+        for i, state in enumerate(states):
+            if n_assigned > 0:
+                probs["P " + state] = counts[i] / n_assigned
+            else:
+                probs["P " + state] = np.nan
+            probs["P " + state + " se"] = se["P " + state]
+
+        return probs
+
+    @staticmethod
+    def write_state_probs(probs, outfile, address="assign/stateprobs",
+      **kwargs):
+        """
+        Writes state probabilities to an hdf5 file, in the form read by
+        :class:`StateProbFigureManager
+        <moldynplot.StateProbFigureManager.StateProbFigureManager>`.
+
+        Arguments:
+          probs (Series): State probabilities and standard errors, as
+            returned by :meth:`calc_state_probs`
+          outfile (str): Path to output hdf5 file; may contain
+            environment variables
+          address (str): Address of dataset within *outfile*; replaced
+            if it exists
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+        """
+        from os.path import expandvars
+        import h5py
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        outfile = expandvars(outfile)
+
+        data = np.zeros(1, [(str(key), np.float64) for key in probs.index])
+        for key, value in probs.items():
+            data[str(key)] = value
+        if verbose >= 1:
+            wiprint("Writing state probabilities to '{0}[{1}]'".format(
+              outfile, address))
+        with h5py.File(outfile, "a") as h5_file:
+            if address in h5_file:
+                del h5_file[address]
+            h5_file.create_dataset(address, data=data)
+
     @staticmethod
     def downsample(df, downsample, downsample_mode="mean", **kwargs):
         """
@@ -327,8 +760,7 @@ class TimeSeriesDataset(Dataset):
                 mean_df = mean_df[
                     ["r1", "r1 se", "r2", "r2 se", "noe", "noe se", "s2",
                         "s2 se"]]
-                mean_df = mean_df.loc[sorted(mean_df.index.values,
-                  key=lambda x: int(x.split(":")[1]))]
+                mean_df, _ = sort_residues(mean_df)
             else:
                 raise Exception("Additional MultiIndex Levels not tested")
 
@@ -434,6 +866,212 @@ class TimeSeriesDataset(Dataset):
 
         return pdist
 
+    @staticmethod
+    def calc_pdist2d(df=None, infile=None, address=None, columns=None,
+      mode="kde", bins=100, limits=None, bandwidth=None, chunk_size=1048576,
+      cache=None, **kwargs):
+        """
+        Calculates joint probability distribution of two columns.
+
+        Frames are processed in blocks of *chunk_size*, read either from
+        *df* or directly from an hdf5 file, and accumulated into a
+        two-dimensional histogram; trajectories therefore need not fit
+        in memory. If *limits* are not provided, an additional pass is
+        made to determine them. For kernel density estimates, the
+        histogram is convolved with a Gaussian kernel truncated at four
+        standard deviations, one dimension at a time, such that cost is
+        independent of the number of frames once binned. The convolution
+        is evaluated directly rather than using an FFT, such that bins
+        beyond the reach of the kernel remain exactly zero rather than
+        acquiring round-off, and have undefined free energy.
+
+        Arguments:
+          df (DataFrame): Timeseries DataFrame
+          infile (str): Path to hdf5 file, used if *df* is not provided;
+            see :meth:`open_values`
+          address (str): Address of timeseries within *infile*
+          columns (list): Two columns whose joint probability
+            distribution will be calculated; the first two columns if
+            omitted
+          mode (str): Method of calculating probability distribution;
+            may be 'hist' for histogram or 'kde' for kernel density
+            estimate
+          bins (int, list): Number of bins along each dimension
+          limits (list): Minimum and maximum along each dimension, i.e.
+            [[xmin, xmax], [ymin, ymax]]; frames outside are excluded;
+            equal minimum and maximum (e.g. of a restrained coordinate)
+            are widened by 0.5 in each direction
+          bandwidth (float, list): Standard deviation of kernel along
+            each dimension; if omitted, chosen by Scott's rule; no
+            smoothing is applied along dimensions of zero bandwidth
+          chunk_size (int): Number of frames to process at once
+          cache (str): Path to hdf5 file in which to cache results
+            calculated from *infile*; results are reused if *infile* and
+            all arguments are unchanged; ignored if *df* is provided
+          verbose (int): Level of verbose output
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: Probability of each bin, normalized such that the
+          total is one, whose index and columns are the centers of bins
+          along the first and second column
+        """
+        from os.path import expandvars, getmtime, getsize, isfile
+        from hashlib import sha1
+        import re
+        from scipy.ndimage import convolve1d
+        import h5py
+
+        # Process arguments
+        verbose = kwargs.get("verbose", 1)
+        if columns is None:
+            if df is not None:
+                columns = list(df.columns.values[:2])
+            else:
+                columns = [0, 1]
+        bins = np.broadcast_to(np.array(bins, np.int64), (2,))
+        if mode not in ["hist", "kde"]:
+            raise ValueError("mode must be 'hist' or 'kde'")
+
+        # Check cache
+        if cache is not None and df is None:
+            cache = expandvars(cache)
+            path = expandvars(infile)
+            match = re.match(r"^(?P<path>.+\.(h5|hdf5)):/?(?P<address>.+)$",
+              path)
+            if match:
+                path = match.group("path")
+            key = sha1(repr((infile, getmtime(path), getsize(path), address,
+              list(columns), mode, bins.tolist(),
+              np.array(limits, np.float64).tolist(),
+              np.array(bandwidth, np.float64).tolist())).encode(
+              "utf-8")).hexdigest()
+            if isfile(cache):
+                with h5py.File(cache, "r") as cache_h5:
+                    if "pdist2d/" + key in cache_h5:
+                        group = cache_h5["pdist2d/" + key]
+                        if verbose >= 1:
+                            wiprint("Loading probability distribution of "
+                                    "{0} from cache '{1}'".format(columns,
+                              cache))
+                        return pd.DataFrame(np.array(group["probability"]),
+                          index=pd.Index(np.array(group["x"]),
+                            name=columns[0]),
+                          columns=pd.Index(np.array(group["y"]),
+                            name=columns[1]))
+        else:
+            key = None
+
+        with TimeSeriesDataset.open_values(df=df, infile=infile,
+          address=address, columns=columns) as (n_frames, read):
+
+            # Determine limits
+            if limits is None:
+                minimum = np.full(2, np.inf)
+                maximum = np.full(2, -np.inf)
+                for start in range(0, n_frames, chunk_size):
+                    chunk = np.asarray(read(start, start + chunk_size),
+                      np.float64)
+                    minimum = np.fmin(minimum, np.nanmin(chunk, axis=0))
+                    maximum = np.fmax(maximum, np.nanmax(chunk, axis=0))
+                limits = np.column_stack((minimum, maximum))
+            limits = np.array(limits, np.float64)
+            if not np.all(np.isfinite(limits)):
+                raise ValueError("Limits of {0} could not be ".format(
+                  columns) + "determined; no finite values were found")
+            if np.any(limits[:, 1] < limits[:, 0]):
+                raise ValueError("Maximum of limits {0} ".format(
+                  limits.tolist()) + "is less than minimum")
+            degenerate = limits[:, 1] == limits[:, 0]
+            limits[degenerate] += [-0.5, 0.5]
+            width = (limits[:, 1] - limits[:, 0]) / bins
+            if verbose >= 1:
+                wiprint("""Calculating probability distribution of {0} over
+                        {1} frames using {2}""".format(columns, n_frames,
+                  "a kernel density estimate" if mode == "kde" else
+                  "a histogram"))
+
+            # Accumulate histogram and moments
+            counts = np.zeros(bins[0] * bins[1], np.float64)
+            moments = np.zeros((3, 2), np.float64)
+            for start in range(0, n_frames, chunk_size):
+                chunk = np.asarray(read(start, start + chunk_size),
+                  np.float64)
+                chunk = chunk[np.all((chunk >= limits[:, 0]) &
+                  (chunk <= limits[:, 1]), axis=1)]
+                indexes = np.minimum(((chunk - limits[:, 0]) / width).astype(
+                  np.int64), bins - 1)
+                counts += np.bincount(indexes[:, 0] * bins[1] + indexes[:, 1],
+                  minlength=counts.size)
+                moments += [np.full(2, chunk.shape[0]), chunk.sum(axis=0),
+                  (chunk ** 2).sum(axis=0)]
+        counts = counts.reshape(bins)
+        n_used = moments[0, 0]
+
+        # Smooth histogram using Gaussian kernel
+        if mode == "kde" and n_used > 1:
+            if bandwidth is None:
+                std = np.sqrt((moments[2] - moments[1] ** 2 / n_used) / (
+                  n_used - 1))
+                bandwidth = std * n_used ** (-1 / 6)
+            sigma = np.broadcast_to(np.array(bandwidth, np.float64),
+              (2,)) / width
+            for axis, sigma_i in enumerate(sigma):
+                if sigma_i == 0:
+                    continue
+                offset = np.arange(-int(np.ceil(4 * sigma_i)),
+                  int(np.ceil(4 * sigma_i)) + 1)
+                kernel = np.exp(-0.5 * (offset / sigma_i) ** 2)
+                counts = convolve1d(counts, kernel / kernel.sum(), axis=axis,
+                  mode="constant")
+
+        total = counts.sum()
+        probability = counts / total if total > 0 else counts
+        pdist = pd.DataFrame(probability,
+          index=pd.Index(limits[0, 0] + width[0] * (np.arange(bins[0]) + 0.5),
+            name=columns[0]),
+          columns=pd.Index(limits[1, 0] + width[1] * (np.arange(bins[1])
+            + 0.5), name=columns[1]))
+
+        # Store in cache
+        if key is not None:
+            with h5py.File(cache, "a") as cache_h5:
+                group = cache_h5.require_group("pdist2d/" + key)
+                for name, data in [("probability", pdist.values),
+                  ("x", pdist.index.values), ("y", pdist.columns.values)]:
+                    if name in group:
+                        del group[name]
+                    group.create_dataset(name, data=data)
+
+        return pdist
+
+    @staticmethod
+    def calc_free_energy(pdist, temperature=298.0, units="kcal/mol",
+      **kwargs):
+        """
+        Converts a probability distribution to free energy, −kT ln P.
+
+        Arguments:
+          pdist (DataFrame): Probability distribution
+          temperature (float): Temperature (K)
+          units (str): Units of free energy; may be 'kcal/mol', 'kJ/mol',
+            or 'kT'
+          kwargs (dict): Additional keyword arguments
+
+        Returns:
+          DataFrame: Free energy, relative to that of the most probable
+          point; NaN where probability is zero
+        """
+        kt = {"kcal/mol": 0.0019872041 * temperature,
+            "kJ/mol": 0.0083144626 * temperature, "kT": 1.0}[units]
+        probability = pdist.values / np.nanmax(pdist.values)
+        with np.errstate(divide="ignore"):
+            free_energy = -kt * np.log(probability)
+        free_energy[np.isinf(free_energy)] = np.nan
+
+        return pd.DataFrame(free_energy, index=pdist.index,
+          columns=pdist.columns)
+
 #################################### MAIN #####################################
 if __name__ == "__main__":
     TimeSeriesDataset.main()
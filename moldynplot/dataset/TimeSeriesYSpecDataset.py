@@ -17,7 +17,6 @@ from __future__ import (absolute_import, division, print_function,
 if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
-from IPython import embed
 import numpy as np
 import pandas as pd
 from ..myplotspec.YSpecDataset import YSpecDataset
@@ -168,6 +167,8 @@ class TimeSeriesYSpecDataset(YSpecDataset):
 
         # Interactive prompt
         if interactive:
+            from IPython import embed
+
             embed()
 
     @staticmethod
@@ -17,7 +17,6 @@ if __name__ == "__main__":
     __package__ = str("moldynplot.dataset")
     import moldynplot.dataset
 
-import h5py
 import numpy as np
 
 
@@ -55,6 +54,7 @@ class H5Dataset(object):
         """
         from os.path import expandvars, isfile
         import six
+        import h5py
 
         for infile in infiles:
             if isinstance(infile, six.string_types):
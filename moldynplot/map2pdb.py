@@ -16,10 +16,237 @@ if __name__ == "__main__":
     __package__ = str("moldynplot")
     import moldynplot
 ################################## FUNCTIONS ##################################
-def run(input_pdb, input_data, output_pdb, field, verbose=1, **kwargs):
-    from os import devnull
+def _atom_matrix(lines):
+    """
+    Converts atom records to a fixed-width character matrix.
+
+    Arguments:
+      lines (list): Atom records, without line endings
+
+    Returns:
+      ndarray: Array of shape (n_atoms, 80) and dtype 'S1' containing
+      one atom record per row, padded with spaces
+    """
+    import numpy as np
+
+    atoms = np.array(lines, dtype="S80").view("S1").reshape((-1, 80))
+    atoms[atoms == b""] = b" "
+
+    return atoms
+
+
+def read_pdb(infile, **kwargs):
+    """
+    Reads atom records of the first model of a pdb file.
+
+    Records are stored as a fixed-width character matrix so that fields
+    may be read and updated as whole columns rather than line by line.
+
+    Arguments:
+      infile (str): Path to input pdb file
+
+    Returns:
+      ndarray: Array of shape (n_atoms, 80) and dtype 'S1' containing
+      one atom record per row, padded with spaces
+    """
+    lines = []
+    with open(infile, "rb") as open_file:
+        for line in open_file:
+            if line.startswith(b"TER") or line.startswith(b"ENDMDL"):
+                break
+            if line.startswith(b"ATOM"):
+                lines.append(line.rstrip(b"\r\n"))
+
+    return _atom_matrix(lines)
+
+
+def iter_models(infile, **kwargs):
+    """
+    Iterates over the models of a multi-model pdb file.
+
+    Only a single model is held in memory at a time, so trajectories
+    with any number of models may be processed.
+
+    Arguments:
+      infile (str): Path to input pdb file
+
+    Yields:
+      ndarray: Atom records of each model, as returned by
+      :func:`read_pdb`
+    """
+    lines = []
+    with open(infile, "rb") as open_file:
+        for line in open_file:
+            if line.startswith(b"ATOM"):
+                lines.append(line.rstrip(b"\r\n"))
+            elif line.startswith(b"ENDMDL") and len(lines) > 0:
+                yield _atom_matrix(lines)
+                lines = []
+    if len(lines) > 0:
+        yield _atom_matrix(lines)
+
+
+def residue_ranges(atoms):
+    """
+    Indexes contiguous ranges of atoms belonging to the same residue.
+
+    Arguments:
+      atoms (ndarray): Atom records as returned by :func:`read_pdb`
+
+    Returns:
+      (ndarray, ndarray, ndarray): Residue number, index of first atom,
+      and number of atoms of each residue, in order of appearance
+    """
+    import numpy as np
+
+    # Chain, residue number, and insertion code together identify a residue
+    residue_id = np.ascontiguousarray(atoms[:, 21:27]).view("S6").ravel()
+    starts = np.flatnonzero(
+      np.concatenate(([True], residue_id[1:] != residue_id[:-1])))
+    counts = np.diff(np.append(starts, atoms.shape[0]))
+    numbers = np.ascontiguousarray(atoms[starts, 22:26]).view(
+      "S4").ravel().astype(int)
+
+    return numbers, starts, counts
+
+
+def residue_lookup(residues, numbers):
+    """
+    Locates each of a series of residue numbers within a list of
+    residues.
+
+    Arguments:
+      residues (list): Residue names in the form ``XAA:#``
+      numbers (ndarray): Residue numbers to locate
+
+    Returns:
+      (ndarray, ndarray): Index within *residues* of each residue
+      number, and whether each residue number was found
+    """
+    import numpy as np
+    from . import residue_index
+
+    residue_numbers = residue_index(residues)["number"].values
+    if residue_numbers.size == 0:
+        return np.zeros(numbers.size, int), np.zeros(numbers.size, bool)
+    order = np.argsort(residue_numbers, kind="mergesort")
+    positions = np.clip(np.searchsorted(residue_numbers[order], numbers), 0,
+      residue_numbers.size - 1)
+    indexes = order[positions]
+    found = residue_numbers[indexes] == numbers
+
+    return indexes, found
+
+
+def map_values(values, indexes=None, found=None, scale=0.5, vmin=0.0,
+  vmax=0.5, nan_value=0.75, missing_value=0.0, **kwargs):
+    """
+    Transforms data into the values to be stored for each residue.
+
+    Arguments:
+      values (ndarray, float): Per-residue data, or a single value to
+        be applied to all residues
+      indexes (ndarray): Index within *values* of each residue, as
+        returned by :func:`residue_lookup`; if omitted, *values* is
+        already ordered by residue
+      found (ndarray): Whether each residue is present in *values*
+      scale (float): Factor by which to multiply values
+      vmin (float): Minimum value; lower values are clipped
+      vmax (float): Maximum value; higher values are clipped
+      nan_value (float): Value used for residues whose value is NaN
+      missing_value (float): Value used for residues absent from
+        *values*
+
+    Returns:
+      ndarray: Value for each residue
+    """
+    import numpy as np
+
+    values = np.clip(np.array(values, np.float64) * scale, vmin, vmax)
+    values[np.isnan(values)] = nan_value
+    if indexes is not None:
+        values = np.where(found, values[indexes], missing_value)
+
+    return values
+
+
+def store_values(atoms, values, counts, field):
+    """
+    Stores per-residue values in the beta or occupancy field.
+
+    Values are formatted once per residue and then broadcast to that
+    residue's atoms.
+
+    Arguments:
+      atoms (ndarray): Atom records as returned by :func:`read_pdb`;
+        updated in place
+      values (ndarray): Value for each residue
+      counts (ndarray): Number of atoms in each residue
+      field (str): Field in which to store values; may be 'beta' or
+        'occupancy'
+    """
+    import numpy as np
+
+    columns = {"occupancy": slice(54, 60), "beta": slice(60, 66)}[field]
+    formatted = np.array(["{0:6.2f}".format(v) for v in values], dtype="S6")
+    formatted = np.repeat(formatted, counts)
+    atoms[:, columns] = formatted.view("S1").reshape((-1, 6))
+
+
+def write_pdb(outfile, atoms, **kwargs):
+    """
+    Writes atom records to a pdb file.
+
+    Arguments:
+      outfile (str, file): Path to output pdb file, or open file to
+        which records will be appended
+      atoms (ndarray): Atom records as returned by :func:`read_pdb`
+    """
+    import numpy as np
+
+    lines = np.char.rstrip(np.ascontiguousarray(atoms).view("S80").ravel())
+    if hasattr(outfile, "write"):
+        outfile.write(b"\n".join(lines))
+        outfile.write(b"\n")
+    else:
+        with open(outfile, "wb") as out:
+            out.write(b"\n".join(lines))
+            out.write(b"\n")
+
+
+def run(input_pdb, input_data, output_pdb, field, column="I/I0",
+  models=False, verbose=1, **kwargs):
+    """
+    Stores per-residue data in the beta or occupancy field of a pdb
+    file.
+
+    If *models* is enabled, each model of a multi-model pdb file (e.g.
+    a trajectory) is processed in turn and written as a model of the
+    output pdb file. *input_data* may then be a timeseries, one row
+    per model, whose columns are either residues in the form ``XAA:#``
+    or quantities, of which the one selected by *column* (``-c`` or
+    ``--column`` on the command line) is applied to all residues of that
+    model.
+
+    Arguments:
+      input_pdb (str): Path to input pdb file; may contain environment
+        variables
+      input_data (str): Path to input data file; may contain
+        environment variables
+      output_pdb (str): Path to output pdb file; may contain environment
+        variables
+      field (str): Field in which to store data; may be 'beta' or
+        'occupancy'
+      column (str): Column of *input_data* from which to take values;
+        ignored for timeseries whose columns are residues
+      models (bool): Process all models of *input_pdb* rather than only
+        the first
+      verbose (int): Level of verbose output
+      kwargs (dict): Additional keyword arguments passed to
+        :func:`map_values`
+    """
     from os.path import expandvars
-    from subprocess import Popen, PIPE
+    import re
     import numpy as np
     import pandas as pd
 
@@ -27,78 +254,76 @@ def run(input_pdb, input_data, output_pdb, field, verbose=1, **kwargs):
     input_pdb  = expandvars(input_pdb)
     input_data = expandvars(input_data)
     output_pdb = expandvars(output_pdb)
-
-    def iter_func():
-        with open(input_pdb, "r") as open_file:
-            for line in open_file:
-                if line.startswith("TER") or line.startswith("ENDMDL"):
-                    break
-                if not line.startswith("ATOM"):
-                    continue
-                yield(line[6:11])           # Atom number
-                yield(line[11:16])          # Atom name
-                yield(line[16:20])          # Residue name
-                yield(line[20:21])          # Conformation
-                yield(line[21:22])          # Chain
-                yield(line[22:26])          # Residue number
-                yield(line[26:38])          # X
-                yield(line[38:46])          # Y
-                yield(line[46:54])          # Z
-                yield(line[54:60])          # Beta
-                yield(line[60:66])          # Occupancy
-                yield(line[66:].strip())    # Element
-
-    # Load input pdb
-    if verbose >= 1:
-        print("Loading input pdb file '{0}'".format(input_pdb))
-    pdb_np = np.fromiter(iter_func(), dtype="S12").reshape((-1, 12))
-    pdb = pd.DataFrame(
-      data=np.array(pdb_np[:,1:]),
-      index=np.array(pdb_np[:,0], dtype=np.int),
-      columns=["atom_name", "residue_name", "conformation", "chain",
-      "residue_number", "x", "y", "z", "beta", "occupancy", "element"])
-    pdb.index.name = "atom_number"
-    if verbose >= 2:
-        print(pdb)
+    re_res = re.compile("^[a-zA-Z]+:[0-9]+$")
 
     # Load input data
     if verbose >= 1:
         print("Loading input data file '{0}'".format(input_data))
-    data = pd.read_csv(input_data, index_col=0, delimiter=r"\s\s+")
+    data = pd.read_csv(input_data, index_col=0, delimiter=r"\s\s+",
+      engine="python")
     if verbose >= 2:
         print(data)
 
-    # Store data in pdb field
-    if verbose >= 1:
-        print("Storing data in '{0}'".format(field))
-    pdb[field] = pd.to_numeric(pdb[field])
-    pdb[field] = 0
-    for residue, row in data.iterrows():
-        residue = int(residue.split(":")[1])
-        pdb[field][pdb["residue_number"].astype(int) == residue] = \
-        row["I/I0"]/2
-#        0.5 - row["delta cs"]/0.6
-    pdb[field][pdb[field] >= 0.5] = 0.5
-    pdb[field][pdb[field] <= 0.0] = 0.0
-    pdb[field][np.isnan(pdb[field])] = 0.75
+    if not models:
+        # Load input pdb
+        if verbose >= 1:
+            print("Loading input pdb file '{0}'".format(input_pdb))
+        atoms = read_pdb(input_pdb)
+        numbers, starts, counts = residue_ranges(atoms)
+        if verbose >= 2:
+            print("{0} atoms in {1} residues".format(atoms.shape[0],
+              numbers.size))
+
+        # Store data in pdb field
+        if verbose >= 1:
+            print("Storing data in '{0}'".format(field))
+        indexes, found = residue_lookup(data.index.values, numbers)
+        values = map_values(data[column].values, indexes, found, **kwargs)
+        store_values(atoms, values, counts, field)
+
+        if verbose >= 1:
+            print("Writing output pdb file '{0}'".format(output_pdb))
+        write_pdb(output_pdb, atoms)
+        return
 
+    # Determine whether timeseries is per-residue or per-model
+    per_residue = all(re_res.match(str(c)) for c in data.columns.values)
+    if not per_residue:
+        frame_values = np.array(data[column].values, np.float64)
+    else:
+        frame_values = np.array(data.values, np.float64)
+
+    # Stream models from input pdb to output pdb
     if verbose >= 1:
-        print("Writing output pdb file '{0}'".format(output_pdb))
-    with open(output_pdb, "w") as outfile:
-        for index, row in pdb.iterrows():
-            outfile.write("ATOM  " +
-              "{0:5d}".format(index) +
-              "{0:5s}".format(row["atom_name"]) + 
-              "{0:4s}".format(row["residue_name"]) + 
-              "{0:1s}".format(row["conformation"]) + 
-              "{0:1s}".format(row["chain"]) + 
-              "{0:1s}".format(row["residue_number"]) +
-              "{0:12.3f}".format(float(row["x"])) +
-              "{0:8.3f}".format(float(row["y"])) +
-              "{0:8.3f}".format(float(row["z"])) +
-              "{0:6.3f}".format(float(row["beta"])) +
-              "{0:6.3f}".format(float(row["occupancy"])) +
-              "{0:s}\n".format(row["element"]))
+        print("Streaming models from '{0}' to '{1}'".format(input_pdb,
+          output_pdb))
+    n_atoms = None
+    with open(output_pdb, "wb") as out:
+        for i, atoms in enumerate(iter_models(input_pdb)):
+            if i >= frame_values.shape[0]:
+                raise ValueError("Input pdb file '{0}' contains more models "
+                                 "than input data file '{1}' contains "
+                                 "rows ({2})".format(input_pdb, input_data,
+                  frame_values.shape[0]))
+            if atoms.shape[0] != n_atoms:
+                n_atoms = atoms.shape[0]
+                numbers, starts, counts = residue_ranges(atoms)
+                if per_residue:
+                    indexes, found = residue_lookup(data.columns.values,
+                      numbers)
+            if per_residue:
+                values = map_values(frame_values[i], indexes, found, **kwargs)
+            else:
+                values = np.repeat(map_values([frame_values[i]], **kwargs),
+                  numbers.size)
+            store_values(atoms, values, counts, field)
+
+            out.write("MODEL     {0:>4d}\n".format(i + 1).encode("ascii"))
+            write_pdb(out, atoms)
+            out.write(b"ENDMDL\n")
+            if verbose >= 2:
+                print("Wrote model {0}".format(i + 1))
+        out.write(b"END\n")
 
 #################################### MAIN #####################################
 if __name__ == "__main__":
@@ -122,6 +347,35 @@ if __name__ == "__main__":
       default  = "beta",
       dest     = "field",
       help     = "Store value in occupancy field")
+    parser.add_argument(
+      "-c", "--column",
+      default  = "I/I0",
+      dest     = "column",
+      type     = str,
+      help     = "Column of input data to store (default: %(default)s)")
+    parser.add_argument(
+      "-m", "--models",
+      action   = "store_true",
+      dest     = "models",
+      help     = "Process all models of input pdb; input data may be a\n"
+                 "timeseries with one row per model, whose columns are\n"
+                 "residues (XAA:#) or quantities selected with\n"
+                 "-c/--column")
+    parser.add_argument(
+      "-scale",
+      default  = argparse.SUPPRESS,
+      type     = float,
+      help     = "Factor by which to multiply values (default: 0.5)")
+    parser.add_argument(
+      "-vmin",
+      default  = argparse.SUPPRESS,
+      type     = float,
+      help     = "Minimum value after scaling (default: 0.0)")
+    parser.add_argument(
+      "-vmax",
+      default  = argparse.SUPPRESS,
+      type     = float,
+      help     = "Maximum value after scaling (default: 0.5)")
     parser.add_argument(
       "input_pdb",
       type     = str,
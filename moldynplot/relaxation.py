@@ -14,6 +14,9 @@ Processes NMR relaxation and related data
 from __future__ import (absolute_import, division, print_function,
     unicode_literals)
 
+if __name__ == "__main__":
+    __package__ = str("moldynplot")
+    import moldynplot
 
 ################################## FUNCTIONS ##################################
 def spawn(function):
@@ -158,11 +161,53 @@ def process_ired(infiles, outfile, indexfile=None, **kwargs):
       fmt=fmt, header=header, comments='#')
 
 
+def aggregate_error(errs, index, columns):
+    """
+    Averages errors of a series of simulation/experiment pairs.
+
+    All pairs are aligned once into an array of shape (pair, residue,
+    field). Errors are averaged over the pairs that include the residue
+    and field, and uncertainties (columns ending in ' se') are propagated
+    as the root sum of squares divided by the number of those pairs. As
+    in a plain sum, a NaN in any of those pairs yields NaN; residues or
+    fields included in no pair are NaN.
+
+    Arguments:
+      errs (list): DataFrames of error of each pair, indexed by residue
+      index (list): Residues of averaged DataFrame
+      columns (list): Columns of averaged DataFrame
+
+    Returns:
+      DataFrame: Averaged error
+    """
+    import pandas as pd
+    import numpy as np
+
+    # Align pairs into (pair, residue, field) array
+    stacked = np.stack([np.array(err.reindex(index=index,
+      columns=columns).values, np.float64) for err in errs])
+    present = np.stack([np.outer(pd.Index(index).isin(err.index),
+      pd.Index(columns).isin(err.columns)) for err in errs])
+    counts = present.sum(axis=0)
+    se = np.array([c.endswith(" se") for c in columns], bool)
+
+    # Average errors and propagate uncertainties
+    stacked[:, :, se] **= 2
+    sums = np.where(present, stacked, 0.0).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        final = sums / counts
+        final[:, se] = np.sqrt(sums[:, se]) / counts[:, se]
+    final[counts == 0] = np.nan
+
+    return pd.DataFrame(final, index=index, columns=columns)
+
+
 def process_error(sim_infiles, exp_infiles, outfile, **kwargs):
     """
     """
     import pandas as pd
     import numpy as np
+    from . import residue_index
 
     if len(sim_infiles) != len(exp_infiles):
         raise ValueError("""Number of simulation input files must
@@ -217,32 +262,21 @@ def process_error(sim_infiles, exp_infiles, outfile, **kwargs):
 
     # Determine final columns and indexes
     final_cols = []
-    final_index = sorted(final_index, key=lambda x: int(x.split(":")[1]))
+    final_index = final_index[np.argsort(
+      residue_index(final_index)["number"].values, kind="mergesort")]
     for err in errs:
         for col in err.columns.values:
             if not col in final_cols:
                 final_cols.append(col)
 
-    # Sum the columns
-    final = pd.DataFrame(0.0, index=final_index, columns=final_cols)
-    counts = pd.DataFrame(0, index=final_index, columns=final_cols)
-    for err in errs:
-        for col in err.columns.values:
-            if not col.endswith(" se"):
-                final[col].loc[err.index] += err[col].loc[err.index]
-            else:
-                final[col].loc[err.index] += err[col].loc[err.index] ** 2
-            counts[col].loc[err.index] += 1
-
     # Average the columns
     print("Averaging fields:")
     for col in final_cols:
         if not col.endswith(" se"):
             print("    Averaging field '{0}'".format(col))
-            final[col] /= counts[col]
         else:
             print("    Progagating uncertainty for field '{0}'".format(col))
-            final[col] = np.sqrt(final[col]) / counts[col]
+    final = aggregate_error(errs, final_index, final_cols)
 
     # Write outfile
     print(
@@ -18,6 +18,29 @@ from moldynplot.dataset.HSQCDataset import HSQCDataset
 from moldynplot.dataset.SequenceDataset import SequenceDataset
 from moldynplot.dataset.TimeSeriesDataset import TimeSeriesDataset
 
+################################## VARIABLES ##################################
+#: Modules whose import time is measured by test_startup
+startup_modules = ["moldynplot.dataset.{0}".format(name) for name in [
+    "ChemicalShiftSequenceDataset", "CorrDataset", "HSQCDataset",
+    "IREDTimeSeriesDataset", "MDGXDataset", "NatConTimeSeriesDataset",
+    "PRETimeSeriesDataset", "SAXSTimeSeriesDataset", "SequenceDataset",
+    "TimeSeriesDataset"]] + ["moldynplot.relaxation"]
+
+#: Dependencies that must not be imported until used
+lazy_modules = ["IPython", "sklearn", "nmrglue", "scipy.optimize",
+    "matplotlib", "h5py"]
+
+#: Budget for importing startup_modules, in seconds, beyond importing
+#: numpy, pandas, and myplotspec; measured at under 0.01 s, compared to
+#: 0.4-0.5 s when IPython and h5py were imported at module load. Which
+#: modules are loaded is the deterministic check; the budget leaves
+#: headroom for loaded machines, and is compared to the fastest of
+#: startup_runs runs
+startup_budget = 1.0
+
+#: Number of fresh interpreters in which startup is timed
+startup_runs = 3
+
 
 ################################## FUNCTIONS ##################################
 def h5_cmp(file_1, file_2):
@@ -44,6 +67,42 @@ def h5_cmp(file_1, file_2):
 
 
 #################################### TESTS ####################################
+def test_startup():
+    import json
+    from subprocess import check_output
+    import sys
+
+    # Import in a fresh interpreter, such that nothing is already loaded
+    script = """
+import json, sys, time
+import numpy, pandas, six
+import moldynplot.myplotspec, moldynplot.myplotspec.Dataset
+loaded = set(sys.modules)
+start = time.time()
+for module in {0}:
+    __import__(module)
+print(json.dumps(dict(time=time.time() - start,
+  modules=sorted(set(sys.modules) - loaded))))
+""".format(repr(startup_modules))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    outputs = [json.loads(check_output([sys.executable, "-c", script],
+        env=env).decode("utf-8").strip().split("\n")[-1]) for i in
+        range(startup_runs)]
+
+    # Heavy dependencies are imported on first use
+    for module in outputs[0]["modules"]:
+        for lazy_module in lazy_modules:
+            assert not (module == lazy_module or module.startswith(
+                lazy_module + ".")), "{0} imported at startup".format(
+                module)
+
+    # Startup remains within budget
+    startup_time = min(output["time"] for output in outputs)
+    assert startup_time < startup_budget, \
+        "startup took {0:.3f} s; budget {1:.3f} s".format(startup_time,
+            startup_budget)
+
+
 def test_hsqc():
     # Read NMRPipe
     pipe = HSQCDataset(infile="data/mocvnh3/hsqc.ft")
@@ -201,10 +260,537 @@ def test_dssp():
     assert (h5_cmp("dssp.h5", "data/p53/dssp.h5") == True)
 
 
+def test_natcon():
+    from os.path import join
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    import pandas as pd
+    from moldynplot.dataset.NatConTimeSeriesDataset import \
+        NatConTimeSeriesDataset
+
+    directory = mkdtemp()
+    try:
+        infile = join(directory, "mindist.dat")
+        outfile = join(directory, "contacts.h5")
+        distances = np.random.RandomState(0).uniform(3.0, 8.0,
+          (100, 37)).round(1).astype(np.float32)
+        pd.DataFrame(distances, index=pd.Index(np.arange(1, 101),
+          name="#Frame")).to_csv(infile, sep=str(" "), float_format="%.1f")
+
+        # Writing to the same outfile twice replaces contacts
+        for i in range(2):
+            df, n_contacts = NatConTimeSeriesDataset.read_contacts(infile,
+              [4.5, 5.5], contacts_outfile=outfile, chunk_size=32,
+              verbose=0)
+
+        # Compare to brute force, including distances equal to cutoffs
+        assert n_contacts == 37
+        for i, cutoff in enumerate([4.5, 5.5]):
+            expected = (distances <= cutoff).sum(axis=1) / 37
+            assert np.allclose(df.iloc[:, i].values, expected)
+        import h5py
+        with h5py.File(outfile, "r") as h5_file:
+            assert h5_file["natcon/index"].shape == (100,)
+            contacts = np.unpackbits(np.array(h5_file["natcon/contacts/5.5"]),
+              axis=1)[:, :37].astype(bool)
+        assert (contacts == (distances <= 5.5)).all()
+    finally:
+        rmtree(directory)
+
+
+def test_mdgx_distributions():
+    from scipy.stats import gaussian_kde
+    from moldynplot.dataset.MDGXDataset import MDGXDataset
+
+    # Normal, long-tailed, and small groups, and an empty group
+    random_state = np.random.RandomState(0)
+    groups = [random_state.normal(size=2000),
+        np.abs(random_state.standard_cauchy(2000)),
+        random_state.gamma(2, size=20)]
+    values = np.concatenate(groups)
+    codes = np.concatenate([np.full(g.size, i) for i, g in enumerate(groups)])
+    order = random_state.permutation(values.size)
+    summary_df, coords, density = MDGXDataset.calc_distributions(
+      values[order], codes[order], 4)
+
+    for i, group in enumerate(groups):
+        summary = summary_df.iloc[i]
+        assert summary["count"] == group.size
+        assert np.isclose(summary["min"], group.min())
+        assert np.isclose(summary["max"], group.max())
+        assert np.allclose([summary["q25"], summary["median"],
+            summary["q75"]], np.percentile(group, [25, 50, 75]))
+        assert np.isclose(summary["mean"], group.mean())
+        assert np.isclose(summary["mae"], np.abs(group).mean())
+        assert np.isclose(summary["rmse"], np.sqrt((group ** 2).mean()))
+        assert np.allclose(coords[i], np.linspace(group.min(), group.max(),
+          100))
+        reference = gaussian_kde(group)(coords[i])
+        assert np.abs(density[i] - reference).max() < 0.005 * reference.max()
+    assert summary_df.iloc[3]["count"] == 0
+    assert np.all(density[3] == 0)
+
+
+def test_mdgx_selections():
+    import pandas as pd
+    from moldynplot.dataset.MDGXDataset import MDGXDataset
+
+    # Selections that overlap, are nested, repeat, or match nothing
+    random_state = np.random.RandomState(0)
+    paths = np.array(["a/b/c", "x/b/c", "b/c", "c", "a/b/cc", "a/b/", "d/e",
+        "q/a/b/c"])
+    topology = pd.Series(paths[random_state.randint(len(paths), size=500)])
+    selections = ["c", "b/c", "a/b/c", "e", "", "c", "z"]
+    membership = MDGXDataset.index_selections(topology, selections)
+
+    assert list(membership.columns) == ["c", "b/c", "a/b/c", "e", "", "z"]
+    for selection in selections:
+        assert np.array_equal(membership[selection].values,
+          topology.str.endswith("/" + selection).values)
+
+
+def test_corr_stats():
+    import pandas as pd
+    from moldynplot.dataset.CorrDataset import CorrDataset
+
+    random_state = np.random.RandomState(0)
+    n_points = 40
+    x = random_state.normal(size=(n_points, 2))
+    y = 0.8 * x + random_state.normal(scale=0.5, size=(n_points, 2))
+    x[3, 1] = np.nan
+    y[7, 1] = np.nan
+    corr = pd.DataFrame(np.column_stack((x[:, 0], y[:, 0], x[:, 1], y[:, 1],
+      np.full(n_points, 0.2))), columns=pd.MultiIndex.from_tuples([("a", "x"),
+      ("a", "y"), ("b", "x"), ("b", "y"), ("b_se", "y")]))
+    stats_df = CorrDataset.calc_stats(corr, n_bootstrap=200, seed=1,
+      propagate_se=True, verbose=0)
+
+    # Brute-force reference, resampling points explicitly
+    def calc_stats(x, y):
+        finite = np.isfinite(x) & np.isfinite(y)
+        x, y = x[finite], y[finite]
+        return dict(r=np.corrcoef(x, y)[0, 1],
+          mae=np.abs(y - x).mean(), rmse=np.sqrt(((y - x) ** 2).mean()),
+          slope=np.polyfit(x, y, 1)[0])
+
+    counts = np.random.RandomState(1).multinomial(n_points,
+      np.ones(n_points) / n_points, size=200)
+    for i, field in enumerate(["a", "b"]):
+        point = calc_stats(x[:, i], y[:, i])
+        replicates = [calc_stats(np.repeat(x[:, i], c), np.repeat(y[:, i], c))
+            for c in counts]
+        for stat, value in point.items():
+            values = np.array([r[stat] for r in replicates])
+            assert np.isclose(stats_df.loc[field, stat], value)
+            assert np.isclose(stats_df.loc[field, stat + "_se"],
+              values.std(ddof=1))
+            assert np.isclose(stats_df.loc[field, stat + "_lb"],
+              np.percentile(values, 2.5))
+            assert np.isclose(stats_df.loc[field, stat + "_ub"],
+              np.percentile(values, 97.5))
+            assert (stats_df.loc[field, stat + "_lb"] <= value
+                    <= stats_df.loc[field, stat + "_ub"])
+    assert np.allclose(stats_df.loc["a", [s + "_prop_se" for s in
+        ["r", "mae", "rmse", "slope"]]], 0)
+    assert np.all(stats_df.loc["b", [s + "_prop_se" for s in
+        ["r", "mae", "rmse", "slope"]]] > 0)
+
+
+def test_pdist2d():
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    import h5py
+    import pandas as pd
+
+    # Two separated clusters, with empty bins between them
+    random_state = np.random.RandomState(0)
+    values = np.concatenate((random_state.normal(-2, 0.2, (3000, 2)),
+      random_state.normal(2, 0.2, (1000, 2))))
+    df = pd.DataFrame(values, columns=["phi", "psi"])
+    limits = [[-4, 4], [-4, 4]]
+
+    # Histogram, in chunks
+    hist = TimeSeriesDataset.calc_pdist2d(df=df, mode="hist", bins=40,
+      limits=limits, chunk_size=333, verbose=0)
+    reference = np.histogram2d(values[:, 0], values[:, 1], bins=40,
+      range=limits)[0]
+    assert np.allclose(hist.values, reference / reference.sum())
+
+    # Kernel density estimate, convolving histogram with kernel directly
+    kde = TimeSeriesDataset.calc_pdist2d(df=df, bins=40, limits=limits,
+      bandwidth=0.3, verbose=0)
+    sigma = 0.3 / 0.2
+    half = int(np.ceil(4 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+    kernel = np.outer(kernel, kernel)
+    padded = np.pad(reference, half)
+    smoothed = np.zeros_like(reference)
+    for i in range(40):
+        for j in range(40):
+            smoothed[i, j] = (padded[i:i + 2 * half + 1,
+              j:j + 2 * half + 1] * kernel).sum()
+    assert np.allclose(kde.values, smoothed / smoothed.sum())
+
+    # Bins beyond reach of kernel are empty, and free energy is undefined
+    empty = smoothed == 0
+    assert empty.any()
+    assert np.all(kde.values[empty] == 0)
+    free_energy = TimeSeriesDataset.calc_free_energy(kde, units="kT")
+    assert np.all(np.isnan(free_energy.values) == empty)
+    assert np.nanmin(free_energy.values) == 0
+
+    # Constant column, e.g. a restrained coordinate, is binned within
+    #   widened limits and not smoothed
+    restrained = pd.DataFrame({"phi": values[:, 0], "psi": 1.5})
+    for mode in ["hist", "kde"]:
+        pdist = TimeSeriesDataset.calc_pdist2d(df=restrained, mode=mode,
+          bins=10, verbose=0)
+        assert np.all(np.isfinite(pdist.values))
+        assert np.isclose(pdist.values.sum(), 1)
+        assert np.isclose(pdist.columns.values[0], 1.05)
+        assert np.isclose(pdist.columns.values[-1], 1.95)
+        assert np.isclose(pdist.values[:, 5].sum(), 1)
+
+    # Read from hdf5 in chunks, and reuse cache
+    directory = mkdtemp()
+    try:
+        infile = os.path.join(directory, "timeseries.h5")
+        cache = os.path.join(directory, "cache.h5")
+        with h5py.File(infile, "w") as h5_file:
+            h5_file.create_dataset("timeseries", data=values)
+            h5_file["timeseries"].attrs["fields"] = ["phi", "psi"]
+        for i in range(2):
+            h5_kde = TimeSeriesDataset.calc_pdist2d(
+              infile=infile + ":timeseries", columns=["phi", "psi"], bins=40,
+              limits=limits, bandwidth=0.3, chunk_size=333, cache=cache,
+              verbose=0)
+            assert np.allclose(h5_kde.values, kde.values)
+    finally:
+        rmtree(directory)
+
+
+def test_saxs_x2():
+    from math import fsum
+    import pandas as pd
+    from moldynplot.dataset.SAXSDataset import SAXSDataset
+
+    random_state = np.random.RandomState(0)
+    q = np.linspace(0.01, 0.5, 200)
+    target_I = 1e4 * np.exp(-q ** 2 * 400)
+    target_Ise = 1e-6 * target_I + 1e-3
+    intensity = target_I * random_state.uniform(0.5, 2.0, (50, 1)) * (1 +
+      random_state.normal(scale=1e-9, size=(50, q.size)))
+    scale = SAXSDataset.fit_scale(intensity, target_I, target_Ise)
+    x2 = SAXSDataset.calc_x2(intensity, target_I, target_Ise, scale,
+      chunk_size=7)
+
+    # Brute-force reference of weighted least squares and χ²; curves fit
+    #   closely, such that χ² is small relative to the terms of its
+    #   expanded form
+    for i in range(intensity.shape[0]):
+        scale_i = np.linalg.lstsq((intensity[i] / target_Ise)[:, np.newaxis],
+          target_I / target_Ise, rcond=None)[0][0]
+        assert np.isclose(scale[i], scale_i, rtol=1e-12)
+        x2_i = fsum(((scale[i] * intensity[i] - target_I) / target_Ise)
+            ** 2) / (q.size - 1)
+        assert np.isclose(x2[i], x2_i, rtol=1e-6)
+        assert np.isclose(SAXSDataset.calc_x2(intensity[i], target_I,
+          target_Ise, scale[i]), x2_i, rtol=1e-6)
+
+    # Standard error of target is required
+    dataset = SAXSDataset.__new__(SAXSDataset)
+    dataset.df = pd.DataFrame({"intensity": intensity[0]}, index=q)
+    dataset.load_target = lambda target, q: (np.ones(q.size, bool),
+      target_I, None)
+    for function in [lambda: SAXSDataset.calc_x2(intensity, target_I, None),
+        lambda: dataset.x2("target.dat", verbose=0)]:
+        try:
+            function()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError not raised")
+
+
+def test_residue_index():
+    from moldynplot import residue_index
+
+    residues = ["ALA:1", "T3P:5", "HID+:-2", "GLY12", "7", "NA:10"]
+    residue_df = residue_index(residues)
+    assert list(residue_df.index) == residues
+    for residue in residues[:3] + residues[5:]:
+        name, number = residue.split(":")
+        assert residue_df.loc[residue, "name"] == name
+        assert residue_df.loc[residue, "number"] == int(number)
+    assert residue_df.loc["GLY12", "name"] == "GLY"
+    assert residue_df.loc["GLY12", "number"] == 12
+    assert residue_df.loc["7", "name"] == ""
+    assert residue_df.loc["7", "number"] == 7
+    for residue in ["T3P5", "ALA:", "ALA:1:2"]:
+        try:
+            residue_index([residue])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(residue)
+
+
+def test_aggregate_error():
+    import numpy as np
+    import pandas as pd
+    from moldynplot.relaxation import aggregate_error
+
+    index = [1, 2, 3, 4]
+    columns = ["r1", "r1 se", "s2", "s2 se"]
+    errs = [pd.DataFrame([[np.nan, 0.2, 0.3, 0.4], [0.5, np.nan, 0.6, 0.7],
+      [0.8, 0.9, 1.0, 1.1]], index=[1, 2, 3], columns=columns),
+      pd.DataFrame([[1.2, 1.3], [1.4, 1.5], [1.6, 1.7]], index=[1, 3, 4],
+        columns=["r1", "r1 se"])]
+    final = aggregate_error(errs, index, columns)
+
+    # Accumulate as did the previous loop
+    sums = pd.DataFrame(0.0, index=index, columns=columns)
+    counts = pd.DataFrame(0, index=index, columns=columns)
+    for err in errs:
+        for col in err.columns:
+            if col.endswith(" se"):
+                sums.loc[err.index, col] += err[col] ** 2
+            else:
+                sums.loc[err.index, col] += err[col]
+            counts.loc[err.index, col] += 1
+    for col in columns:
+        if col.endswith(" se"):
+            sums[col] = np.sqrt(sums[col]) / counts[col]
+        else:
+            sums[col] /= counts[col]
+    assert np.allclose(final.values, sums.values, equal_nan=True)
+    assert np.isnan(final.loc[1, "r1"])
+    assert np.isnan(final.loc[2, "r1 se"])
+    assert np.isnan(final.loc[4, "s2"])
+
+
+def test_pre():
+    import pandas as pd
+    from moldynplot.dataset.PRETimeSeriesDataset import PRETimeSeriesDataset
+
+    random_state = np.random.RandomState(0)
+    df = pd.DataFrame(random_state.uniform(8.0, 30.0, (1003, 3)),
+      index=np.arange(1003) * 0.1, columns=["ALA:1", "GLY:2", "THR:3"])
+    k, w, tc, r2, t = 0.0123, 800e6, 9.3e-9, 12.4, 0.01
+    mean_df, block_df = PRETimeSeriesDataset.calc_pre(df, n_blocks=10,
+      chunk_size=250, verbose=0)
+
+    # Brute-force reference, frame by frame
+    rho2 = np.zeros(df.shape)
+    i_i0 = np.zeros(df.shape)
+    for i, distances in enumerate(df.values):
+        for j, distance in enumerate(distances):
+            rho2[i, j] = (k * 1e18 * distance ** -6 * (4 * tc + 3 * tc / (
+              1 + (w * tc) ** 2)))
+            i_i0[i, j] = r2 * np.exp(-rho2[i, j] * t) / (r2 + rho2[i, j])
+    assert np.allclose(mean_df["distance"], df.values.mean(axis=0))
+    assert np.allclose(mean_df["I/I0"], i_i0.mean(axis=0))
+    assert np.allclose(mean_df["rho2"], rho2.mean(axis=0))
+    assert np.allclose(mean_df["r6 distance"],
+      (df.values ** -6).mean(axis=0) ** (-1 / 6))
+
+    # Blocks of 101 frames; the 94 trailing frames are not blocked
+    assert block_df.shape == (9, 9)
+    for b in range(9):
+        frames = slice(b * 101, (b + 1) * 101)
+        assert np.isclose(block_df.index[b], df.index[frames].values.mean())
+        assert np.allclose(block_df.values[b], np.concatenate(
+          [df.values[frames].mean(axis=0), i_i0[frames].mean(axis=0),
+            rho2[frames].mean(axis=0)]))
+
+    # Single precision
+    mean_32, block_32 = PRETimeSeriesDataset.calc_pre(df, n_blocks=10,
+      chunk_size=250, dtype=np.float32, verbose=0)
+    assert np.allclose(mean_32.values, mean_df.values, rtol=1e-5)
+    assert np.allclose(block_32.values, block_df.values, rtol=1e-5)
+
+
+def test_state_probs():
+    import pandas as pd
+
+    random_state = np.random.RandomState(0)
+    values = np.cumsum(random_state.normal(size=(2000, 2)), axis=0) % 10
+    values[random_state.randint(0, 2000, 20), 0] = np.nan
+    df = pd.DataFrame(values, columns=["d1", "d2"])
+
+    # Brute-force reference, frame by frame
+    def reference(cutoff=None, cutoffs=None, combine="all"):
+        states = np.full(values.shape[0], -1, np.int8)
+        column_states = [-1] * values.shape[1]
+        for i, frame in enumerate(values):
+            for j, value in enumerate(frame):
+                if cutoffs is None:
+                    column_states[j] = (-1 if np.isnan(value) else
+                      0 if value < cutoff else 1)
+                elif value < cutoffs[0]:
+                    column_states[j] = 0
+                elif value > cutoffs[1]:
+                    column_states[j] = 1
+            if -1 in column_states:
+                continue
+            lower = [s == 0 for s in column_states]
+            states[i] = 0 if (all(lower) if combine == "all" else any(
+              lower)) else 1
+        return states
+
+    for kw in [dict(cutoff=5.0), dict(cutoffs=[4.0, 6.0]),
+        dict(cutoffs=[4.0, 6.0], combine="any")]:
+        states = reference(**kw)
+        assert np.array_equal(
+          TimeSeriesDataset.assign_states(values, **kw)[0], states)
+
+        # Carry state across chunks
+        probs = TimeSeriesDataset.calc_state_probs(df=df, chunk_size=37,
+          n_blocks=1, verbose=0, **kw)
+        n_assigned = (states >= 0).sum()
+        assert np.isclose(probs["P bound"],
+          (states == 0).sum() / n_assigned)
+        assert np.isclose(probs["P unbound"],
+          (states == 1).sum() / n_assigned)
+
+
+def test_saxs_ensemble():
+    import os
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    import h5py
+    import pandas as pd
+    from moldynplot.dataset.SAXSTimeSeriesDataset import \
+        SAXSTimeSeriesDataset
+
+    # Frames of two states, and target of 70% of the first, scaled
+    random_state = np.random.RandomState(0)
+    q = np.linspace(0.01, 0.5, 100)
+    curves = np.array([np.exp(-q ** 2 * 100), np.exp(-q ** 2 * 300)])
+    intensity = np.repeat(curves, 50, axis=0) * (1 + random_state.normal(
+      scale=0.01, size=(100, q.size)))
+    target_I = 1000 * (0.7 * curves[0] + 0.3 * curves[1])
+    target_Ise = 0.01 * target_I
+
+    # Maximum entropy weights recover populations, scale, and target
+    weights = SAXSTimeSeriesDataset.calc_maxent_weights(intensity,
+      target_I, target_Ise)
+    assert np.isclose(weights.sum(), 1)
+    assert np.isclose(weights[:50].sum(), 0.7, atol=0.01)
+    average = weights.dot(intensity)
+    scale = SAXSTimeSeriesDataset.fit_scale(average, target_I, target_Ise)
+    assert np.isclose(scale, 1000, rtol=0.01)
+    assert SAXSTimeSeriesDataset.calc_x2(average, target_I, target_Ise,
+      scale) < 0.1
+
+    # Weights approach prior when confidence in prior is high
+    prior = np.repeat([0.2, 0.8], 50)
+    weights = SAXSTimeSeriesDataset.calc_maxent_weights(intensity,
+      target_I, target_Ise, prior=prior, theta=1e8)
+    assert np.isclose(weights[:50].sum(), 0.2, atol=0.01)
+
+    # Greedy selection recovers a subset of noiseless frames
+    weights = SAXSTimeSeriesDataset.calc_greedy_subset(np.vstack((curves,
+      np.exp(-q ** 2 * 200))), target_I, target_Ise, n_select=10)
+    assert np.allclose(weights, [0.7, 0.3, 0.0])
+
+    # Fit ensemble of frames read from hdf5 file
+    directory = mkdtemp()
+    try:
+        infile = os.path.join(directory, "saxs.h5")
+        target = os.path.join(directory, "target.dat")
+        with h5py.File(infile, "w") as h5_file:
+            h5_file["saxs/q"] = q
+            h5_file["saxs/intensity"] = intensity
+        dataset = SAXSTimeSeriesDataset(infile=infile, lazy=True, verbose=0)
+        dataset.write(df=pd.DataFrame(np.column_stack((target_I,
+          target_Ise)), index=pd.Index(q, name="q"),
+          columns=["intensity", "intensity se"]), outfile=target, verbose=0)
+        for mode in ["maxent", "greedy"]:
+            ensemble_df, x2 = dataset.fit_ensemble(target, mode=mode,
+              verbose=0)
+            assert list(ensemble_df.index) == list(dataset.index)
+            assert np.isclose(ensemble_df["weight"].sum(), 1)
+            assert np.isclose(ensemble_df["weight"].values[:50].sum(), 0.7,
+              atol=0.02)
+            assert x2 < 1
+    finally:
+        rmtree(directory)
+
+
+def test_profile():
+    import json
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from moldynplot.StageProfiler import StageProfiler
+
+    # Nested stages
+    profiler = StageProfiler()
+    with profiler.stage("read") as stage:
+        with profiler.stage("parse", rows=10):
+            pass
+        stage["rows"] = 10
+    profile_df = profiler.to_dataframe()
+    assert list(profile_df.index) == ["read", "parse"]
+    assert list(profile_df["depth"]) == [0, 1]
+    assert list(profile_df["rows"]) == [10, 10]
+    assert profile_df.loc["read", "start"] == 0
+    assert profile_df.loc["read", "wall time"] >= profile_df.loc["parse",
+      "wall time"] >= 0
+    assert profiler.copy().stages == profiler.stages
+
+    # Command-line arguments
+    actions = dict((a.dest, a) for a in
+        TimeSeriesDataset.construct_argparser()._actions)
+    assert actions["profile"].const is True
+    assert actions["profile"].default is False
+    assert actions["profile_format"].default == "json"
+    assert list(actions["profile_format"].choices) == ["json", "chrome"]
+
+    # Profile of dataset, in each format
+    n_frames = TimeSeriesDataset(infile="data/p53/rmsd.dat",
+      verbose=0).timeseries_df.shape[0]
+    directory = mkdtemp()
+    try:
+        for profile_format in ["json", "chrome"]:
+            outfile = os.path.join(directory, "profile." + profile_format)
+            dataset = TimeSeriesDataset(infile="data/p53/rmsd.dat",
+              downsample=10, calc_mean=True, profile=outfile,
+              profile_format=profile_format, verbose=0)
+            n_rows = dataset.timeseries_df.shape[0]
+            with open(outfile) as infile:
+                profile = json.load(infile)
+            if profile_format == "json":
+                rows = dict((s["name"], s["rows"]) for s in
+                    profile["stages"])
+            else:
+                events = [e for e in profile["traceEvents"] if
+                    e["ph"] == "X"]
+                assert all(e["dur"] >= 0 and e["ts"] >= 0 for e in events)
+                rows = dict((e["name"], e["args"]["rows"]) for e in events)
+            assert rows == {"read": n_frames, "downsample": n_frames,
+              "mean": n_rows}
+    finally:
+        rmtree(directory)
+
+
 if __name__ == "__main__":
+    test_startup()
     test_sequence()
     test_rmsd()
     test_radgyr()
     test_perresrmsd()
     test_dssp()
     test_hsqc()
+    test_natcon()
+    test_mdgx_distributions()
+    test_mdgx_selections()
+    test_corr_stats()
+    test_pdist2d()
+    test_saxs_x2()
+    test_residue_index()
+    test_aggregate_error()
+    test_pre()
+    test_state_probs()
+    test_saxs_ensemble()
+    test_profile()
@@ -53,6 +53,173 @@ def test_hsqc():
     compare_images("hsqc.png", "figure/mocvnh3/hsqc.png", tol=0)
 
 
+def test_decimate():
+    import numpy as np
+
+    random_state = np.random.RandomState(0)
+    x = np.arange(5000) * 0.1
+    y = np.cumsum(random_state.normal(size=x.size))
+    y[1000:1100] = np.nan
+    y[3333] = np.nan
+    width, origin = 2.5, -1.0
+
+    # Brute-force reference: within each bin, bounded by gaps, retain
+    #   first, last, and first occurrence of minimum and maximum
+    groups = []
+    for i in range(x.size):
+        key = (np.floor((x[i] - origin) / width), np.isnan(y[i]))
+        if not groups or groups[-1][0] != key:
+            groups.append((key, []))
+        groups[-1][1].append(i)
+    selected = set()
+    for (_, gap), frames in groups:
+        selected.update([frames[0], frames[-1]])
+        if not gap:
+            values = [y[i] for i in frames]
+            selected.add(frames[values.index(min(values))])
+            selected.add(frames[values.index(max(values))])
+    selected = sorted(selected)
+
+    d_x, d_y = TimeSeriesFigureManager.decimate(x, y, width, origin)
+    np.testing.assert_array_equal(d_x, x[selected])
+    np.testing.assert_array_equal(d_y, y[selected])
+
+    lb, ub = y - 1, y + 1
+    e_x, e_lb, e_ub = TimeSeriesFigureManager.decimate_envelope(x, lb, ub,
+      width, origin)
+    for j, ((_, gap), frames) in enumerate(groups):
+        np.testing.assert_array_equal(e_x[2 * j:2 * j + 2],
+          x[[frames[0], frames[-1]]])
+        if gap:
+            assert np.all(np.isnan(e_lb[2 * j:2 * j + 2]))
+            assert np.all(np.isnan(e_ub[2 * j:2 * j + 2]))
+        else:
+            assert np.all(e_lb[2 * j:2 * j + 2] == np.min(lb[frames]))
+            assert np.all(e_ub[2 * j:2 * j + 2] == np.max(ub[frames]))
+
+
+def test_dataset_planner():
+    import numpy as np
+    from moldynplot.DatasetPlanner import DatasetPlanner
+
+    class PlannedDataset(object):
+        product_kw = {"calc_pdist": ("pdist_kw",), "calc_mean": ("block_kw",)}
+        view_kw = ("downsample",)
+
+        @classmethod
+        def load_variants(cls, variants, **kwargs):
+            pass
+
+    class UnplannedDataset(object):
+        pass
+
+    # Random requests for two inputs, varying in derived products
+    random_state = np.random.RandomState(0)
+    requests = []
+    for i in range(200):
+        request = dict(infile="ab"[random_state.randint(2)],
+          calc_pdist=[False, True, "pdist.dat"][random_state.randint(3)],
+          calc_mean=bool(random_state.randint(2)),
+          verbose=random_state.randint(2))
+        if random_state.randint(2):
+            request["pdist_kw"] = dict(bandwidth=[0.1, 0.2][
+              random_state.randint(2)])
+        if random_state.randint(2):
+            request["downsample"] = 10
+        requests.append((PlannedDataset, request))
+    requests.append((UnplannedDataset, dict(infile="a")))
+    plan = DatasetPlanner(object()).plan(requests)
+
+    # Each planned request is served once, by a variant of its input that
+    #   calculates the same products in the same way
+    assert sorted(variants[0]["infile"] for cls, variants, served in plan) \
+        == ["a", "b"]
+    served_ids = [id(r) for cls, variants, served in plan for served_i in
+        served for r in served_i]
+    assert sorted(served_ids) == sorted(id(r) for cls, r in requests[:-1])
+    n_variants = 0
+    for cls, variants, served in plan:
+        assert cls is PlannedDataset
+        for variant, served_i in zip(variants, served):
+            n_variants += 1
+            for request in served_i:
+                assert request["infile"] == variant["infile"]
+                assert request.get("downsample") == variant.get("downsample")
+                for flag, options in cls.product_kw.items():
+                    if not request[flag]:
+                        continue
+                    assert variant[flag]
+                    if not isinstance(request[flag], bool):
+                        assert variant[flag] == request[flag]
+                    for key in options:
+                        assert request.get(key) == variant.get(key)
+    assert n_variants < len(requests) // 4
+
+
+def test_draw_report_parallel():
+    import os
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from threading import Lock
+    import matplotlib.pyplot as plt
+    from moldynplot import (ParallelReportMixin, draw_report_parallel,
+      multiprocess_map)
+
+    class ReportFigureManager(ParallelReportMixin):
+        def __init__(self):
+            self.lock = Lock()  # Not picklable; workers must inherit
+            self.dataset_cache = {"pid": os.getpid()}
+
+        def draw_report(self, **kwargs):
+            for i, figure in kwargs["figures"].items():
+                if i == "all":
+                    continue
+                if figure.get("fail"):
+                    raise ValueError("figure {0} failed".format(i))
+                figure_obj = plt.figure()
+                figure_obj.savefig(figure["outfile"])
+                plt.close(figure_obj)
+                with open(figure["outfile"] + ".txt", "w") as out:
+                    out.write("{0} {1}".format(self.dataset_cache["pid"],
+                      os.getpid()))
+
+    directory = mkdtemp()
+    try:
+        figures = dict((i, {"outfile": os.path.join(directory,
+          "{0}.png".format(i))}) for i in range(2))
+        figures["all"] = {"shared": True}
+        assert draw_report_parallel(ReportFigureManager(), n_processes=2,
+          figures=figures, plan_datasets=False, verbose=0) == 2
+
+        # Each figure is drawn in a forked worker from the parent's state
+        for i in range(2):
+            assert os.path.exists(figures[i]["outfile"])
+            with open(figures[i]["outfile"] + ".txt") as infile:
+                parent_pid, pid = map(int, infile.read().split())
+            assert parent_pid == os.getpid() and pid != os.getpid()
+
+        # Failure of a figure raises rather than hanging
+        figures[1]["fail"] = True
+        try:
+            draw_report_parallel(ReportFigureManager(), n_processes=2,
+              figures=figures, plan_datasets=False, verbose=0)
+        except RuntimeError as error:
+            assert "figure 1 failed" in str(error)
+        else:
+            raise AssertionError("RuntimeError not raised")
+    finally:
+        rmtree(directory)
+
+    # Workers that raise or exit without returning a result raise
+    for function in [lambda i: 1 / i, lambda i: os._exit(i)]:
+        try:
+            multiprocess_map(function, [0, 1], 2)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("RuntimeError not raised")
+
+
 if __name__ == "__main__":
     test_relax()
     test_rmsd()
@@ -60,3 +227,6 @@ if __name__ == "__main__":
     test_perresrmsd()
     test_dssp()
     test_hsqc()
+    test_decimate()
+    test_dataset_planner()
+    test_draw_report_parallel()